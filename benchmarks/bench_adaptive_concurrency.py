@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+自适应并发基准测试
+使用模拟服务端容量的假模型（在途请求超过容量时延迟成比例增加，超过2倍容量时返回429），
+在大量调用方同时发起请求时对比固定并发（不限制）与自适应并发的吞吐、限流次数与延迟，
+并记录自适应上限的变化过程，观察其是否收敛到容量附近
+
+用法：
+    python benchmarks/bench_adaptive_concurrency.py
+    python benchmarks/bench_adaptive_concurrency.py --capacity 8 --callers 48 --duration 10 --output benchmarks/results/adaptive.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.adaptive_limiter import AdaptiveConcurrencyLimiter
+from core.call_policy import CallPolicy
+from core.fake_chat_model import FakeChatModel
+from utils.log_config import setup_logging
+
+def _run(policy: CallPolicy, model: FakeChatModel, callers: int, duration: float,
+         limiter: Optional[AdaptiveConcurrencyLimiter]) -> Dict[str, Any]:
+    """callers 个线程在 duration 秒内不断发起调用"""
+    deadline = time.monotonic() + duration
+    latencies: List[float] = []
+    counts = {"success": 0, "failed": 0}
+    trace: List[int] = []
+    lock = threading.Lock()
+    message = [{"role": "user", "content": "ping"}]
+
+    def caller():
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                policy.call(lambda: model.invoke(message))
+                outcome = "success"
+            except Exception:
+                outcome = "failed"
+            with lock:
+                counts[outcome] += 1
+                if outcome == "success":
+                    latencies.append(time.perf_counter() - start)
+
+    def sample_limit():
+        while time.monotonic() < deadline:
+            trace.append(limiter.limit)
+            time.sleep(0.25)
+
+    threads = [threading.Thread(target=caller) for _ in range(callers)]
+    if limiter is not None:
+        threads.append(threading.Thread(target=sample_limit))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    result = {
+        "throughput_per_s": counts["success"] / duration,
+        "success": counts["success"],
+        "failed": counts["failed"],
+        "latency_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "latency_p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+    }
+    if limiter is not None:
+        result["throttled"] = limiter.throttled
+        result["final_limit"] = limiter.limit
+        # 后半段的平均上限，表示收敛后的水平
+        tail = trace[len(trace) // 2:] or [limiter.limit]
+        result["settled_limit"] = sum(tail) / len(tail)
+        result["limit_trace"] = trace
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="自适应并发基准测试")
+    parser.add_argument("--capacity", type=int, default=8, help="模拟服务端的并发容量")
+    parser.add_argument("--latency", type=float, default=0.05, help="容量内的单次调用延迟（秒）")
+    parser.add_argument("--callers", type=int, default=48, help="同时发起调用的线程数")
+    parser.add_argument("--duration", type=float, default=8.0, help="每种模式的运行时长（秒）")
+    parser.add_argument("--max-retries", type=int, default=3, help="限流时的重试次数")
+    parser.add_argument("--output", help="结果JSON路径，不指定时只打印")
+    args = parser.parse_args()
+
+    setup_logging(level='ERROR', log_file=None)
+    results: Dict[str, Any] = {
+        "capacity": args.capacity,
+        "ideal_throughput_per_s": args.capacity / args.latency,
+    }
+    for mode in ("fixed", "adaptive"):
+        model = FakeChatModel("bench", latency=args.latency, capacity=args.capacity)
+        limiter = AdaptiveConcurrencyLimiter("fake") if mode == "adaptive" else None
+        policy = CallPolicy(max_retries=args.max_retries, backoff_base=0.05, backoff_max=1.0,
+                            concurrency_limiter=limiter)
+        results[mode] = _run(policy, model, args.callers, args.duration, limiter)
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
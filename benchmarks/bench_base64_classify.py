@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+媒体输入分类与base64规范化基准测试
+对比旧实现（完整 b64decode 判断是否为base64、split/join 复制后再完整解码校验）与
+抽样分类 classify_media_input、单遍规范化并计算摘要 normalize_and_hash_base64
+在 1–100 MB 载荷上的耗时
+
+用法：
+    python benchmarks/bench_base64_classify.py
+    python benchmarks/bench_base64_classify.py --sizes-mb 1 10 100 --wrap 76 --output benchmarks/results/base64.json
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, Callable, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.media_store import classify_media_input, normalize_and_hash_base64, MEDIA_BASE64
+
+MB = 1024 * 1024
+
+def legacy_is_base64(data: str) -> bool:
+    """旧实现：完整解码判断"""
+    if data.startswith("data:"):
+        return True
+    try:
+        base64.b64decode(data, validate=True)
+        return True
+    except Exception:
+        return False
+
+def legacy_sanitize_and_hash(data: str):
+    """旧实现：split/join 复制、完整解码校验，再解码一次计算摘要"""
+    if data.startswith("data:") and ";base64," in data:
+        data = data.split(",", 1)[1]
+    cleaned = "".join(data.split())
+    try:
+        base64.b64decode(cleaned, validate=True)
+    except Exception:
+        return None
+    return cleaned, hashlib.sha256(base64.b64decode(cleaned)).hexdigest()
+
+def make_payload(size: int, wrap: int) -> str:
+    """构造约 size 字节的base64载荷；wrap 大于0时按该宽度换行"""
+    encoded = base64.b64encode(os.urandom(size * 3 // 4)).decode("ascii")
+    if wrap > 0:
+        encoded = "\n".join(encoded[i:i + wrap] for i in range(0, len(encoded), wrap))
+    return encoded
+
+def _time(fn: Callable[[], Any], repeat: int) -> float:
+    """最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench(size_mb: float, wrap: int, repeat: int) -> Dict[str, Any]:
+    """单个大小的对比"""
+    payload = make_payload(int(size_mb * MB), wrap)
+    # 校验新旧实现结果一致
+    if wrap == 0:
+        assert legacy_is_base64(payload)
+    assert classify_media_input(payload) == MEDIA_BASE64
+    assert normalize_and_hash_base64(payload) == legacy_sanitize_and_hash(payload)
+
+    result = {"size_mb": size_mb, "wrap": wrap}
+    result["classify_legacy_ms"] = _time(lambda: legacy_is_base64(payload), repeat) * 1000
+    result["classify_sampled_ms"] = _time(lambda: classify_media_input(payload), repeat) * 1000
+    result["normalize_legacy_ms"] = _time(lambda: legacy_sanitize_and_hash(payload), repeat) * 1000
+    result["normalize_single_pass_ms"] = _time(lambda: normalize_and_hash_base64(payload), repeat) * 1000
+    result["classify_speedup"] = result["classify_legacy_ms"] / max(result["classify_sampled_ms"], 1e-6)
+    result["normalize_speedup"] = result["normalize_legacy_ms"] / result["normalize_single_pass_ms"]
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="媒体输入分类与base64规范化基准测试")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 10, 50, 100], help="载荷大小（MB）")
+    parser.add_argument("--wrap", type=int, nargs="+", default=[0, 76], help="换行宽度，0表示不换行")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测量的重复次数（取最短）")
+    parser.add_argument("--output", help="结果JSON路径，不指定时只打印")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    for wrap in args.wrap:
+        for size_mb in args.sizes_mb:
+            result = bench(size_mb, wrap, args.repeat)
+            results.append(result)
+            print(f"{size_mb:>6.0f} MB wrap={wrap:<3} 分类 {result['classify_legacy_ms']:9.2f} -> "
+                  f"{result['classify_sampled_ms']:7.3f} ms   规范化+摘要 {result['normalize_legacy_ms']:9.2f} -> "
+                  f"{result['normalize_single_pass_ms']:8.2f} ms ({result['normalize_speedup']:.1f}x)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+大媒体编码基准测试
+对比整体读入后编码再拼接 data URL 的旧方式与从内存映射分块编码的新方式，
+记录耗时与 Python 堆内存峰值（tracemalloc）
+
+用法：
+    python benchmarks/bench_media_encode.py
+    python benchmarks/bench_media_encode.py --size-mb 200 --output benchmarks/results/media_encode.json
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, Any, Callable
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.media_store import MediaHandle
+
+def _legacy_data_url(path: str, mime: str) -> str:
+    """旧方式：整体读入、编码、解码为字符串，再拼接头部"""
+    with open(path, "rb") as f:
+        encoded = base64.b64encode(f.read()).decode("ascii")
+    return f"data:{mime};base64,{encoded}"
+
+def _measure(build: Callable[[], str]) -> Dict[str, Any]:
+    """执行一次编码，返回耗时、内存峰值与结果长度"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": elapsed, "peak_mb": peak / 1024 / 1024, "length": len(result)}
+
+def main():
+    parser = argparse.ArgumentParser(description="大媒体编码基准测试")
+    parser.add_argument("--size-mb", type=int, default=200, help="模拟视频文件大小（MB）")
+    parser.add_argument("--output", help="结果JSON路径，不指定时只打印")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "video.mp4")
+        with open(path, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+        handle = MediaHandle.from_file(path, "video/mp4")
+
+        results: Dict[str, Any] = {"size_mb": args.size_mb}
+        results["legacy"] = _measure(lambda: _legacy_data_url(path, handle.mime))
+        results["mmap_chunked"] = _measure(handle.to_data_url)
+        results["same_output"] = _legacy_data_url(path, handle.mime) == handle.to_data_url()
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+媒体工作进程池基准测试
+对比在当前线程与在工作进程中进行base64编解码时，多线程并发下的吞吐量
+
+用法：
+    python benchmarks/bench_media_pool.py --size-mb 8 --threads 8 --workers 4
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.log_config import setup_logging
+from utils.media_store import MediaHandle
+from utils.media_worker_pool import MediaWorkerPool
+
+MB = 1024 * 1024
+
+def _throughput(task: Callable[[], Any], threads: int, tasks: int) -> Dict[str, float]:
+    """以 threads 个线程并发执行 tasks 次任务"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(task) for _ in range(tasks)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "tasks_per_second": tasks / elapsed}
+
+def run(size_mb: int, threads: int, workers: int, tasks: int) -> Dict[str, Any]:
+    raw = os.urandom(size_mb * MB)
+    handle = MediaHandle.from_bytes(raw, "image/png")
+    response = f"生成结果如下\n![image](data:image/png;base64,{base64.b64encode(raw).decode('ascii')})"
+
+    def inline_decode():
+        match = response.find("base64,")
+        end = response.find(")", match)
+        base64.b64decode(response[match + 7:end])
+
+    results: Dict[str, Any] = {"size_mb": size_mb, "threads": threads, "workers": workers, "tasks": tasks}
+    results["encode_inline"] = _throughput(handle.to_data_url, threads, tasks)
+    results["decode_inline"] = _throughput(inline_decode, threads, tasks)
+
+    with MediaWorkerPool(max_workers=workers, min_bytes=0) as pool:
+        pool.encode_data_url(handle)  # 预热：启动工作进程
+        results["encode_pool"] = _throughput(lambda: pool.encode_data_url(handle), threads, tasks)
+        results["decode_pool"] = _throughput(lambda: pool.decode_images(response), threads, tasks)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="媒体工作进程池基准测试")
+    parser.add_argument("--size-mb", type=int, default=8, help="媒体大小（MB）")
+    parser.add_argument("--threads", type=int, default=8, help="并发线程数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数")
+    parser.add_argument("--tasks", type=int, default=32, help="每项测试的任务数")
+    parser.add_argument("--output", help="结果JSON路径，不指定时只打印")
+    args = parser.parse_args()
+
+    setup_logging(level='ERROR', log_file=None)
+    results = run(args.size_mb, args.threads, args.workers, args.tasks)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
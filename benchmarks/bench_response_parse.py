@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+响应解析基准测试
+对比旧的正则提取（findall 全部匹配后再 b64decode 第一张）与单遍有界扫描器
+在 1–20 MB 内联图片响应上的耗时
+
+用法：
+    python benchmarks/bench_response_parse.py
+    python benchmarks/bench_response_parse.py --sizes-mb 1 5 20 --images 3 --output benchmarks/results/parse.json
+"""
+
+import argparse
+import base64
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from typing import Dict, Any, Callable, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.log_config import setup_logging
+from utils.media_store import decode_inline_images
+
+MB = 1024 * 1024
+
+def legacy_parse(content: str) -> List[bytes]:
+    """旧实现：正则找出全部图片（跨行匹配），只解码第一张"""
+    pattern = r'data:image/([^;]+);base64,([A-Za-z0-9+/=\s]+)'
+    matches = re.findall(pattern, content, re.DOTALL)
+    if not matches:
+        return []
+    return [base64.b64decode(re.sub(r'\s+', '', matches[0][1]))]
+
+def make_response(size: int, images: int, line_width: int) -> str:
+    """构造带内联图片的响应；line_width 大于0时载荷按该宽度换行（部分提供商的输出格式）"""
+    parts = ["以下是生成的图片：\n"]
+    for k in range(images):
+        payload = base64.b64encode(os.urandom(size)).decode("ascii")
+        if line_width:
+            payload = "\n".join(payload[i:i + line_width] for i in range(0, len(payload), line_width))
+        parts.append(f"![image](data:image/png;base64,{payload})\n图片{k + 1}说明\n")
+    return "".join(parts)
+
+def _time(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """重复执行并统计耗时（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {"mean_ms": statistics.mean(samples) * 1000, "min_ms": min(samples) * 1000}
+
+def run(sizes_mb: List[int], images: int, repeat: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {"images": images, "repeat": repeat, "sizes": {}}
+    for size_mb in sizes_mb:
+        for line_width in (0, 76):
+            content = make_response(size_mb * MB, images, line_width)
+            first = decode_inline_images(content)
+            assert first and legacy_parse(content)[0] == first[0][1], "扫描结果与旧实现不一致"
+
+            legacy = _time(lambda: legacy_parse(content), repeat)
+            scanner_first = _time(lambda: decode_inline_images(content), repeat)
+            scanner_all = _time(lambda: decode_inline_images(content, None), repeat)
+            results["sizes"][f"{size_mb}MB{'_wrapped' if line_width else ''}"] = {
+                "response_bytes": len(content),
+                "legacy_regex": legacy,
+                "scanner_first": scanner_first,
+                "scanner_all": scanner_all,
+                "speedup_first": legacy["mean_ms"] / scanner_first["mean_ms"],
+            }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="响应解析基准测试")
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 5, 10, 20], help="每张图片的大小（MB）")
+    parser.add_argument("--images", type=int, default=2, help="响应中的图片张数")
+    parser.add_argument("--repeat", type=int, default=5, help="每项测试的重复次数")
+    parser.add_argument("--output", help="结果JSON路径，不指定时只打印")
+    args = parser.parse_args()
+
+    setup_logging(level='ERROR', log_file=None)
+    results = run(args.sizes_mb, args.images, args.repeat)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
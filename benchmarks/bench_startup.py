@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准测试
+在全新子进程中测量导入控制器、创建第一个控制器的耗时，并检查导入阶段是否加载了重量级模块；
+另外在进程内对比重新编译配置与复用已编译配置创建控制器的耗时
+
+用法：
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 20 --max-import-ms 150 --output benchmarks/results/startup.json
+
+指定 --max-import-ms 或导入阶段加载了 HEAVY_MODULES 中的模块时以非零状态退出，可用于在CI中阻止启动耗时回退
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from benchmarks.scenarios import write_config
+from utils.log_config import setup_logging
+
+# 只在用到对应功能时才应加载的模块：异步接口、持久化缓存、工作进程池、提供商SDK
+HEAVY_MODULES = ("asyncio", "sqlite3", "multiprocessing", "concurrent.futures.process", "ssl", "langchain")
+
+# 子进程脚本：输出导入耗时、创建控制器耗时与已加载的重量级模块
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from core.pipeline_controller import PipelineController
+imported = time.perf_counter()
+heavy = [m for m in {heavy!r} if m in sys.modules]
+from utils.log_config import setup_logging
+setup_logging(level='ERROR', log_file=None)
+controller_start = time.perf_counter()
+PipelineController({config!r})
+done = time.perf_counter()
+print(json.dumps({{"import_s": imported - start, "construct_s": done - controller_start, "heavy": heavy}}))
+"""
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    """统计样本（毫秒）"""
+    ordered = sorted(samples)
+    return {
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+def bench_cold_start(config: str, repeat: int) -> Dict[str, Any]:
+    """全新子进程中的导入与第一个控制器的创建耗时"""
+    script = _CHILD.format(heavy=HEAVY_MODULES, config=config)
+    imports, constructs, interpreter = [], [], []
+    heavy: List[str] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        interpreter.append(time.perf_counter() - start)
+
+        proc = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+        sample = json.loads(proc.stdout.strip().splitlines()[-1])
+        imports.append(sample["import_s"])
+        constructs.append(sample["construct_s"])
+        heavy = sample["heavy"]
+    return {
+        "interpreter": _stats(interpreter),
+        "import": _stats(imports),
+        "first_controller": _stats(constructs),
+        "heavy_modules_after_import": heavy,
+    }
+
+def bench_controller_reuse(config: str, iterations: int) -> Dict[str, Any]:
+    """进程内创建控制器：每次重新编译配置 vs 复用已编译配置"""
+    from core.compiled_config import clear_compiled_config_cache
+    from core.pipeline_controller import PipelineController
+
+    cold, warm = [], []
+    for _ in range(iterations):
+        clear_compiled_config_cache()
+        start = time.perf_counter()
+        PipelineController(config)
+        cold.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        PipelineController(config)
+        warm.append(time.perf_counter() - start)
+    return {
+        "recompile": _stats(cold),
+        "reuse": _stats(warm),
+        "speedup": statistics.median(cold) / statistics.median(warm),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument("--repeat", type=int, default=10, help="子进程冷启动的重复次数")
+    parser.add_argument("--iterations", type=int, default=200, help="进程内创建控制器的重复次数")
+    parser.add_argument("--max-import-ms", type=float, help="导入耗时中位数的上限（毫秒），超过时以非零状态退出")
+    parser.add_argument("--output", help="结果JSON路径，不指定时只打印")
+    args = parser.parse_args()
+
+    setup_logging(level='ERROR', log_file=None)
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as work_dir:
+        config = write_config(os.path.join(work_dir, "startup.ini"), "fan_out")
+        results = {
+            "cold_start": bench_cold_start(config, args.repeat),
+            "controller_reuse": bench_controller_reuse(config, args.iterations),
+        }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    failures = []
+    heavy = results["cold_start"]["heavy_modules_after_import"]
+    if heavy:
+        failures.append(f"导入阶段加载了重量级模块: {', '.join(heavy)}")
+    import_ms = results["cold_start"]["import"]["p50_ms"]
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failures.append(f"导入耗时 {import_ms:.1f}ms 超过上限 {args.max_import_ms}ms")
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
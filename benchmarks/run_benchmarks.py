@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+离线基准测试
+使用确定性的假模型测量框架自身的开销，结果写入JSON便于在版本之间对比
+
+测量项：
+- round_overhead：零延迟假模型下每轮的框架开销（同步/异步、串行/并行）
+- batch_throughput：BatchRunner 在固定模型延迟下的记录吞吐量
+- peak_rss：大媒体输入输出时子进程的峰值内存
+- prompt_render：提示词模板的编译与渲染耗时
+
+用法：
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --quick --output benchmarks/results/dev.json
+"""
+
+import argparse
+import asyncio
+import configparser
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.scenarios import SCENARIOS, write_config, make_input
+from utils.log_config import setup_logging
+
+MB = 1024 * 1024
+
+def _summarize(samples: List[float]) -> Dict[str, float]:
+    """统计样本（毫秒）"""
+    ordered = sorted(samples)
+    return {
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "min_ms": ordered[0] * 1000,
+    }
+
+def bench_round_overhead(work_dir: str, iterations: int) -> Dict[str, Any]:
+    """零延迟假模型下每轮的框架开销"""
+    from core.pipeline_controller import PipelineController
+
+    results = {}
+    for scenario in SCENARIOS:
+        config = write_config(os.path.join(work_dir, f"{scenario}_overhead.ini"), scenario,
+                              latency=0.0, output_image_bytes=64 * 1024)
+        raw_input = make_input(scenario, work_dir, input_image_bytes=64 * 1024 if scenario == "media_heavy" else 0)
+        controller = PipelineController(config)
+        rounds = len(controller.pipeline_configs)
+
+        modes = {
+            "sync": lambda: controller.execute_pipeline(raw_input),
+            "sync_parallel": lambda: controller.execute_pipeline(raw_input, parallel=True),
+            "async": lambda: asyncio.run(controller.execute_pipeline_async(raw_input)),
+            "async_parallel": lambda: asyncio.run(controller.execute_pipeline_async(raw_input, parallel=True)),
+        }
+        scenario_result = {"rounds": rounds}
+        for mode, run in modes.items():
+            run()  # 预热：客户端创建、模板编译
+            samples = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                run()
+                samples.append((time.perf_counter() - start) / rounds)
+            scenario_result[mode] = _summarize(samples)
+        results[scenario] = scenario_result
+    return results
+
+def bench_batch_throughput(work_dir: str, records: int, latency: float,
+                           concurrency_levels: List[int]) -> Dict[str, Any]:
+    """固定模型延迟下 BatchRunner 的吞吐量"""
+    from core.batch_runner import BatchRunner
+
+    results = {}
+    for scenario in ("linear", "fan_out"):
+        config = write_config(os.path.join(work_dir, f"{scenario}_batch.ini"), scenario, latency=latency)
+        input_file = os.path.join(work_dir, f"{scenario}_batch.jsonl")
+        with open(input_file, "w", encoding="utf-8") as f:
+            for i in range(records):
+                f.write(json.dumps(make_input(scenario, work_dir, index=i), ensure_ascii=False) + "\n")
+
+        scenario_result = {}
+        for concurrency in concurrency_levels:
+            for parallel in (False, True):
+                runner = BatchRunner(config, concurrency=concurrency, parallel_rounds=parallel,
+                                     output_dir=os.path.join(work_dir, "batch_outputs"))
+                start = time.perf_counter()
+                stats = runner.run(input_file)
+                elapsed = time.perf_counter() - start
+                scenario_result[f"c{concurrency}{'_parallel' if parallel else ''}"] = {
+                    "records": stats.get("total", records),
+                    "failed": stats.get("failed", 0),
+                    "seconds": elapsed,
+                    "records_per_second": records / elapsed if elapsed else 0.0,
+                }
+        results[scenario] = scenario_result
+    results["model_latency_s"] = latency
+    return results
+
+def bench_peak_rss(work_dir: str, sizes_mb: List[int]) -> Dict[str, Any]:
+    """在独立子进程中执行媒体密集场景，测量峰值内存（不限制与限制媒体内存预算各一次）"""
+    results = {}
+    for size in sizes_mb:
+        for budget in (None, 0):
+            label = f"{size}MB" if budget is None else f"{size}MB_budget{budget}MB"
+            cmd = [sys.executable, os.path.abspath(__file__), "--rss-child",
+                   "--work-dir", work_dir, "--media-mb", str(size)]
+            if budget is not None:
+                cmd += ["--memory-budget-mb", str(budget)]
+            proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+            if proc.returncode != 0:
+                results[label] = {"error": proc.stderr.strip().splitlines()[-1:] or ["子进程失败"]}
+                continue
+            results[label] = json.loads(proc.stdout.strip().splitlines()[-1])
+    return results
+
+def _rss_child(work_dir: str, media_mb: int, memory_budget_mb: Optional[int] = None):
+    """peak_rss 的子进程入口：输出 JSON 到标准输出"""
+    import resource
+    from core.pipeline_controller import PipelineController
+
+    setup_logging(level='ERROR', log_file=None)
+    size = media_mb * MB
+    config = write_config(os.path.join(work_dir, f"media_{media_mb}mb.ini"), "media_heavy",
+                          output_image_bytes=size)
+    raw_input = make_input("media_heavy", work_dir, input_image_bytes=size, input_video_bytes=size)
+    budget = memory_budget_mb * MB if memory_budget_mb is not None else None
+    controller = PipelineController(config, memory_budget=budget)
+
+    # ru_maxrss 在 Linux 上以KB为单位，macOS 上以字节为单位
+    scale = 1 if sys.platform == "darwin" else 1024
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    start = time.perf_counter()
+    results = controller.execute_pipeline(raw_input, parallel=True)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    print(json.dumps({
+        "media_bytes": size,
+        "rounds_ok": sum(1 for r in results if r.get("status") == "success"),
+        "seconds": elapsed,
+        "baseline_rss_mb": baseline / MB,
+        "peak_rss_mb": peak / MB,
+        "peak_over_media": (peak - baseline) / size if size else 0.0,
+    }))
+
+def bench_prompt_render(iterations: int) -> Dict[str, Any]:
+    """提示词模板的编译与渲染耗时"""
+    from core.pipeline_memory import PipelineMemory
+    from processors.prompt_template import PromptTemplate
+
+    memory = PipelineMemory()
+    memory.store_round_memory({"topic": "benchmark"}, -1)
+    for idx in range(0, 8):
+        memory.store_round_memory({"text": "x" * 2000, "image": "", "video": ""}, idx)
+
+    results = {}
+    for scenario in SCENARIOS:
+        path = os.path.join(tempfile.gettempdir(), f"render_{os.getpid()}_{scenario}.ini")
+        write_config(path, scenario)
+        parser = configparser.ConfigParser()
+        parser.read(path, encoding="utf-8")
+        os.remove(path)
+        prompts = [parser[s]["prompt"] for s in parser.sections()]
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for prompt in prompts:
+                PromptTemplate(prompt)
+        compile_s = (time.perf_counter() - start) / (iterations * len(prompts))
+
+        templates = [PromptTemplate.compile(p) for p in prompts]
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for template in templates:
+                template.render(memory)
+        render_s = (time.perf_counter() - start) / (iterations * len(templates))
+
+        results[scenario] = {"compile_us": compile_s * 1e6, "render_us": render_s * 1e6}
+    return results
+
+def _git_revision() -> str:
+    """当前代码版本，用于对比不同版本的结果"""
+    try:
+        repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="流水线离线基准测试")
+    parser.add_argument("--output", help="结果JSON路径，默认 benchmarks/results/bench_<时间>.json")
+    parser.add_argument("--quick", action="store_true", help="减少迭代次数，快速得到粗略结果")
+    parser.add_argument("--only", nargs="+", choices=["round_overhead", "batch_throughput", "peak_rss", "prompt_render"],
+                        help="只运行指定的测量项")
+    parser.add_argument("--latency", type=float, default=0.05, help="吞吐量测试中假模型的延迟（秒）")
+    parser.add_argument("--media-sizes", type=int, nargs="+", default=[8, 32], help="峰值内存测试的媒体大小（MB）")
+    # 内部参数：峰值内存测试的子进程
+    parser.add_argument("--rss-child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--media-mb", type=int, default=8, help=argparse.SUPPRESS)
+    parser.add_argument("--memory-budget-mb", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.rss_child:
+        _rss_child(args.work_dir, args.media_mb, args.memory_budget_mb)
+        return
+
+    setup_logging(level='ERROR', log_file=None)
+    selected = set(args.only or ["round_overhead", "batch_throughput", "peak_rss", "prompt_render"])
+    iterations = 5 if args.quick else 30
+    records = 16 if args.quick else 64
+
+    report: Dict[str, Any] = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="pipeline_bench_") as work_dir:
+        if "round_overhead" in selected:
+            print("⏱️  round_overhead ...")
+            report["results"]["round_overhead"] = bench_round_overhead(work_dir, iterations)
+        if "batch_throughput" in selected:
+            print("⏱️  batch_throughput ...")
+            report["results"]["batch_throughput"] = bench_batch_throughput(
+                work_dir, records, args.latency, [1, 4] if args.quick else [1, 4, 16])
+        if "peak_rss" in selected:
+            print("⏱️  peak_rss ...")
+            report["results"]["peak_rss"] = bench_peak_rss(work_dir, args.media_sizes)
+        if "prompt_render" in selected:
+            print("⏱️  prompt_render ...")
+            report["results"]["prompt_render"] = bench_prompt_render(iterations * 100)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ 结果已保存: {output}")
+
+if __name__ == "__main__":
+    main()
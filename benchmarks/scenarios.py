@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+基准测试场景
+生成使用假模型（provider = fake）的流水线配置与输入，不发起任何网络请求
+"""
+
+import configparser
+import os
+from typing import Dict, Any, List, Tuple
+
+SCENARIOS = ("linear", "fan_out", "media_heavy")
+
+def _linear_sections(rounds: int = 5) -> List[Tuple[str, Dict[str, str]]]:
+    """线性链：每轮引用上一轮的文本"""
+    sections = [("step0", {"prompt": "请根据输入写一段描述，主题：{topic}"})]
+    for i in range(1, rounds):
+        sections.append((f"step{i}", {"prompt": f"第{i}步：在上一步的基础上继续完善。\n上一步输出：{{text{i}}}"}))
+    return sections
+
+def _fan_out_sections(branches: int = 4) -> List[Tuple[str, Dict[str, str]]]:
+    """扇出：一轮生成，多个分支并行分析，最后一轮汇总"""
+    sections = [("generate", {"prompt": "围绕主题 {topic} 生成一段初稿"})]
+    for b in range(branches):
+        sections.append((f"analyze{b}", {"prompt": f"从第{b}个角度分析以下内容：{{text1}}"}))
+    merged = "\n".join(f"分析{b}：{{text{b + 2}}}" for b in range(branches))
+    sections.append(("merge", {"prompt": f"汇总以下分析结果：\n{merged}"}))
+    return sections
+
+def _media_heavy_sections(output_image_bytes: int) -> List[Tuple[str, Dict[str, str]]]:
+    """媒体密集：生成图片，描述图片，再基于图片与描述重新编辑"""
+    return [
+        ("generate_image", {"prompt": "根据输入图片生成新图片：{topic}", "fake_image_bytes": str(output_image_bytes)}),
+        ("describe", {"prompt": "描述这张图片 {image1}"}),
+        ("reedit", {"prompt": "根据描述重新编辑图片 {image1}\n描述：{text2}", "fake_image_bytes": str(output_image_bytes)}),
+    ]
+
+def write_config(path: str, scenario: str, latency: float = 0.0, output_chars: int = 200,
+                 output_image_bytes: int = 256 * 1024) -> str:
+    """
+    写出场景的流水线配置文件
+
+    Args:
+        path: 配置文件路径
+        scenario: 场景名称，见 SCENARIOS
+        latency: 假模型每次调用的延迟（秒）
+        output_chars: 假模型输出文本长度
+        output_image_bytes: media_heavy 场景中生成图片的大小
+
+    Returns:
+        str: 配置文件路径
+    """
+    if scenario == "linear":
+        sections = _linear_sections()
+    elif scenario == "fan_out":
+        sections = _fan_out_sections()
+    elif scenario == "media_heavy":
+        sections = _media_heavy_sections(output_image_bytes)
+    else:
+        raise ValueError(f"未知场景: {scenario}")
+
+    parser = configparser.ConfigParser()
+    for name, options in sections:
+        parser[name] = {
+            "provider": "fake",
+            "model": f"fake-{name}",
+            "base_url": "",
+            "api_key": "",
+            "fake_latency": str(latency),
+            "fake_output_chars": str(output_chars),
+            **options,
+        }
+    with open(path, "w", encoding="utf-8") as f:
+        parser.write(f)
+    return path
+
+def make_input(scenario: str, media_dir: str, input_image_bytes: int = 0,
+               input_video_bytes: int = 0, index: int = 0) -> Dict[str, Any]:
+    """
+    生成场景输入；媒体文件写入 media_dir 后以路径传入，与真实使用方式一致
+
+    Args:
+        scenario: 场景名称
+        media_dir: 媒体文件目录
+        input_image_bytes: 输入图片大小，0表示不带图片
+        input_video_bytes: 输入视频大小，0表示不带视频
+        index: 输入序号，用于区分批量记录
+
+    Returns:
+        Dict[str, Any]: 流水线输入
+    """
+    raw_input: Dict[str, Any] = {
+        "text": f"基准测试输入 #{index}",
+        "filename": f"{scenario}_{index}",
+        "promptVariables": {"topic": f"{scenario}-{index}"},
+    }
+    if input_image_bytes:
+        raw_input["image"] = _write_media(media_dir, f"input_{input_image_bytes}.png",
+                                          b"\x89PNG\r\n\x1a\n", input_image_bytes)
+    if input_video_bytes:
+        raw_input["video"] = _write_media(media_dir, f"input_{input_video_bytes}.mp4",
+                                          b"\x00\x00\x00\x18ftypmp42", input_video_bytes)
+    return raw_input
+
+def _write_media(media_dir: str, name: str, header: bytes, size: int) -> str:
+    """写出指定大小的媒体文件（已存在则复用）"""
+    path = os.path.join(media_dir, name)
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(header)
+            f.write(os.urandom(max(0, size - len(header))))
+    return path
@@ -5,25 +5,32 @@
 """
 
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import configparser
 from utils.log_config import get_logger
 
 class ConfigReader:
     """配置读取器"""
     
-    def __init__(self, config_file: str = "config/config.ini"):
+    def __init__(self, config_file: str = "config/config.ini", content: Optional[str] = None):
+        """
+        Args:
+            config_file: 配置文件路径
+            content: 已读取的配置文本，提供时不再读取文件
+        """
         self.config_file = config_file
         self.config = configparser.ConfigParser()
         self.logger = get_logger('config.reader')
-        self.load_config()
+        self.load_config(content)
     
-    def load_config(self):
+    def load_config(self, content: Optional[str] = None):
         """加载配置文件"""
-        if not os.path.exists(self.config_file):
-            raise FileNotFoundError(f"配置文件不存在: {self.config_file}")
-        
-        self.config.read(self.config_file, encoding='utf-8')
+        if content is not None:
+            self.config.read_string(content, source=self.config_file)
+        else:
+            if not os.path.exists(self.config_file):
+                raise FileNotFoundError(f"配置文件不存在: {self.config_file}")
+            self.config.read(self.config_file, encoding='utf-8')
         self.logger.info(f"📋 成功加载配置文件: {self.config_file}")
     
     def get_pipeline_configs(self) -> List[Dict[str, Any]]:
@@ -40,7 +47,7 @@ class ConfigReader:
                 configs.append(config)
         
         for i, config in enumerate(configs):
-            self.logger.info(f"  {i+1}. {config['section_name']}: {config['model']}")
+            self.logger.debug(f"  {i+1}. {config['section_name']}: {config['model']}")
         
         return configs
     
@@ -58,7 +65,7 @@ class ConfigReader:
         
         # 读取其他配置项（如prompt等）
         for option in self.config.options(section):
-            if option not in ["max_tokens", "temperature", "prompt"]:
+            if option not in ["max_tokens", "temperature"]:
                 config[option] = self.config.get(section, option)
         
         return config 
\ No newline at end of file
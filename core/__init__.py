@@ -4,10 +4,32 @@
 """
 from .pipeline_controller import PipelineController
 from .pipeline_memory import PipelineMemory
+from .pipeline_graph import PipelineGraph
 from .langchain_llm import LangChainLLM
+from .llm_cache import LLMCache
+from .checkpoint_store import CheckpointStore
+from .client_registry import ModelClientRegistry, get_default_registry
+from .batch_runner import BatchRunner
+from .fake_chat_model import FakeChatModel
+from .request_coalescer import RequestCoalescer
+from .compiled_config import CompiledConfig, load_compiled_config
+from .round_cache import RoundCache
+from .work_queue import WorkQueue
 
 __all__ = [
     'PipelineController',
     'PipelineMemory', 
+    'PipelineGraph',
     'LangChainLLM',
+    'LLMCache',
+    'CheckpointStore',
+    'ModelClientRegistry',
+    'get_default_registry',
+    'BatchRunner',
+    'FakeChatModel',
+    'RequestCoalescer',
+    'CompiledConfig',
+    'load_compiled_config',
+    'RoundCache',
+    'WorkQueue',
 ]
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+自适应并发限制模块
+按 (provider, base_url) 自动调整同时进行的模型请求数：请求成功且上限被用到时加性增加，
+遇到限流、过载或超时时乘性减少（AIMD），无需手动调参即可逼近提供商的实际容量
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Tuple, Deque
+from utils.log_config import get_logger
+
+logger = get_logger('core.adaptive_limiter')
+
+# 请求结果
+SUCCESS = "success"
+THROTTLED = "throttled"  # 限流、过载或超时：降低并发
+IGNORED = "ignored"      # 与容量无关的错误（参数错误、鉴权失败等）：不调整
+
+# 一个请求的许可：(开始时间, 获取许可时的在途请求数)
+Permit = Tuple[float, int]
+
+class _Waiter:
+    """排队等待许可的调用方：同步线程使用 event，异步任务使用所在事件循环的 future"""
+
+    def __init__(self, event: Optional[threading.Event] = None, loop=None, future=None):
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.granted = False
+        self.inflight = 0
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 并发限制器，线程安全，同步线程与异步任务可共享
+
+    - 成功：在并发上限确实被用到（在途请求数不少于上限的一半）时加性增加，每经过约一个上限数量的请求加1
+    - 限流/过载/超时：按 throttle_ratio 减少
+    - 延迟不参与调整：模型请求的延迟主要取决于生成的文本长度，长短响应混合时延迟波动很大，
+      以延迟膨胀作为过载信号会把上限误降到最低；延迟只做统计
+    - 每个“窗口”最多减少一次：只有在上一次减少之后发出的请求才能再次触发减少，
+      避免同一波限流响应把上限连续砍到最低
+    """
+
+    def __init__(self, name: str = "", initial_limit: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 throttle_ratio: float = 0.5):
+        """
+        Args:
+            name: 名称，用于日志
+            initial_limit: 初始并发上限
+            min_limit: 并发上限的下限
+            max_limit: 并发上限的上限
+            throttle_ratio: 限流/过载/超时时的减少系数
+        """
+        self.name = name
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.throttle_ratio = throttle_ratio
+
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.inflight = 0
+        self.rtt: Optional[float] = None  # 成功请求延迟的指数移动平均（仅统计）
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._waiters: Deque[_Waiter] = deque()
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return int(self._limit)
+
+    def acquire(self) -> Permit:
+        """阻塞直到取得许可；等待的调用方按先来先得的顺序获得许可"""
+        with self._lock:
+            if self.inflight < self.limit and not self._waiters:
+                self.inflight += 1
+                return time.monotonic(), self.inflight
+            waiter = _Waiter(threading.Event())
+            self._waiters.append(waiter)
+        waiter.event.wait()
+        return time.monotonic(), waiter.inflight
+
+    async def aacquire(self) -> Permit:
+        """acquire 的异步版本，等待时不阻塞事件循环"""
+        import asyncio
+        with self._lock:
+            if self.inflight < self.limit and not self._waiters:
+                self.inflight += 1
+                return time.monotonic(), self.inflight
+            loop = asyncio.get_running_loop()
+            waiter = _Waiter(loop=loop, future=loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter.future
+        except BaseException:
+            # 等待期间被取消：已分配的许可归还，未分配的移出队列
+            with self._lock:
+                if waiter.granted:
+                    self.inflight -= 1
+                    self._grant()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+        return time.monotonic(), waiter.inflight
+
+    def release(self, permit: Permit, outcome: str = SUCCESS):
+        """
+        归还许可并根据结果调整上限
+
+        Args:
+            permit: acquire 返回的许可
+            outcome: SUCCESS、THROTTLED 或 IGNORED
+        """
+        start, inflight_at_start = permit
+        now = time.monotonic()
+        with self._lock:
+            self.inflight -= 1
+            if outcome == THROTTLED:
+                self.throttled += 1
+                self._decrease(start, now, self.throttle_ratio, "限流/过载/超时")
+            elif outcome == SUCCESS:
+                self._on_success(start, now, inflight_at_start)
+            self._grant()
+
+    def _grant(self):
+        """按排队顺序把空出的许可直接分配给等待方（调用方持有锁）"""
+        while self._waiters and self.inflight < self.limit:
+            waiter = self._waiters.popleft()
+            self.inflight += 1
+            waiter.granted = True
+            waiter.inflight = self.inflight
+            if waiter.event is not None:
+                waiter.event.set()
+                continue
+            try:
+                waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+            except RuntimeError:
+                # 事件循环已关闭，许可收回
+                self.inflight -= 1
+
+    def _on_success(self, start: float, now: float, inflight_at_start: int):
+        """成功请求：更新延迟统计，上限被用到时加性增加"""
+        rtt = now - start
+        self.rtt = rtt if self.rtt is None else self.rtt + (rtt - self.rtt) * 0.1
+        if inflight_at_start * 2 >= self._limit:
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+
+    def _decrease(self, start: float, now: float, ratio: float, reason: str):
+        """乘性减少；上一次减少之前发出的请求不再触发减少"""
+        if start < self._last_decrease:
+            return
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * ratio)
+        self._last_decrease = now
+        if self.limit != previous:
+            logger.info(f"📉 {self.name} {reason}，并发上限 {previous} -> {self.limit}")
+
+    def set_max_limit(self, max_limit: int):
+        """修改并发上限的上限，当前上限超过时随之降低"""
+        with self._lock:
+            self.max_limit = max(self.min_limit, int(max_limit))
+            self._limit = min(self._limit, float(self.max_limit))
+
+    def stats(self) -> Dict[str, Any]:
+        """当前状态"""
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "inflight": self.inflight,
+                "rtt": self.rtt,
+                "throttled": self.throttled,
+            }
+
+def _wake(waiter):
+    """唤醒等待中的异步任务（任务已取消时跳过，许可由取消处理归还）"""
+    if not waiter.done():
+        waiter.set_result(None)
+
+# 并发限制器按 (provider, base_url) 在进程内共享，所有配置节与流水线共同遵守同一上限
+_limiters: Dict[Tuple[str, str], AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_concurrency_limiter(provider_key: Tuple[str, str], max_limit: Optional[int] = None) -> AdaptiveConcurrencyLimiter:
+    """
+    获取提供商端点的共享自适应并发限制器
+
+    Args:
+        provider_key: (provider, base_url)
+        max_limit: 并发上限的上限，None时使用默认值
+
+    Returns:
+        AdaptiveConcurrencyLimiter: 共享的限制器
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(provider_key)
+        if limiter is None:
+            name = f"{provider_key[0]}@{provider_key[1]}" if provider_key[1] else provider_key[0]
+            limiter = AdaptiveConcurrencyLimiter(name) if max_limit is None else \
+                AdaptiveConcurrencyLimiter(name, max_limit=max_limit)
+            _limiters[provider_key] = limiter
+        elif max_limit is not None and limiter.max_limit != max_limit:
+            logger.warning(f"端点 {limiter.name} 的并发上限被重新配置: max_concurrency={max_limit}")
+            limiter.set_max_limit(max_limit)
+        return limiter
+
+def concurrency_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """全部共享限制器的状态，键为 provider@base_url"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
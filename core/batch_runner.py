@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+批量运行模块
+从JSONL文件读取多条输入，并发执行流水线并逐条保存结果
+"""
+
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Iterator, Optional
+from core.checkpoint_store import CheckpointStore
+from core.llm_cache import LLMCache
+from core.pipeline_controller import PipelineController
+from core.request_coalescer import RequestCoalescer
+from core.round_cache import RoundCache
+from processors.output_processor import FileOutputProcessor
+from processors.output_writer import OutputWriter
+from utils.log_config import get_logger
+from utils.media_worker_pool import MediaWorkerPool
+from utils.metrics import MetricsSink
+
+def iter_jsonl_records(input_file: str, logger) -> Iterator[Dict[str, Any]]:
+    """
+    逐行读取JSONL输入文件，跳过空行与无法解析的行
+
+    Args:
+        input_file: JSONL文件路径
+        logger: 记录跳过原因的日志器
+
+    Yields:
+        Dict[str, Any]: 输入字典，缺少filename时使用行号生成
+    """
+    with open(input_file, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.error(f"第{line_no}行JSON解析失败，已跳过: {e}")
+                continue
+            if not isinstance(record, dict):
+                logger.error(f"第{line_no}行不是JSON对象，已跳过")
+                continue
+            record.setdefault("filename", f"record_{line_no}")
+            yield record
+
+class BatchRunner:
+    """批量运行器 - 以有限并发执行多条流水线输入"""
+
+    def __init__(self, config_file: str = "config/config.ini", concurrency: int = 4,
+                 output_dir: str = "outputs", save_mode: str = "filename",
+                 parallel_rounds: bool = False, cache: Optional[LLMCache] = None,
+                 checkpoint_store: Optional[CheckpointStore] = None, resume: bool = False,
+                 metrics_sink: Optional[MetricsSink] = None, media_pool: Optional[MediaWorkerPool] = None,
+                 output_writer: Optional[OutputWriter] = None, coalescer: Optional[RequestCoalescer] = None,
+                 memory_budget: Optional[int] = None, round_cache: Optional[RoundCache] = None):
+        """
+        初始化批量运行器
+
+        Args:
+            config_file: 流水线配置文件
+            concurrency: 同时执行的流水线数量上限
+            output_dir: 输出目录
+            save_mode: 传给FileOutputProcessor的保存模式
+            parallel_rounds: 是否在单条记录内按依赖图并行执行轮次
+            cache: 可选的LLM响应缓存，所有控制器共享
+            checkpoint_store: 可选的检查点存储，以记录的filename作为运行ID
+            resume: 是否从检查点恢复已完成的轮次
+            metrics_sink: 可选的指标接收器，所有控制器共享
+            media_pool: 可选的媒体工作进程池，所有控制器共享
+            output_writer: 可选的后台输出写入器，提供时每轮完成即写出，output_dir/save_mode 以写入器为准
+            coalescer: 可选的请求合并器，所有控制器共享，重复记录或相同提示词的并发请求只调用一次模型
+            memory_budget: 可选的每条记录媒体内存预算（字节），超出部分溢出到临时文件
+            round_cache: 可选的轮次结果缓存，所有控制器共享，配置与引用轮次未变的轮次跨运行复用输出
+        """
+        self.config_file = config_file
+        self.concurrency = max(1, int(concurrency))
+        self.output_dir = output_dir
+        self.save_mode = save_mode
+        self.parallel_rounds = parallel_rounds
+        self.cache = cache
+        self.checkpoint_store = checkpoint_store
+        self.resume = resume
+        self.metrics_sink = metrics_sink
+        self.media_pool = media_pool
+        self.output_writer = output_writer
+        self.coalescer = coalescer
+        self.memory_budget = memory_budget
+        self.round_cache = round_cache
+        self.output_processor = FileOutputProcessor()
+        self.logger = get_logger('pipeline.batch_runner')
+
+        # 控制器池：PipelineController 持有单次运行的状态（memory、错误标志），
+        # 因此每个并发槽位使用独立的控制器，并在记录之间复用
+        self._controllers: "queue.Queue[PipelineController]" = queue.Queue()
+        self._controller_count = 0
+        self._lock = threading.Lock()
+
+    def iter_records(self, input_file: str) -> Iterator[Dict[str, Any]]:
+        """
+        逐行读取JSONL输入文件，每行是一个与 execute_pipeline 相同格式的输入字典
+
+        Args:
+            input_file: JSONL文件路径
+
+        Yields:
+            Dict[str, Any]: 输入字典，缺少filename时使用行号生成
+        """
+        return iter_jsonl_records(input_file, self.logger)
+
+    def run(self, input_file: str) -> Dict[str, Any]:
+        """
+        执行批量任务，每条记录完成后立即写出结果
+
+        Args:
+            input_file: JSONL文件路径
+
+        Returns:
+            Dict[str, Any]: 统计信息，包含total、success、failed
+        """
+        stats = {"total": 0, "success": 0, "failed": 0}
+        self.logger.info(f"🚀 开始批量执行: {input_file} (并发: {self.concurrency})")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = set()
+            for record in self.iter_records(input_file):
+                pending.add(executor.submit(self._run_record, record))
+                stats["total"] += 1
+                # 限制已提交但未完成的任务数量，避免一次性读入全部记录
+                if len(pending) >= self.concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._handle_done(done, stats)
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                self._handle_done(done, stats)
+
+        if self.output_writer is not None:
+            # 等待后台写入完成，返回时输出已全部落盘
+            self.output_writer.flush()
+
+        self.logger.info(f"🎉 批量执行完成: 共{stats['total']}条，成功{stats['success']}条，失败{stats['failed']}条")
+        if self.cache is not None:
+            self.logger.info(f"LLM缓存统计: {self.cache.stats()}")
+        if self.coalescer is not None:
+            self.logger.info(f"请求合并统计: {self.coalescer.stats()}")
+        return stats
+
+    def _run_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """在工作线程中执行单条记录"""
+        controller = self._acquire_controller()
+        filename = record["filename"]
+        on_round = self.output_writer.round_callback(filename) if self.output_writer is not None else None
+        try:
+            results = controller.execute_pipeline(record, parallel=self.parallel_rounds, resume=self.resume,
+                                                  on_round=on_round)
+            if self.output_writer is not None:
+                self.output_writer.finish_record(filename)
+            return {
+                "filename": filename,
+                "results": results,
+                "error_occurred": controller.error_occurred,
+                "error_message": controller.error_message,
+            }
+        finally:
+            self._release_controller(controller)
+
+    def _handle_done(self, done, stats: Dict[str, Any]):
+        """处理已完成的记录：统计并写出结果"""
+        for future in done:
+            try:
+                record_result = future.result()
+            except Exception as e:
+                stats["failed"] += 1
+                self.logger.error(f"记录执行异常: {e}")
+                continue
+
+            filename = record_result["filename"]
+            if record_result["error_occurred"]:
+                stats["failed"] += 1
+                self.logger.error(f"记录 {filename} 执行失败: {record_result['error_message']}")
+            else:
+                stats["success"] += 1
+
+            self.save_record(record_result)
+
+    def execute_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        执行单条记录并写出结果，可在任意线程调用（队列工作进程逐条领取记录时使用）
+
+        Args:
+            record: 输入字典，需包含filename
+
+        Returns:
+            Dict[str, Any]: filename、results、error_occurred、error_message
+        """
+        record_result = self._run_record(record)
+        self.save_record(record_result)
+        return record_result
+
+    def save_record(self, record_result: Dict[str, Any]):
+        """写出单条记录的结果；使用后台写入器时每轮已写出，这里不再重复保存"""
+        if record_result["results"] and self.output_writer is None:
+            self.output_processor.process(
+                record_result["results"],
+                output_dir=self.output_dir,
+                filename=record_result["filename"],
+                save_mode=self.save_mode
+            )
+
+    def _acquire_controller(self) -> PipelineController:
+        """从池中取出控制器，池为空且未达上限时新建"""
+        try:
+            return self._controllers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._controller_count < self.concurrency
+            if create:
+                self._controller_count += 1
+        if create:
+            try:
+                return PipelineController(self.config_file, cache=self.cache,
+                                          checkpoint_store=self.checkpoint_store,
+                                          metrics_sink=self.metrics_sink,
+                                          media_pool=self.media_pool,
+                                          coalescer=self.coalescer,
+                                          memory_budget=self.memory_budget,
+                                          round_cache=self.round_cache)
+            except Exception:
+                with self._lock:
+                    self._controller_count -= 1
+                raise
+        return self._controllers.get()
+
+    def _release_controller(self, controller: PipelineController):
+        """归还控制器"""
+        self._controllers.put(controller)
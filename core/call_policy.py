@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+模型调用策略模块
+为模型调用提供重试、指数退避（带抖动）、按提供商的令牌桶限流与超时控制
+"""
+
+import random
+import sys
+import threading
+import time
+from typing import Dict, Any, Callable, Optional, Tuple, Awaitable
+from core.adaptive_limiter import (
+    AdaptiveConcurrencyLimiter, get_concurrency_limiter, SUCCESS, THROTTLED, IGNORED
+)
+from utils.log_config import get_logger
+
+logger = get_logger('core.call_policy')
+
+# 可重试的HTTP状态码
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+# 可重试的异常类名关键字（覆盖各提供商SDK的限流/超时/连接异常）
+RETRYABLE_ERROR_NAMES = ("RateLimit", "Timeout", "APIConnection", "ServiceUnavailable",
+                         "InternalServer", "Overloaded", "ResourceExhausted")
+# 表示提供商容量不足的状态码与异常类名关键字，自适应并发限制器据此降低并发
+OVERLOAD_STATUS_CODES = {429, 503, 529}
+OVERLOAD_ERROR_NAMES = ("RateLimit", "Timeout", "Overloaded", "ResourceExhausted")
+
+def _is_timeout(error: Exception) -> bool:
+    """超时异常（同步或异步）"""
+    if isinstance(error, TimeoutError):
+        return True
+    # asyncio 只在异步路径中按需导入；未导入时不可能出现 asyncio.TimeoutError
+    asyncio = sys.modules.get("asyncio")
+    return asyncio is not None and isinstance(error, asyncio.TimeoutError)
+
+def _status_code(error: Exception) -> Optional[int]:
+    """异常携带的HTTP状态码"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+def is_retryable_error(error: Exception) -> bool:
+    """判断异常是否值得重试：限流、超时、连接错误与服务端5xx"""
+    if isinstance(error, ConnectionError) or _is_timeout(error):
+        return True
+    if _status_code(error) in RETRYABLE_STATUS_CODES:
+        return True
+    name = type(error).__name__
+    return any(keyword in name for keyword in RETRYABLE_ERROR_NAMES)
+
+def is_overload_error(error: Exception) -> bool:
+    """判断异常是否表示提供商容量不足：限流、过载与超时"""
+    if _is_timeout(error) or _status_code(error) in OVERLOAD_STATUS_CODES:
+        return True
+    name = type(error).__name__
+    return any(keyword in name for keyword in OVERLOAD_ERROR_NAMES)
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """读取响应头中的 Retry-After（秒）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """
+    令牌桶，线程安全
+
+    采用预约方式：调用方先扣减令牌并得到需要等待的时间，再在锁外等待，
+    因此同步线程与异步任务可以共享同一个桶
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.refill_per_second = self.capacity / 60.0
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate_per_minute: float):
+        """调整速率，已有令牌不超过新容量"""
+        with self._lock:
+            self.capacity = float(rate_per_minute)
+            self.refill_per_second = self.capacity / 60.0
+            self.tokens = min(self.tokens, self.capacity)
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """
+        预约令牌
+
+        Args:
+            amount: 需要的令牌数，超过容量时按容量计
+
+        Returns:
+            float: 需要等待的秒数
+        """
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+            self.updated_at = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.refill_per_second
+
+class ProviderRateLimiter:
+    """单个提供商端点的限流器：每分钟请求数与每分钟token数"""
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+
+    def tighten(self, rpm: Optional[float] = None, tpm: Optional[float] = None) -> bool:
+        """
+        合并另一处配置的限额：每项取较严格（较小）的值，未设置的项不放宽已有限额
+
+        Returns:
+            bool: 限额是否发生变化
+        """
+        changed = False
+        if rpm and (not self.rpm or rpm < self.rpm):
+            self.rpm = rpm
+            if self.request_bucket:
+                self.request_bucket.set_rate(rpm)
+            else:
+                self.request_bucket = TokenBucket(rpm)
+            changed = True
+        if tpm and (not self.tpm or tpm < self.tpm):
+            self.tpm = tpm
+            if self.token_bucket:
+                self.token_bucket.set_rate(tpm)
+            else:
+                self.token_bucket = TokenBucket(tpm)
+            changed = True
+        return changed
+
+    def reserve(self, tokens: int = 0) -> float:
+        """预约一次请求，返回需要等待的秒数"""
+        wait = 0.0
+        if self.request_bucket:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket and tokens:
+            wait = max(wait, self.token_bucket.reserve(tokens))
+        return wait
+
+# 限流器按 (provider, base_url) 在进程内共享，所有配置节与流水线共同遵守同一配额
+_rate_limiters: Dict[Tuple[str, str], ProviderRateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider_key: Tuple[str, str], rpm: Optional[float] = None,
+                     tpm: Optional[float] = None) -> Optional[ProviderRateLimiter]:
+    """
+    获取提供商端点的共享限流器
+
+    同一端点只有一个限流器，所有配置节共同消耗同一配额；各配置节的限额不同时取最严格的值
+
+    Args:
+        provider_key: (provider, base_url)
+        rpm: 每分钟请求数上限
+        tpm: 每分钟token数上限
+
+    Returns:
+        Optional[ProviderRateLimiter]: 未配置限额时返回None
+    """
+    if not rpm and not tpm:
+        return None
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(provider_key)
+        if limiter is None:
+            limiter = ProviderRateLimiter(rpm, tpm)
+            _rate_limiters[provider_key] = limiter
+        elif limiter.tighten(rpm, tpm):
+            logger.warning(f"端点 {provider_key} 的限额配置不一致，按最严格的值执行: rpm={limiter.rpm}, tpm={limiter.tpm}")
+        return limiter
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：约4个字符一个token"""
+    return len(text or "") // 4 + 1
+
+def _optional_number(config: Dict[str, Any], key: str, cast=float):
+    """读取可选的数值配置项"""
+    value = config.get(key)
+    if value is None or str(value).strip() == "":
+        return None
+    return cast(value)
+
+class CallPolicy:
+    """模型调用策略：重试、退避、限流、自适应并发与超时"""
+
+    def __init__(self, max_retries: int = 0, backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 timeout: Optional[float] = None, rate_limiter: Optional[ProviderRateLimiter] = None,
+                 concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None):
+        """
+        Args:
+            max_retries: 最大重试次数（不含首次调用）
+            backoff_base: 退避基数（秒），第n次重试的退避上限为 base * 2^n
+            backoff_max: 单次退避的最大秒数
+            timeout: 单次调用超时（秒）
+            rate_limiter: 提供商共享限流器
+            concurrency_limiter: 提供商共享的自适应并发限制器，每次调用（含重试）占用一个许可
+        """
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], provider_key: Tuple[str, str]) -> "CallPolicy":
+        """
+        从配置节构建调用策略，支持的配置项：
+        max_retries、retry_backoff、retry_backoff_max、timeout、rpm、tpm、
+        adaptive_concurrency（true时启用自适应并发）、max_concurrency（自适应并发上限的上限）
+
+        Args:
+            config: 配置节字典
+            provider_key: (provider, base_url)，用于共享限流器与并发限制器
+
+        Returns:
+            CallPolicy: 调用策略
+        """
+        return cls(
+            max_retries=_optional_number(config, "max_retries", int) or 0,
+            backoff_base=_optional_number(config, "retry_backoff") or 1.0,
+            backoff_max=_optional_number(config, "retry_backoff_max") or 30.0,
+            timeout=_optional_number(config, "timeout"),
+            rate_limiter=get_rate_limiter(provider_key, _optional_number(config, "rpm"), _optional_number(config, "tpm")),
+            concurrency_limiter=get_concurrency_limiter(provider_key, _optional_number(config, "max_concurrency", int))
+            if str(config.get("adaptive_concurrency", "")).strip().lower() in ("1", "true", "yes", "on") else None,
+        )
+
+    def _release(self, permit, error: Optional[BaseException] = None):
+        """归还并发许可：成功、容量不足或与容量无关的错误（含取消）"""
+        if permit is None:
+            return
+        if error is None:
+            outcome = SUCCESS
+        else:
+            outcome = THROTTLED if is_overload_error(error) else IGNORED
+        self.concurrency_limiter.release(permit, outcome)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """计算退避时间：优先使用 Retry-After，否则使用带完全抖动的指数退避"""
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _should_retry(self, attempt: int, error: Exception, can_retry: Optional[Callable[[], bool]]) -> bool:
+        """判断是否继续重试"""
+        if attempt >= self.max_retries or not is_retryable_error(error):
+            return False
+        return can_retry() if can_retry else True
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0,
+             can_retry: Optional[Callable[[], bool]] = None) -> Any:
+        """
+        按策略执行同步调用；设置了 timeout 时每次调用在单独的线程中执行，超时抛出 TimeoutError，
+        与异步路径一样按超时重试（超时的调用无法中断，其结果被丢弃）
+
+        Args:
+            fn: 无参调用
+            estimated_tokens: 预估token数，用于tpm限流
+            can_retry: 额外的重试条件（例如流式调用尚未输出任何内容）
+
+        Returns:
+            Any: fn 的返回值，重试耗尽后抛出最后一次异常
+        """
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                wait = self.rate_limiter.reserve(estimated_tokens)
+                if wait > 0:
+                    time.sleep(wait)
+            permit = self.concurrency_limiter.acquire() if self.concurrency_limiter else None
+            try:
+                result = self._run_with_timeout(fn)
+            except Exception as e:
+                self._release(permit, e)
+                if not self._should_retry(attempt, e, can_retry):
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                logger.warning(f"模型调用失败，{delay:.1f}秒后第{attempt}次重试: {e}")
+                time.sleep(delay)
+                continue
+            self._release(permit)
+            return result
+
+    def _run_with_timeout(self, fn: Callable[[], Any]) -> Any:
+        """执行同步调用，超过 timeout 时抛出 TimeoutError"""
+        if not self.timeout:
+            return fn()
+        from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="call-policy", daemon=True).start()
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            if future.done():
+                # fn 自身抛出的超时异常
+                raise
+            raise TimeoutError(f"模型调用超过 {self.timeout} 秒未完成") from None
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], estimated_tokens: int = 0,
+                    can_retry: Optional[Callable[[], bool]] = None) -> Any:
+        """
+        按策略执行异步调用，超时通过 asyncio.wait_for 控制
+
+        Args:
+            fn: 返回协程的无参调用
+            estimated_tokens: 预估token数，用于tpm限流
+            can_retry: 额外的重试条件
+
+        Returns:
+            Any: 协程的返回值，重试耗尽后抛出最后一次异常
+        """
+        import asyncio
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                wait = self.rate_limiter.reserve(estimated_tokens)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            permit = await self.concurrency_limiter.aacquire() if self.concurrency_limiter else None
+            try:
+                if self.timeout:
+                    result = await asyncio.wait_for(fn(), timeout=self.timeout)
+                else:
+                    result = await fn()
+            except BaseException as e:
+                self._release(permit, e)
+                if not isinstance(e, Exception) or not self._should_retry(attempt, e, can_retry):
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                logger.warning(f"模型调用失败，{delay:.1f}秒后第{attempt}次重试: {e}")
+                await asyncio.sleep(delay)
+                continue
+            self._release(permit)
+            return result
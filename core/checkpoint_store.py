@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+检查点存储模块
+按运行ID将每轮输出（含媒体）持久化到磁盘，支持失败后从断点继续执行
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+from utils.log_config import get_logger
+from utils.media_store import MediaHandle
+
+# 计算指纹时忽略的配置项：密钥不影响输出，模板对象由prompt派生
+_FINGERPRINT_EXCLUDED_KEYS = ("api_key", "prompt_template")
+
+def round_fingerprint(config: Dict[str, Any], input_dict: Dict[str, Any]) -> str:
+    """
+    计算单轮指纹：配置节内容 + 渲染后的最终输入（文本与媒体摘要）
+
+    上游轮次的输出通过 {textN}/{imageN} 进入最终输入，因此上游变化也会改变指纹
+
+    Args:
+        config: 配置节字典
+        input_dict: 本轮最终输入
+
+    Returns:
+        str: sha256十六进制摘要
+    """
+    h = hashlib.sha256()
+    for key in sorted(config):
+        if key in _FINGERPRINT_EXCLUDED_KEYS:
+            continue
+        h.update(f"{key}={config[key]}".encode("utf-8"))
+        h.update(b"\0")
+    update_input_digest(h, input_dict)
+    return h.hexdigest()
+
+def update_input_digest(h: Any, input_dict: Dict[str, Any]):
+    """将输入内容（文本与媒体摘要）写入哈希对象，媒体只使用已有的内容摘要"""
+    h.update(str(input_dict.get("text", "")).encode("utf-8"))
+    for kind in ("image", "video"):
+        h.update(b"\0")
+        value = input_dict.get(kind)
+        if isinstance(value, MediaHandle):
+            h.update(value.sha256.encode("ascii"))
+        elif value:
+            h.update(hashlib.sha256(str(value).encode("utf-8")).digest())
+
+class MediaRecordStore:
+    """
+    轮次输出的磁盘存储基类：输出写为JSON，其中的媒体按内容摘要存放在 media/ 下，
+    相同内容只保存一份，读取时以内存映射的文件句柄还原
+    """
+
+    def __init__(self, root_dir: str):
+        self.root = Path(root_dir)
+        self.media_dir = self.root / "media"
+        self.media_dir.mkdir(parents=True, exist_ok=True)
+
+    def serialize_output(self, output: Dict[str, Any]) -> Dict[str, Any]:
+        """将输出中的媒体句柄（含多图列表中的句柄）写入媒体目录，替换为摘要引用"""
+        record = {}
+        for key, value in output.items():
+            if isinstance(value, list):
+                record[key] = [self._serialize_media(item) for item in value]
+            else:
+                record[key] = self._serialize_media(value)
+        return record
+
+    def _serialize_media(self, value: Any) -> Any:
+        """写入单个媒体句柄并返回摘要引用，其他值原样返回"""
+        if not isinstance(value, MediaHandle):
+            return value
+        media_file = self.media_dir / value.sha256
+        if not media_file.exists():
+            self._write_media(value, media_file)
+        return {"__media__": value.sha256, "mime": value.mime}
+
+    def deserialize_output(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """还原输出，媒体以内存映射的文件句柄返回，不读入内存"""
+        output = {}
+        for key, value in record.items():
+            if isinstance(value, list):
+                output[key] = [self._deserialize_media(item) for item in value]
+            else:
+                output[key] = self._deserialize_media(value)
+        return output
+
+    def _deserialize_media(self, value: Any) -> Any:
+        """按摘要还原单个媒体句柄，媒体文件缺失时返回空字符串"""
+        if not (isinstance(value, dict) and "__media__" in value):
+            return value
+        media_file = self.media_dir / value["__media__"]
+        if not media_file.exists():
+            return ""
+        return MediaHandle(path=str(media_file), mime=value["mime"], sha256=value["__media__"])
+
+    def _write_media(self, handle: MediaHandle, media_file: Path):
+        """原子写入媒体文件；临时文件名按进程与线程区分，多个写入方同时写同一媒体也不会冲突"""
+        tmp = media_file.with_name(f"{media_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        content = handle.data
+        try:
+            with open(tmp, "wb") as f:
+                f.write(content)
+        finally:
+            if isinstance(content, mmap.mmap):
+                content.close()
+        os.replace(tmp, media_file)
+
+class CheckpointStore(MediaRecordStore):
+    """
+    检查点存储
+
+    目录结构：
+    checkpoints/
+    ├── media/{sha256}          # 媒体内容按摘要存储，多次运行共享
+    └── runs/{run_id}/
+        ├── round1.json         # memory[1] 即第0轮输出
+        └── round2.json
+    """
+
+    def __init__(self, root_dir: str = "checkpoints"):
+        super().__init__(root_dir)
+        self.runs_dir = self.root / "runs"
+        self.runs_dir.mkdir(parents=True, exist_ok=True)
+        self.logger = get_logger('core.checkpoint_store')
+
+    def _run_dir(self, run_id: str) -> Path:
+        """运行目录，run_id 中的路径分隔符会被替换"""
+        safe_id = str(run_id).replace(os.sep, "_").replace("/", "_")
+        return self.runs_dir / safe_id
+
+    def save_round(self, run_id: str, memory_index: int, output: Dict[str, Any], fingerprint: str):
+        """
+        保存一轮输出
+
+        Args:
+            run_id: 运行ID
+            memory_index: memory索引（第i轮输出对应 i+1）
+            output: 轮次输出字典
+            fingerprint: 轮次指纹
+        """
+        run_dir = self._run_dir(run_id)
+        run_dir.mkdir(parents=True, exist_ok=True)
+        record = {"fingerprint": fingerprint, "output": self.serialize_output(output)}
+
+        # 先写临时文件再原子替换，避免中途失败留下半个检查点
+        target = run_dir / f"round{memory_index}.json"
+        tmp = target.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp, target)
+        self.logger.debug(f"💾 保存检查点: {target}")
+
+    def load_round(self, run_id: str, memory_index: int, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        读取一轮输出，指纹不一致（配置或输入已变化）时视为不存在
+
+        Args:
+            run_id: 运行ID
+            memory_index: memory索引
+            fingerprint: 当前轮次指纹
+
+        Returns:
+            Optional[Dict[str, Any]]: 保存的输出，不存在或已失效时返回None
+        """
+        target = self._run_dir(run_id) / f"round{memory_index}.json"
+        if not target.exists():
+            return None
+        try:
+            with open(target, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"检查点读取失败，将重新执行: {target} ({e})")
+            return None
+        if record.get("fingerprint") != fingerprint:
+            return None
+        return self.deserialize_output(record["output"])
+
+    def clear(self, run_id: str):
+        """删除指定运行的检查点（媒体文件保留，可能被其他运行引用）"""
+        shutil.rmtree(self._run_dir(run_id), ignore_errors=True)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+模型客户端注册表模块
+按 (provider, base_url, api_key, model) 共享模型实例，显式传入凭据而不修改环境变量
+"""
+
+import threading
+from typing import Dict, Any, Optional, Tuple
+from utils.log_config import get_logger
+
+class ModelClientRegistry:
+    """
+    模型客户端注册表，线程安全
+
+    同一端点、密钥和模型的多个配置节（以及多次流水线运行）共享同一个模型实例，
+    从而复用其内部的HTTP连接池
+    """
+
+    def __init__(self):
+        self.logger = get_logger('core.client_registry')
+        self._clients: Dict[Tuple, Any] = {}
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(provider: str, model: str, base_url: Optional[str], api_key: Optional[str], **model_kwargs) -> Tuple:
+        """生成客户端键"""
+        return (provider, base_url or "", api_key or "", model, tuple(sorted(model_kwargs.items())))
+
+    def get_client(self, provider: str, model: str, base_url: Optional[str] = None,
+                   api_key: Optional[str] = None, **model_kwargs) -> Any:
+        """
+        获取或创建模型客户端
+
+        Args:
+            provider: init_chat_model 的提供商前缀，如 openai、anthropic、google_genai；fake 为本地假模型
+            model: 模型名称
+            base_url: API基础URL
+            api_key: API密钥
+            **model_kwargs: 其他传给模型构造函数的参数
+
+        Returns:
+            Any: LangChain 聊天模型实例
+        """
+        key = self.make_key(provider, model, base_url, api_key, **model_kwargs)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        # 每个键单独加锁：同一键只构造一次，不同键的构造互不阻塞
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._build_client(provider, model, base_url, api_key, **model_kwargs)
+                self._clients[key] = client
+                self.logger.info(f"🔌 创建模型客户端: {provider}:{model} ({base_url or '默认地址'})")
+        return client
+
+    @staticmethod
+    def _build_client(provider: str, model: str, base_url: Optional[str], api_key: Optional[str], **model_kwargs) -> Any:
+        """构造模型客户端，凭据作为参数显式传入"""
+        if provider == "fake":
+            # 本地假模型，用于离线基准测试，不依赖LangChain
+            from core.fake_chat_model import FakeChatModel
+            return FakeChatModel(model=model, **model_kwargs)
+
+        from langchain.chat_models import init_chat_model
+        kwargs: Dict[str, Any] = dict(model_kwargs)
+        if provider == "google_genai":
+            if api_key:
+                kwargs["google_api_key"] = api_key
+            if base_url:
+                kwargs.update(_google_endpoint_kwargs(base_url))
+        else:
+            if api_key:
+                kwargs["api_key"] = api_key
+            if base_url:
+                kwargs["base_url"] = base_url
+        return init_chat_model(f"{provider}:{model}", **kwargs)
+
+    def size(self) -> int:
+        """已创建的客户端数量"""
+        return len(self._clients)
+
+    def clear(self):
+        """清空所有客户端"""
+        with self._lock:
+            self._clients.clear()
+            self._key_locks.clear()
+
+def _google_endpoint_kwargs(base_url: str) -> Dict[str, Any]:
+    """
+    Gemini 自定义端点（代理等）的构造参数：新版 langchain-google-genai 提供 base_url 字段，
+    旧版通过 client_options 的 api_endpoint 指定
+    """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    fields = getattr(ChatGoogleGenerativeAI, "model_fields", None) or getattr(ChatGoogleGenerativeAI, "__fields__", {})
+    if "base_url" in fields:
+        return {"base_url": base_url}
+    if "client_options" in fields:
+        return {"client_options": {"api_endpoint": base_url}}
+    raise ValueError(f"当前版本的 langchain-google-genai 不支持自定义端点，无法使用 base_url: {base_url}")
+
+# 进程级默认注册表，跨控制器与跨运行共享
+_default_registry = ModelClientRegistry()
+
+def get_default_registry() -> ModelClientRegistry:
+    """获取进程级默认注册表"""
+    return _default_registry
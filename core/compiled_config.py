@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+已编译配置模块
+配置文件解析、校验、提示词模板编译与依赖图构建只做一次，结果按文件缓存在进程内；
+文件的 mtime 与大小未变时直接复用，变化时再比较内容摘要，内容相同仍然复用
+"""
+
+import hashlib
+import os
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from config.config_reader import ConfigReader
+from core.pipeline_graph import PipelineGraph
+from processors.prompt_template import PromptTemplate
+from processors.token_budget import POLICIES
+from utils.log_config import get_logger
+
+logger = get_logger('core.compiled_config')
+
+# 数值型配置项及其类型，编译时校验，避免到第一次调用该配置节时才报错
+_NUMERIC_OPTIONS = {
+    "max_retries": int,
+    "retry_backoff": float,
+    "retry_backoff_max": float,
+    "timeout": float,
+    "rpm": float,
+    "tpm": float,
+    "max_concurrency": int,
+    "upload_media_mb": float,
+    "max_prompt_tokens": int,
+    "budget_keep_chars": int,
+}
+
+class CompiledConfig:
+    """
+    已校验、已编译的流水线配置（只读，可在多个控制器之间共享）
+
+    各配置节的字典已包含预编译的 prompt_template；pipeline_configs() 返回浅拷贝，
+    控制器对配置字典的修改不会影响缓存
+    """
+
+    def __init__(self, config_file: str, reader: ConfigReader, configs: List[Dict[str, Any]],
+                 digest: str, stamp: Tuple[int, int]):
+        """
+        Args:
+            config_file: 配置文件路径
+            reader: 解析后的配置读取器
+            configs: 按顺序排列的配置节字典（含 prompt_template）
+            digest: 文件内容的SHA-256摘要
+            stamp: 文件的 (mtime_ns, 大小)
+        """
+        self.config_file = config_file
+        self.reader = reader
+        self.configs = configs
+        self.graph = PipelineGraph(configs)
+        self.digest = digest
+        self.stamp = stamp
+
+    def pipeline_configs(self) -> List[Dict[str, Any]]:
+        """配置节字典的浅拷贝（模板对象只读，直接共享）"""
+        return [dict(config) for config in self.configs]
+
+def _file_stamp(config_file: str) -> Tuple[int, int]:
+    """文件的 (mtime_ns, 大小)，文件不存在时抛出 FileNotFoundError"""
+    try:
+        stat = os.stat(config_file)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"配置文件不存在: {config_file}") from None
+    return stat.st_mtime_ns, stat.st_size
+
+def _validate(configs: List[Dict[str, Any]]):
+    """校验配置节：模型名非空、数值配置项可解析、token预算策略与保留字符数合法"""
+    if not configs:
+        raise ValueError("配置文件中没有流水线配置节")
+    for config in configs:
+        section = config['section_name']
+        if not str(config.get('model', '')).strip():
+            raise ValueError(f"配置节 [{section}] 缺少 model")
+        for option, cast in _NUMERIC_OPTIONS.items():
+            value = config.get(option)
+            if value is None or str(value).strip() == "":
+                continue
+            try:
+                cast(value)
+            except ValueError:
+                raise ValueError(f"配置节 [{section}] 的 {option} 不是合法的数值: {value}") from None
+        policy = str(config.get("budget_policy") or "").strip()
+        if policy and policy not in POLICIES:
+            raise ValueError(f"配置节 [{section}] 的 budget_policy 不合法: {policy}，可选: {', '.join(POLICIES)}")
+        keep_chars = config.get("budget_keep_chars")
+        if keep_chars is not None and str(keep_chars).strip() != "" and int(keep_chars) <= 0:
+            raise ValueError(f"配置节 [{section}] 的 budget_keep_chars 必须大于0: {keep_chars}")
+
+def compile_config(config_file: str, content: Optional[bytes] = None,
+                   stamp: Optional[Tuple[int, int]] = None) -> CompiledConfig:
+    """
+    解析、校验并编译配置文件（不经过缓存）
+
+    Args:
+        config_file: 配置文件路径
+        content: 已读取的文件内容，为空时从文件读取
+        stamp: content 对应的 (mtime_ns, 大小)
+
+    Returns:
+        CompiledConfig: 编译结果
+
+    Raises:
+        FileNotFoundError: 配置文件不存在
+        ValueError: 配置校验失败
+    """
+    if content is None:
+        stamp = _file_stamp(config_file)
+        with open(config_file, 'rb') as f:
+            content = f.read()
+    reader = ConfigReader(config_file, content=content.decode('utf-8'))
+    configs = reader.get_pipeline_configs()
+    _validate(configs)
+    for config in configs:
+        # 预编译提示词模板，每条记录渲染时不再重复解析
+        config['prompt_template'] = PromptTemplate.compile(config.get('prompt', ''))
+    return CompiledConfig(config_file, reader, configs, hashlib.sha256(content).hexdigest(), stamp or (0, 0))
+
+# 进程级缓存：绝对路径 -> CompiledConfig
+_cache: Dict[str, CompiledConfig] = {}
+_cache_lock = threading.Lock()
+
+def load_compiled_config(config_file: str) -> Tuple[CompiledConfig, bool]:
+    """
+    获取配置文件的编译结果，文件未变时复用进程内缓存
+
+    Args:
+        config_file: 配置文件路径
+
+    Returns:
+        Tuple[CompiledConfig, bool]: (编译结果, 是否复用了缓存)
+    """
+    key = os.path.abspath(config_file)
+    stamp = _file_stamp(config_file)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and cached.stamp == stamp:
+        return cached, True
+
+    with open(config_file, 'rb') as f:
+        content = f.read()
+    if cached is not None and hashlib.sha256(content).hexdigest() == cached.digest:
+        # 只有 mtime 变化（例如 touch 或重新检出），内容未变
+        cached.stamp = stamp
+        return cached, True
+
+    compiled = compile_config(config_file, content, stamp)
+    with _cache_lock:
+        _cache[key] = compiled
+    if cached is not None:
+        logger.info(f"🔄 配置文件已变化，重新编译: {config_file}")
+    return compiled, False
+
+def clear_compiled_config_cache():
+    """清空进程内的配置编译缓存"""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+假聊天模型模块
+确定性的本地模型替身，用于离线基准测试与本地测试，不依赖任何提供商SDK
+"""
+
+import base64
+import hashlib
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+# 配置节中以 fake_ 开头的选项会传给假模型
+_FAKE_OPTIONS = {
+    "fake_latency": ("latency", float),
+    "fake_output_chars": ("output_chars", int),
+    "fake_image_bytes": ("image_bytes", int),
+    "fake_image_count": ("image_count", int),
+    "fake_chunk_chars": ("chunk_chars", int),
+    "fake_capacity": ("capacity", int),
+}
+
+class FakeRateLimitError(Exception):
+    """假模型的限流错误，与提供商SDK一样携带 status_code"""
+
+    status_code = 429
+
+class FakeMessage:
+    """假模型返回的消息（或流式消息块），实现流水线用到的 AIMessage 接口"""
+
+    def __init__(self, content: str, usage_metadata: Optional[Dict[str, int]] = None):
+        self.content = content
+        self.usage_metadata = usage_metadata
+
+    def text(self) -> str:
+        """消息文本"""
+        return self.content
+
+    def __add__(self, other: "FakeMessage") -> "FakeMessage":
+        usage = None
+        if self.usage_metadata or other.usage_metadata:
+            usage = {
+                key: (self.usage_metadata or {}).get(key, 0) + (other.usage_metadata or {}).get(key, 0)
+                for key in ("input_tokens", "output_tokens", "total_tokens")
+            }
+        return FakeMessage(self.content + other.content, usage)
+
+class FakeChatModel:
+    """
+    确定性假模型
+
+    输出文本由输入内容的摘要决定，相同输入总是得到相同输出；
+    可配置延迟、输出长度、返回的内联图片大小，以及模拟的服务端并发容量
+    """
+
+    def __init__(self, model: str = "fake", latency: float = 0.0, output_chars: int = 200,
+                 image_bytes: int = 0, chunk_chars: int = 16, image_count: int = 1, capacity: int = 0, **kwargs):
+        """
+        Args:
+            model: 模型名称
+            latency: 每次调用的模拟延迟（秒）；流式调用时为首个片段之前的延迟
+            output_chars: 输出文本长度
+            image_bytes: 大于0时在输出中附带一张该大小的内联base64图片
+            chunk_chars: 流式输出时每个片段的字符数
+            image_count: 附带的内联图片张数（image_bytes 大于0时生效）
+            capacity: 大于0时模拟服务端并发容量：在途请求超过容量时延迟按 在途数/容量 成比例增加，
+                超过2倍容量时抛出 FakeRateLimitError（429）
+            **kwargs: 兼容真实客户端的其他参数（api_key、timeout等），忽略
+        """
+        self.model = model
+        self.latency = latency
+        self.output_chars = output_chars
+        self.image_bytes = image_bytes
+        self.chunk_chars = max(1, chunk_chars)
+        self._image_suffix = self._build_image_suffix(image_bytes) * max(1, image_count) if image_bytes else ""
+        self.capacity = capacity
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def options_from_config(config: Dict[str, Any]) -> Dict[str, Any]:
+        """从配置节读取 fake_* 选项"""
+        options = {}
+        for key, (name, cast) in _FAKE_OPTIONS.items():
+            if config.get(key) not in (None, ""):
+                options[name] = cast(config[key])
+        return options
+
+    @staticmethod
+    def _build_image_suffix(size: int) -> str:
+        """构造固定的内联图片（PNG文件头 + 填充字节），只在初始化时编码一次"""
+        payload = b"\x89PNG\r\n\x1a\n" + b"\0" * max(0, size - 8)
+        return f"\n![image](data:image/png;base64,{base64.b64encode(payload).decode('ascii')})"
+
+    def _respond(self, messages: List[Dict[str, Any]]) -> FakeMessage:
+        """根据输入生成确定性响应"""
+        prompt_parts = []
+        for message in messages:
+            content = message.get("content", "")
+            if isinstance(content, str):
+                prompt_parts.append(content)
+                continue
+            for part in content:
+                if part.get("type") == "text":
+                    prompt_parts.append(part.get("text", ""))
+        prompt = "\n".join(prompt_parts)
+
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        text = (f"[{self.model}:{digest[:12]}] " + digest * (self.output_chars // 64 + 1))[:self.output_chars]
+        usage = {
+            "input_tokens": len(prompt) // 4 + 1,
+            "output_tokens": len(text) // 4 + 1,
+        }
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return FakeMessage(text + self._image_suffix, usage)
+
+    def _chunks(self, response: FakeMessage) -> List[FakeMessage]:
+        """切分为流式片段，用量信息放在最后一个片段"""
+        content = response.content
+        pieces = [content[i:i + self.chunk_chars] for i in range(0, len(content), self.chunk_chars)] or [""]
+        chunks = [FakeMessage(piece) for piece in pieces]
+        chunks[-1].usage_metadata = response.usage_metadata
+        return chunks
+
+    def _enter(self) -> float:
+        """登记一个在途请求，返回本次的模拟延迟；超过2倍容量时抛出限流错误"""
+        if not self.capacity:
+            return self.latency
+        with self._lock:
+            if self._inflight >= self.capacity * 2:
+                raise FakeRateLimitError(f"模拟限流: 在途请求 {self._inflight} 超过容量 {self.capacity} 的2倍")
+            self._inflight += 1
+            return self.latency * max(1.0, self._inflight / self.capacity)
+
+    def _exit(self):
+        """注销在途请求"""
+        if self.capacity:
+            with self._lock:
+                self._inflight -= 1
+
+    def invoke(self, messages: List[Dict[str, Any]], *args, **kwargs) -> FakeMessage:
+        latency = self._enter()
+        try:
+            if latency:
+                time.sleep(latency)
+            return self._respond(messages)
+        finally:
+            self._exit()
+
+    async def ainvoke(self, messages: List[Dict[str, Any]], *args, **kwargs) -> FakeMessage:
+        import asyncio
+        latency = self._enter()
+        try:
+            if latency:
+                await asyncio.sleep(latency)
+            return self._respond(messages)
+        finally:
+            self._exit()
+
+    def stream(self, messages: List[Dict[str, Any]], *args, **kwargs):
+        latency = self._enter()
+        try:
+            if latency:
+                time.sleep(latency)
+        finally:
+            self._exit()
+        yield from self._chunks(self._respond(messages))
+
+    async def astream(self, messages: List[Dict[str, Any]], *args, **kwargs):
+        import asyncio
+        latency = self._enter()
+        try:
+            if latency:
+                await asyncio.sleep(latency)
+        finally:
+            self._exit()
+        for chunk in self._chunks(self._respond(messages)):
+            yield chunk
@@ -4,35 +4,35 @@ LangChain LLM模块
 根据配置信息初始化LLM并处理输入输出
 """
 
-import os
-from typing import Dict, Any
-from langchain.chat_models import init_chat_model
+import re
+import time
+from typing import Dict, Any, Optional, Callable, Tuple
+from core.call_policy import CallPolicy, estimate_tokens
+from core.client_registry import ModelClientRegistry, get_default_registry
+from core.media_upload import get_media_uploader, get_media_upload_cache, upload_endpoint
+from processors.token_budget import count_tokens
+from utils.metrics import RoundSpan, SOURCE_CACHE, SOURCE_COALESCED, timed
 from utils.log_config import get_logger
+from utils.media_store import MediaHandle, decode_inline_images, get_default_media_store
 
 class LangChainLLM:
     """LangChain LLM类，根据配置初始化模型并处理请求"""
     
-    def __init__(self, config_file: str = "config/config.ini"):
+    def __init__(self, config_file: str = "config/config.ini", registry: Optional[ModelClientRegistry] = None):
+        self.registry = registry or get_default_registry()
         self.model = None
         self.config = None
         self.logger = get_logger('core.langchain_llm')
         self.provider = None
-    
-    def _setup_environment(self, config: Dict[str, Any]):
-        """设置环境变量"""
-        # 根据配置节名称设置不同的环境变量
-        section_name = config.get("section_name", "").lower()
-        
-        if "claude" in section_name:
-            os.environ["ANTHROPIC_API_KEY"] = config["api_key"]
-            os.environ["ANTHROPIC_BASE_URL"] = config["base_url"]
-        elif "gemini" in section_name:
-            os.environ["GOOGLE_API_KEY"] = config["api_key"]
-            os.environ["GOOGLE_BASE_URL"] = config["base_url"]
-        else:
-            # 默认使用OpenAI兼容格式
-            os.environ["OPENAI_API_KEY"] = config["api_key"]
-            os.environ["OPENAI_BASE_URL"] = config["base_url"]
+        self.full_model_name = None
+        self.cache = None  # 可选的 LLMCache，由控制器注入
+        self.coalescer = None  # 可选的 RequestCoalescer，由控制器注入，相同的并发请求共享一次调用
+        self.media_pool = None  # 可选的 MediaWorkerPool，由控制器注入，大媒体的编解码在工作进程中执行
+        self.call_policy = CallPolicy()  # 重试/限流/超时策略，按配置节初始化
+        self.multi_image = False  # 是否返回响应中的全部内联图片（images键），默认只取第一张
+        self.uploader = None  # 提供商支持文件上传时的上传器，大媒体上传一次后按文件URI引用
+        self.upload_endpoint = ""
+        self.upload_threshold = 0  # 达到该字节数的媒体走上传
     
     def _get_full_model_name(self, model_name: str, provider: str) -> str:
         """获取完整的模型名称"""
@@ -42,27 +42,240 @@ class LangChainLLM:
             return f"anthropic:{model_name}"
         elif provider == "google" or "gemini" in provider:
             return f"google_genai:{model_name}"
+        elif provider == "fake":
+            return f"fake:{model_name}"
         else:
             # 默认使用OpenAI格式
             return f"openai:{model_name}"
     
-    def smart_process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _supports_video(self) -> bool:
+        """当前模型是否支持视频输入（Gemini；假模型接受任意媒体，便于基准测试）"""
+        if self.full_model_name and self.full_model_name.startswith(("google_genai:", "fake:")):
+            return True
+        return bool(self.provider) and "gemini" in str(self.provider).lower()
+    
+    def smart_process(self, input_data: Dict[str, Any], span: Optional[RoundSpan] = None) -> Dict[str, Any]:
         """
         智能处理输入数据，支持多模态输入（文本+图片/视频）
         
         Args:
             input_data: 输入数据字典，包含text、image、video键
+            span: 可选的轮次记录，写入各阶段耗时、token用量与载荷大小
+            
+        Returns:
+            Dict[str, Any]: 处理结果，包含text、image、video键
+            
+        Raises:
+            Exception: 模型调用失败且重试耗尽（如持续限流、超时），失败结果不写入缓存
+        """
+        cache_key = self._get_cache_key(input_data)
+        cached = self._lookup_cache(cache_key, span)
+        if cached is not None:
+            return cached
+        
+        def call():
+            result = self._process_input(input_data, span)
+            self._store_cache(cache_key, result)
+            return result
+        
+        return self._coalesce(cache_key, call, span)
+    
+    async def asmart_process(self, input_data: Dict[str, Any], span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """
+        smart_process 的异步版本
+        
+        Args:
+            input_data: 输入数据字典，包含text、image、video键
+            span: 可选的轮次记录
             
         Returns:
             Dict[str, Any]: 处理结果，包含text、image、video键
         """
-        return self._process_input(input_data)
+        cache_key = self._get_cache_key(input_data)
+        cached = await self._alookup_cache(cache_key, span)
+        if cached is not None:
+            return cached
+        
+        async def call():
+            result = await self._aprocess_input(input_data, span)
+            await self._astore_cache(cache_key, result)
+            return result
+        
+        return await self._acoalesce(cache_key, call, span)
+    
+    def stream_process(self, input_data: Dict[str, Any], on_chunk: Optional[Callable[[str], None]] = None,
+                       span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """
+        流式处理：通过模型的 stream 接口逐块回调文本，结束后返回完整结果
+        
+        Args:
+            input_data: 输入数据字典，包含text、image、video键
+            on_chunk: 文本块回调函数，参数为新到达的文本片段
+            span: 可选的轮次记录，首个片段到达的时间记为 model_ttft
+            
+        Returns:
+            Dict[str, Any]: 完整处理结果，包含text、image、video键
+        """
+        cache_key = self._get_cache_key(input_data)
+        cached = self._lookup_cache(cache_key, span, on_chunk)
+        if cached is not None:
+            return cached
+        
+        def call():
+            result = self._stream_input(input_data, on_chunk, span)
+            self._store_cache(cache_key, result)
+            return result
+        
+        # 复用其他请求的结果时没有逐块输出，整段文本一次回调
+        return self._coalesce(cache_key, call, span, on_chunk)
+    
+    async def astream_process(self, input_data: Dict[str, Any], on_chunk: Optional[Callable[[str], None]] = None,
+                              span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """
+        stream_process 的异步版本，使用模型的 astream 接口
+        
+        Args:
+            input_data: 输入数据字典，包含text、image、video键
+            on_chunk: 文本块回调函数，参数为新到达的文本片段
+            span: 可选的轮次记录，首个片段到达的时间记为 model_ttft
+            
+        Returns:
+            Dict[str, Any]: 完整处理结果，包含text、image、video键
+        """
+        cache_key = self._get_cache_key(input_data)
+        cached = await self._alookup_cache(cache_key, span, on_chunk)
+        if cached is not None:
+            return cached
+        
+        async def call():
+            result = await self._astream_input(input_data, on_chunk, span)
+            await self._astore_cache(cache_key, result)
+            return result
+        
+        return await self._acoalesce(cache_key, call, span, on_chunk)
+    
+    def _emit_chunk(self, on_chunk: Optional[Callable[[str], None]], text: str):
+        """调用文本块回调，回调异常不影响模型调用"""
+        if not on_chunk or not text:
+            return
+        try:
+            on_chunk(text)
+        except Exception as e:
+            self.logger.warning(f"流式回调执行失败: {e}")
+    
+    def _coalesce(self, key: str, call: Callable[[], Dict[str, Any]], span: Optional[RoundSpan] = None,
+                  on_chunk: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """通过合并器执行调用：相同的进行中请求只调用一次模型"""
+        if self.coalescer is None:
+            return call()
+        result, shared = self.coalescer.run(key, call)
+        if shared:
+            self._mark_coalesced(result, span, on_chunk)
+        return result
+    
+    async def _acoalesce(self, key: str, call: Callable[[], Any], span: Optional[RoundSpan] = None,
+                         on_chunk: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """_coalesce 的异步版本"""
+        if self.coalescer is None:
+            return await call()
+        result, shared = await self.coalescer.arun(key, call)
+        if shared:
+            self._mark_coalesced(result, span, on_chunk)
+        return result
+    
+    def _mark_coalesced(self, result: Dict[str, Any], span: Optional[RoundSpan], on_chunk: Optional[Callable[[str], None]]):
+        """记录复用了进行中请求的结果"""
+        self.logger.info("🔗 复用进行中的相同请求")
+        if span is not None:
+            span.source = SOURCE_COALESCED
+        self._emit_chunk(on_chunk, result.get("text", ""))
     
-    def _process_response(self, response) -> Dict[str, Any]:
+    def _get_cache_key(self, input_data: Dict[str, Any]) -> str:
+        """计算请求键（缓存与请求合并共用），两者都未启用时返回空字符串"""
+        if (self.cache is None and self.coalescer is None) or not self.config:
+            return ""
+        from core.llm_cache import LLMCache
+        return LLMCache.make_key(
+            self.config.get("model", ""),
+            # 多图输出的结果结构不同，使用独立的缓存键
+            f"{self.full_model_name}@{self.config.get('base_url', '')}{'#multi_image' if self.multi_image else ''}",
+            input_data.get("text", ""),
+            input_data.get("image", ""),
+            input_data.get("video", "")
+        )
+    
+    def _lookup_cache(self, cache_key: str, span: Optional[RoundSpan] = None,
+                      on_chunk: Optional[Callable[[str], None]] = None) -> Optional[Dict[str, Any]]:
+        """查询缓存，命中时记录来源并把整段文本一次回调；未启用缓存或未命中返回None"""
+        if not cache_key or self.cache is None:
+            return None
+        return self._on_cache_result(self.cache.get(cache_key), span, on_chunk)
+    
+    async def _alookup_cache(self, cache_key: str, span: Optional[RoundSpan] = None,
+                             on_chunk: Optional[Callable[[str], None]] = None) -> Optional[Dict[str, Any]]:
+        """_lookup_cache 的异步版本，持久化缓存的读取放到线程中执行，不阻塞事件循环"""
+        if not cache_key or self.cache is None:
+            return None
+        if self.cache.persistent:
+            import asyncio
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+        else:
+            cached = self.cache.get(cache_key)
+        return self._on_cache_result(cached, span, on_chunk)
+    
+    def _on_cache_result(self, cached: Optional[Dict[str, Any]], span: Optional[RoundSpan],
+                         on_chunk: Optional[Callable[[str], None]]) -> Optional[Dict[str, Any]]:
+        """记录缓存命中"""
+        if cached is not None:
+            self.logger.info("⚡ 命中LLM缓存")
+            if span is not None:
+                span.source = SOURCE_CACHE
+            self._emit_chunk(on_chunk, cached.get("text", ""))
+        return cached
+    
+    def _should_cache(self, cache_key: str, result: Dict[str, Any]) -> bool:
+        """空结果（调用失败）不缓存"""
+        return bool(cache_key) and self.cache is not None and any(result.get(k) for k in ("text", "image", "video"))
+    
+    def _store_cache(self, cache_key: str, result: Dict[str, Any]):
+        """写入缓存，空结果（调用失败）不缓存"""
+        if self._should_cache(cache_key, result):
+            self.cache.set(cache_key, result)
+    
+    async def _astore_cache(self, cache_key: str, result: Dict[str, Any]):
+        """_store_cache 的异步版本，持久化写入放到线程中执行"""
+        if not self._should_cache(cache_key, result):
+            return
+        if self.cache.persistent:
+            import asyncio
+            await asyncio.to_thread(self.cache.set, cache_key, result)
+        else:
+            self.cache.set(cache_key, result)
+    
+    def _record_model_latency(self, span: Optional[RoundSpan], start: float, first_chunk_at: Optional[float] = None):
+        """记录模型调用耗时；非流式调用的首个片段时间即完成时间"""
+        if span is None:
+            return
+        end = time.perf_counter()
+        span.add_phase("model_total", end - start)
+        span.add_phase("model_ttft", (first_chunk_at or end) - start)
+        if self.call_policy.concurrency_limiter is not None:
+            span.concurrency_limit = self.call_policy.concurrency_limiter.limit
+    
+    def _record_usage(self, span: RoundSpan, response, content: str):
+        """记录token用量与响应大小，提供商未返回用量时按字符数估算"""
+        usage = getattr(response, "usage_metadata", None) or {}
+        span.prompt_tokens = usage.get("input_tokens") or span.prompt_tokens
+        span.completion_tokens = usage.get("output_tokens") or estimate_tokens(content)
+        span.response_bytes = len(content)
+    
+    def _process_response(self, response, span: Optional[RoundSpan] = None) -> Dict[str, Any]:
         """处理响应，返回包含text、image、video键的字典"""
         try:
             # 获取文本内容
             content = response.text()
+            if span is not None:
+                self._record_usage(span, response, content)
             
             # 初始化结果字典
             result = {
@@ -71,19 +284,9 @@ class LangChainLLM:
                 "video": ""
             }
             
-            # 检查是否包含图片
-            import re
-            
-            # 使用正则表达式匹配base64图片数据
-            if 'data:image' in content:
-                # 包含图片
-                # 查找所有base64图片数据的位置，支持跨行匹配
-                pattern = r'data:image/([^;]+);base64,([A-Za-z0-9+/=\s]+)'
-                image_matches = re.findall(pattern, content, re.DOTALL)
-                
-                # 找到第一个图片标记的位置
-                first_image_pos = content.find('data:image')
-                
+            # 单遍定位第一个图片标记，之后的扫描只从此处开始
+            first_image_pos = content.find('data:image')
+            if first_image_pos >= 0:
                 # 提取图片标记之前的纯文本内容
                 if first_image_pos > 0:
                     text_content = content[:first_image_pos].strip()
@@ -91,12 +294,19 @@ class LangChainLLM:
                     text_content = re.sub(r'\n*!\[image\]\(?$', '', text_content).strip()
                     result["text"] = text_content
                 
-                # 只添加第一张图片（默认只返回一张）
-                if image_matches:
-                    image_type, base64_data = image_matches[0]
-                    # 清理 base64 数据中的空白字符
-                    clean_base64 = "".join(base64_data.split())
-                    result["image"] = f"data:image/{image_type};base64,{clean_base64}"
+                # 默认只解码第一张图片；multi_image 时解码全部，载荷直接解码为字节
+                max_images = None if self.multi_image else 1
+                if self.media_pool is not None and self.media_pool.accepts(len(content) - first_image_pos):
+                    # 大响应交给工作进程提取并解码
+                    images = self.media_pool.decode_images(content, max_images)
+                else:
+                    images = decode_inline_images(content, max_images, start=first_image_pos)
+                
+                media_store = get_default_media_store()
+                handles = [media_store.put_bytes(raw, f"image/{image_type}") for image_type, raw in images]
+                result["image"] = handles[0] if handles else ""
+                if self.multi_image:
+                    result["images"] = handles
             else:
                 # 纯文本
                 result["text"] = content
@@ -107,76 +317,239 @@ class LangChainLLM:
             self.logger.error(f"响应处理失败: {e}")
             return {"text": "", "image": "", "video": ""}
             
-    def _process_input(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """处理多模态输入（文本+图片/视频）"""
-        try:
-            # 确保模型已初始化
-            if not self.model:
-                raise Exception("模型未初始化")
-                
-            content = []
-            
-            # 处理文本输入
-            if input_data.get('text'):
-                content.append({
-                    "type": "text",
-                    "text": input_data.get('text')
-                })
-            
-            # 处理图片输入
-            img = input_data.get("image")
-            if img:
-                from utils.file_utils import sanitize_base64
-                img = sanitize_base64(img) or ""
-                if img and not str(img).startswith("data:image"):
-                    img = f"data:image/jpeg;base64,{img}"
-                content.append({"type":"image_url","image_url":{"url": img}})
-            
-            # 处理视频输入
-            if input_data.get('video'):
-                data_video = input_data['video']
-                from utils.file_utils import sanitize_base64
-                data_video = sanitize_base64(data_video) or ""
-                if data_video and self.provider and "gemini" in str(self.provider).lower():
-                    if not str(data_video).startswith("data:video"):
-                        data_url = f"data:video/mp4;base64,{data_video}"
-                    else:
-                        data_url = data_video
-                    content.append({
-                        "type": "video_url", 
-                        "video_url": {"url": data_url}
-                    })
-            
-            # 构建消息
-            message = {"role": "user", "content": content}
-            response = self.model.invoke([message])
-            return self._process_response(response)
+    def _to_data_url(self, handle: MediaHandle) -> str:
+        """将媒体句柄编码为 data URL，配置了工作进程池时大媒体在工作进程中编码"""
+        if self.media_pool is not None:
+            return self.media_pool.encode_data_url(handle)
+        return handle.to_data_url()
+    
+    def _media_part(self, handle: MediaHandle, part_type: str) -> Tuple[Dict[str, Any], int]:
+        """
+        构建媒体消息片段：大媒体上传一次后按文件URI引用，其余内联为 data URL
+
+        Returns:
+            Tuple[Dict[str, Any], int]: (消息片段, 计入请求体的字节数)
+        """
+        if self.uploader is not None and handle.size >= self.upload_threshold:
+            try:
+                uploaded = get_media_upload_cache().get_or_upload(self.upload_endpoint, self.uploader, handle)
+                return uploaded.to_part(), len(uploaded.uri)
+            except Exception as e:
+                self.logger.warning(f"⚠️ 媒体上传失败，改为内联发送 {handle!r}: {e}")
+        url = self._to_data_url(handle)
+        return {"type": part_type, part_type: {"url": url}}, len(url)
+    
+    def _build_message(self, input_data: Dict[str, Any], span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """构建多模态消息（文本+图片/视频）"""
+        start = time.perf_counter()
+        content = []
+        payload_bytes = 0
+        
+        # 处理文本输入
+        if input_data.get('text'):
+            content.append({
+                "type": "text",
+                "text": input_data.get('text')
+            })
+            payload_bytes += len(input_data['text'].encode('utf-8'))
+        
+        # 处理图片输入：媒体以句柄传递，只在这里编码为 data URL
+        media_store = get_default_media_store()
+        img = media_store.to_handle(input_data.get("image"), "image")
+        if img:
+            part, size = self._media_part(img, "image_url")
+            content.append(part)
+            payload_bytes += size
+        
+        # 处理视频输入
+        if input_data.get('video') and self._supports_video():
+            data_video = media_store.to_handle(input_data['video'], "video")
+            if data_video:
+                part, size = self._media_part(data_video, "video_url")
+                content.append(part)
+                payload_bytes += size
+        
+        if span is not None:
+            span.add_phase("input_encode", time.perf_counter() - start)
+            span.request_bytes = payload_bytes
+            # 提供商返回用量后以实际值为准
+            config = self.config or {}
+            span.prompt_tokens = count_tokens(input_data.get('text', ''), config.get('model', ''),
+                                              config.get('tokenizer') or "auto")
+        
+        return {"role": "user", "content": content}
             
-        except Exception as e:
-            # 记录错误日志
-            self.logger.error(f"多模态处理失败: {e}")
-            # 返回空结果而不是错误信息
-            return {"text": "", "image": "", "video": ""}
+    async def _abuild_message(self, input_data: Dict[str, Any], span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """构建消息（异步版本）：使用工作进程池或上传媒体时在线程中执行，不阻塞事件循环"""
+        import asyncio
+        if self.media_pool is not None or self.uploader is not None:
+            return await asyncio.to_thread(self._build_message, input_data, span)
+        return self._build_message(input_data, span)
+    
+    async def _aprocess_response(self, response, span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """处理响应（异步版本），使用工作进程池时在线程中等待解码结果"""
+        import asyncio
+        if self.media_pool is not None:
+            return await asyncio.to_thread(self._process_response, response, span)
+        return self._process_response(response, span)
+    
+    def _process_input(self, input_data: Dict[str, Any], span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """处理多模态输入（文本+图片/视频）；调用失败（重试耗尽）时抛出异常，不返回空结果"""
+        # 确保模型已初始化
+        if not self.model:
+            raise Exception("模型未初始化")
+        
+        message = self._build_message(input_data, span)
+        start = time.perf_counter()
+        response = self.call_policy.call(
+            lambda: self.model.invoke([message]),
+            estimate_tokens(input_data.get('text', ''))
+        )
+        self._record_model_latency(span, start)
+        with timed(span, "response_parse"):
+            return self._process_response(response, span)
+    
+    async def _aprocess_input(self, input_data: Dict[str, Any], span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """处理多模态输入的异步版本，使用 ainvoke 避免阻塞事件循环；调用失败时抛出异常"""
+        if not self.model:
+            raise Exception("模型未初始化")
+        
+        message = await self._abuild_message(input_data, span)
+        start = time.perf_counter()
+        response = await self.call_policy.acall(
+            lambda: self.model.ainvoke([message]),
+            estimate_tokens(input_data.get('text', ''))
+        )
+        self._record_model_latency(span, start)
+        with timed(span, "response_parse"):
+            return await self._aprocess_response(response, span)
+    
+    def _stream_input(self, input_data: Dict[str, Any], on_chunk: Optional[Callable[[str], None]],
+                      span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """流式处理多模态输入，逐块回调并拼接完整响应；调用失败时抛出异常"""
+        if not self.model:
+            raise Exception("模型未初始化")
+        
+        message = self._build_message(input_data, span)
+        state = {"emitted": False, "first_chunk_at": None, "attempt": 0}
+        start = time.perf_counter()
+        
+        def consume():
+            state["attempt"] += 1
+            attempt = state["attempt"]
+            response = None
+            for chunk in self.model.stream([message]):
+                if attempt != state["attempt"]:
+                    # 本次调用已超时并被放弃，不再回调
+                    break
+                if state["first_chunk_at"] is None:
+                    state["first_chunk_at"] = time.perf_counter()
+                text = chunk.text()
+                state["emitted"] = state["emitted"] or bool(text)
+                self._emit_chunk(on_chunk, text)
+                response = chunk if response is None else response + chunk
+            return response
+        
+        # 已经输出过内容的流不再重试，避免回调收到重复片段
+        try:
+            response = self.call_policy.call(
+                consume,
+                estimate_tokens(input_data.get('text', '')),
+                can_retry=lambda: not state["emitted"]
+            )
+        finally:
+            # 超时后仍在执行的调用不再回调
+            state["attempt"] += 1
+        self._record_model_latency(span, start, state["first_chunk_at"])
+        if response is None:
+            raise Exception("模型未返回任何内容")
+        with timed(span, "response_parse"):
+            return self._process_response(response, span)
+    
+    async def _astream_input(self, input_data: Dict[str, Any], on_chunk: Optional[Callable[[str], None]],
+                             span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """流式处理多模态输入的异步版本；调用失败时抛出异常"""
+        if not self.model:
+            raise Exception("模型未初始化")
+        
+        message = await self._abuild_message(input_data, span)
+        state = {"emitted": False, "first_chunk_at": None}
+        start = time.perf_counter()
+        
+        async def consume():
+            response = None
+            async for chunk in self.model.astream([message]):
+                if state["first_chunk_at"] is None:
+                    state["first_chunk_at"] = time.perf_counter()
+                text = chunk.text()
+                state["emitted"] = state["emitted"] or bool(text)
+                self._emit_chunk(on_chunk, text)
+                response = chunk if response is None else response + chunk
+            return response
+        
+        response = await self.call_policy.acall(
+            consume,
+            estimate_tokens(input_data.get('text', '')),
+            can_retry=lambda: not state["emitted"]
+        )
+        self._record_model_latency(span, start, state["first_chunk_at"])
+        if response is None:
+            raise Exception("模型未返回任何内容")
+        with timed(span, "response_parse"):
+            return await self._aprocess_response(response, span)
     
     def init_model_with_config(self, config: Dict[str, Any]):
-        """使用指定配置初始化模型"""
+        """使用指定配置初始化模型，模型实例来自共享的客户端注册表"""
         try:
-            # 设置环境变量
-            self._setup_environment(config)
-            
-            # 构建完整的模型名称
+            # 构建完整的模型名称，可通过 provider 配置项显式指定提供商
             model_name = config["model"]
-            full_model_name = self._get_full_model_name(model_name, config.get("section_name", "openai"))
+            provider_hint = config.get("provider") or config.get("section_name", "openai")
+            full_model_name = self._get_full_model_name(model_name, provider_hint)
+            provider = full_model_name.split(":", 1)[0]
             
             self.logger.info(f"🔧 初始化模型: {full_model_name}")
             
-            # 初始化模型
-            model = init_chat_model(full_model_name)
+            # 重试、限流与超时策略；限流器按 (provider, base_url) 共享
+            call_policy = CallPolicy.from_config(config, (provider, config.get("base_url") or ""))
+            model_kwargs = {}
+            if call_policy.timeout:
+                model_kwargs["timeout"] = call_policy.timeout
+            if call_policy.max_retries:
+                # 由调用策略负责重试，关闭客户端自带的重试，避免重试次数相乘
+                model_kwargs["max_retries"] = 0
+            if provider == "fake":
+                # 假模型的延迟、输出大小等通过 fake_* 配置项设置
+                from core.fake_chat_model import FakeChatModel
+                model_kwargs.update(FakeChatModel.options_from_config(config))
+            
+            # 凭据显式传入，不修改进程级环境变量
+            model = self.registry.get_client(
+                provider,
+                model_name,
+                base_url=config.get("base_url"),
+                api_key=config.get("api_key"),
+                **model_kwargs
+            )
+            
+            # 大媒体上传一次后按文件URI引用：Gemini 默认达到20MB时上传，0表示始终内联
+            upload_mb = config.get("upload_media_mb")
+            if upload_mb in (None, ""):
+                upload_mb = 20 if provider == "google_genai" else 0
+            upload_threshold = int(float(upload_mb) * 1024 * 1024)
+            uploader = get_media_uploader(provider, config.get("api_key")) if upload_threshold > 0 else None
+            if upload_threshold > 0 and uploader is None:
+                self.logger.warning(f"提供商 {provider} 不支持文件上传，忽略 upload_media_mb")
             
             # 保存到实例变量
             self.model = model
             self.config = config
             self.provider = config.get("section_name", "openai")
+            self.full_model_name = full_model_name
+            self.call_policy = call_policy
+            self.multi_image = str(config.get("multi_image", "")).strip().lower() in ("1", "true", "yes", "on")
+            self.uploader = uploader
+            self.upload_endpoint = upload_endpoint(provider, config.get("api_key"))
+            self.upload_threshold = upload_threshold
             
             return model
         except Exception as e:
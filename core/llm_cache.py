@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+LLM响应缓存模块
+按内容寻址缓存模型响应：内存LRU层 + 可选的SQLite持久化层
+"""
+
+import hashlib
+import json
+import mmap
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from utils.log_config import get_logger
+from utils.media_store import MediaHandle, get_default_media_store
+
+# 内存层默认上限：256MB（文本与内存中的媒体内容）
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class LLMCache:
+    """
+    LLM响应缓存，线程安全，可在多个控制器之间共享
+
+    内存层与持久化层各用一把锁：内存锁只保护LRU字典，序列化、媒体拷贝与SQLite读写都在内存锁之外进行
+    """
+
+    def __init__(self, max_entries: int = 1024, db_path: Optional[str] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 内存LRU层的最大条目数
+            db_path: SQLite数据库路径，为None时只使用内存层
+            max_bytes: 内存LRU层的最大字节数（文本与内存中的媒体内容），超过时淘汰最久未用的条目
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.db_path = db_path
+        self.logger = get_logger('core.llm_cache')
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+
+        # 命中统计
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if db_path:
+            # 只有启用持久化时才导入 sqlite3
+            import sqlite3
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            # 媒体内容按摘要单独存储，相同图片/视频只保存一份
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache_media (sha256 TEXT PRIMARY KEY, mime TEXT NOT NULL, data BLOB NOT NULL)"
+            )
+            self._db.commit()
+            self.logger.info(f"💾 LLM缓存持久化已启用: {db_path}")
+
+    @property
+    def persistent(self) -> bool:
+        """是否启用了持久化层（读写会访问磁盘，异步代码应放到线程中调用）"""
+        return self._db is not None
+
+    @staticmethod
+    def make_key(model: str, provider: str, text: str, image: Any = "", video: Any = "") -> str:
+        """
+        生成缓存键
+
+        Args:
+            model: 模型名称
+            provider: 提供商标识（含base_url）
+            text: 最终提示词文本
+            image: 图片数据
+            video: 视频数据
+
+        Returns:
+            str: sha256十六进制摘要
+        """
+        h = hashlib.sha256()
+        for part in (model, provider, text, LLMCache._digest(image), LLMCache._digest(video)):
+            h.update(str(part or "").encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    @staticmethod
+    def _digest(payload: Any) -> str:
+        """计算媒体数据摘要，空数据返回空字符串；媒体句柄直接使用其内容摘要"""
+        if not payload:
+            return ""
+        if isinstance(payload, MediaHandle):
+            return payload.sha256
+        return hashlib.sha256(str(payload).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        查询缓存，先查内存层，再查持久化层
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[Dict[str, Any]]: 缓存的响应副本，未命中返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[0])
+
+        value = self._load(key) if self._db is not None else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self._put_memory(key, value)
+            self.hits += 1
+            self.disk_hits += 1
+        return dict(value)
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 响应字典
+        """
+        value = dict(value)
+        with self._lock:
+            self._put_memory(key, value)
+        if self._db is None:
+            return
+        # 序列化与媒体内容拷贝不持有任何锁，只有写库时持有数据库锁
+        raw, media = self._serialize(value)
+        with self._db_lock:
+            if self._db is None:
+                return
+            if media:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO llm_cache_media (sha256, mime, data) VALUES (?, ?, ?)", media
+                )
+            self._db.execute("INSERT OR REPLACE INTO llm_cache (key, value) VALUES (?, ?)", (key, raw))
+            self._db.commit()
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        """从持久化层读取响应，媒体引用还原为媒体句柄"""
+        with self._db_lock:
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            value = json.loads(row[0])
+            digests = {ref["__media__"] for ref in self._media_refs(value)}
+            media = {}
+            for sha256 in digests:
+                found = self._db.execute(
+                    "SELECT mime, data FROM llm_cache_media WHERE sha256 = ?", (sha256,)
+                ).fetchone()
+                if found:
+                    media[sha256] = found
+
+        # 媒体句柄在数据库锁之外创建，媒体缺失时还原为空字符串
+        store = get_default_media_store()
+        handles = {sha256: store.put_bytes(data, mime) for sha256, (mime, data) in media.items()}
+
+        def restore(v: Any) -> Any:
+            if isinstance(v, dict) and "__media__" in v:
+                return handles.get(v["__media__"], "")
+            return v
+
+        for k, v in value.items():
+            value[k] = [restore(item) for item in v] if isinstance(v, list) else restore(v)
+        return value
+
+    @staticmethod
+    def _media_refs(value: Dict[str, Any]) -> List[Dict[str, str]]:
+        """列出反序列化结果中的媒体摘要引用（含多图列表中的引用）"""
+        refs = []
+        for v in value.values():
+            for item in (v if isinstance(v, list) else [v]):
+                if isinstance(item, dict) and "__media__" in item:
+                    refs.append(item)
+        return refs
+
+    @staticmethod
+    def _serialize(value: Dict[str, Any]) -> Tuple[str, List[Tuple[str, str, bytes]]]:
+        """
+        序列化响应，媒体句柄（含多图列表中的句柄）以摘要引用
+
+        Returns:
+            Tuple[str, List[Tuple[str, str, bytes]]]: (JSON文本, 待写入媒体表的 (sha256, mime, 内容) 列表)
+        """
+        media: Dict[str, Tuple[str, str, bytes]] = {}
+
+        def convert(v: Any) -> Any:
+            if not isinstance(v, MediaHandle):
+                return v
+            if v.sha256 not in media:
+                content = v.data
+                try:
+                    media[v.sha256] = (v.sha256, v.mime, bytes(content))
+                finally:
+                    if isinstance(content, mmap.mmap):
+                        content.close()
+            return {"__media__": v.sha256}
+
+        record = {k: [convert(item) for item in v] if isinstance(v, list) else convert(v)
+                  for k, v in value.items()}
+        return json.dumps(record, ensure_ascii=False), list(media.values())
+
+    @staticmethod
+    def _memory_size(value: Dict[str, Any]) -> int:
+        """估算条目占用的内存：文本长度加内存中的媒体字节数，文件句柄的内容不在内存中"""
+        size = 0
+        for v in value.values():
+            for item in (v if isinstance(v, list) else [v]):
+                if isinstance(item, MediaHandle):
+                    size += 0 if item.path else item.size
+                elif isinstance(item, str):
+                    size += len(item)
+        return size
+
+    def _put_memory(self, key: str, value: Dict[str, Any]):
+        """写入内存层并按条目数与字节数做LRU淘汰（调用方需持有内存锁）"""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        size = self._memory_size(value)
+        if size > self.max_bytes:
+            # 单条超过内存上限时只保存在持久化层
+            return
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+
+    def stats(self) -> Dict[str, Any]:
+        """获取命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def clear(self):
+        """清空内存层与持久化层"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.execute("DELETE FROM llm_cache_media")
+                self._db.commit()
+
+    def close(self):
+        """关闭持久化连接"""
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+媒体上传模块
+提供商支持文件上传接口时，大媒体只上传一次，之后各轮次按文件ID引用，
+不再在每个请求中内联完整的base64内容
+"""
+
+import hashlib
+import io
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, Tuple
+from utils.log_config import get_logger
+from utils.media_store import MediaHandle
+
+logger = get_logger('core.media_upload')
+
+# Gemini 上传的文件保留48小时，提前1小时视为过期，避免请求途中失效
+_DEFAULT_TTL = 47 * 3600
+_EXPIRY_MARGIN = 3600
+
+class UploadedMedia:
+    """已上传的媒体：提供商返回的文件URI与过期时间"""
+
+    __slots__ = ("uri", "mime", "expires_at")
+
+    def __init__(self, uri: str, mime: str, expires_at: float):
+        self.uri = uri
+        self.mime = mime
+        self.expires_at = expires_at
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+    def to_part(self) -> Dict[str, Any]:
+        """按文件URI引用媒体的消息片段"""
+        return {"type": "media", "file_uri": self.uri, "mime_type": self.mime}
+
+class GeminiFileUploader:
+    """通过 Gemini Files API 上传媒体，等待文件处理完成（视频需要服务端转码）"""
+
+    def __init__(self, api_key: Optional[str], poll_interval: float = 2.0, timeout: float = 600.0):
+        """
+        Args:
+            api_key: Gemini API Key
+            poll_interval: 查询文件处理状态的间隔（秒）
+            timeout: 等待文件处理完成的最长时间（秒）
+        """
+        self.api_key = api_key
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._client = None
+
+    def _get_client(self):
+        """按需创建 google-genai 客户端"""
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    def upload(self, handle: MediaHandle) -> UploadedMedia:
+        """上传媒体句柄，文件句柄直接按路径上传，内存中的内容包装为流上传"""
+        client = self._get_client()
+        source = handle.path if handle.path else io.BytesIO(handle.data)
+        uploaded = client.files.upload(file=source, config={"mime_type": handle.mime})
+
+        deadline = time.monotonic() + self.timeout
+        while _state_name(uploaded) == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"文件 {uploaded.name} 处理超时")
+            time.sleep(self.poll_interval)
+            uploaded = client.files.get(name=uploaded.name)
+        if _state_name(uploaded) == "FAILED":
+            raise RuntimeError(f"文件 {uploaded.name} 处理失败: {getattr(uploaded, 'error', '')}")
+
+        expiration = getattr(uploaded, "expiration_time", None)
+        expires_at = expiration.timestamp() if expiration is not None else time.time() + _DEFAULT_TTL
+        return UploadedMedia(uploaded.uri, uploaded.mime_type or handle.mime, expires_at - _EXPIRY_MARGIN)
+
+class FakeFileUploader:
+    """假上传器，配合假模型用于离线测试：不发送内容，只记录上传次数"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.uploads = 0
+        self._lock = threading.Lock()
+
+    def upload(self, handle: MediaHandle) -> UploadedMedia:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.uploads += 1
+        return UploadedMedia(f"fake://files/{handle.sha256}", handle.mime, time.time() + _DEFAULT_TTL)
+
+def _state_name(uploaded) -> str:
+    """文件处理状态（枚举或字符串）"""
+    state = getattr(uploaded, "state", None)
+    return str(getattr(state, "name", state) or "ACTIVE")
+
+class MediaUploadCache:
+    """
+    已上传媒体的缓存，按 (上传端点, 内容sha256) 索引，线程安全
+
+    同一媒体被多个轮次或多条记录同时引用时只上传一次：后到的调用方等待进行中的上传；
+    上传失败不缓存，下次引用时重试；过期条目在下次引用时重新上传
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], UploadedMedia] = {}
+        self._pending: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.hits = 0
+
+    def get_or_upload(self, endpoint: str, uploader, handle: MediaHandle) -> UploadedMedia:
+        """
+        返回媒体的上传结果，未上传或已过期时上传
+
+        Args:
+            endpoint: 上传端点标识，不同账号上传的文件互不可见
+            uploader: 具有 upload(handle) 方法的上传器
+            handle: 媒体句柄
+
+        Returns:
+            UploadedMedia: 上传结果；上传失败时抛出异常
+        """
+        key = (endpoint, handle.sha256)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not entry.expired:
+                self.hits += 1
+                return entry
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._pending[key] = future
+            else:
+                self.hits += 1
+        if not owner:
+            return future.result()
+
+        try:
+            start = time.perf_counter()
+            entry = uploader.upload(handle)
+            logger.info(f"📤 媒体已上传 {handle!r} -> {entry.uri} ({time.perf_counter() - start:.2f}s)")
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._entries[key] = entry
+            self._pending.pop(key, None)
+            self.uploads += 1
+        future.set_result(entry)
+        return entry
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "uploads": self.uploads, "hits": self.hits}
+
+# 上传器与上传缓存在进程内共享，所有配置节与流水线复用同一份已上传文件
+_uploaders: Dict[str, Any] = {}
+_uploaders_lock = threading.Lock()
+_default_cache: Optional[MediaUploadCache] = None
+
+def upload_endpoint(provider: str, api_key: Optional[str]) -> str:
+    """上传端点标识：提供商 + API Key 摘要（不记录明文Key）"""
+    digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+    return f"{provider}:{digest}"
+
+def get_media_uploader(provider: str, api_key: Optional[str]):
+    """
+    获取提供商的共享上传器
+
+    Args:
+        provider: 提供商（google_genai 或 fake）
+        api_key: API Key
+
+    Returns:
+        上传器；提供商不支持文件上传时返回None
+    """
+    if provider not in ("google_genai", "fake"):
+        return None
+    endpoint = upload_endpoint(provider, api_key)
+    with _uploaders_lock:
+        uploader = _uploaders.get(endpoint)
+        if uploader is None:
+            uploader = GeminiFileUploader(api_key) if provider == "google_genai" else FakeFileUploader()
+            _uploaders[endpoint] = uploader
+        return uploader
+
+def get_media_upload_cache() -> MediaUploadCache:
+    """获取进程级上传缓存"""
+    global _default_cache
+    with _uploaders_lock:
+        if _default_cache is None:
+            _default_cache = MediaUploadCache()
+        return _default_cache
@@ -4,55 +4,127 @@
 管理整个流水线的执行，支持配置驱动的多轮处理
 """
 
-from typing import Dict, Any, List, Optional
-from config.config_reader import ConfigReader
+import functools
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Optional, Set, Tuple, Callable, AsyncIterator
+from core.checkpoint_store import CheckpointStore, round_fingerprint
+from core.compiled_config import CompiledConfig, load_compiled_config
 from core.langchain_llm import LangChainLLM
-from core.pipeline_memory import PipelineMemory
+from core.llm_cache import LLMCache
+from core.pipeline_memory import PipelineMemory, DEFAULT_SPILL_MIN_BYTES
+from core.request_coalescer import RequestCoalescer
+from core.round_cache import RoundCache, merkle_fingerprint
 from processors.input_processor import PipelineInputProcessor
 from utils import create_error_data
 from utils.log_config import get_logger
+from utils.media_store import MediaHandle
+from utils.media_worker_pool import MediaWorkerPool
+from utils.metrics import MetricsSink, RoundSpan, SOURCE_CHECKPOINT, SOURCE_ROUND_CACHE, timed
+
+# 流式回调：(轮次索引, 配置节名称, 文本片段)
+ChunkCallback = Callable[[int, str, str], None]
+# 轮次完成回调：参数为该轮结果（round、config、output、status）
+RoundCallback = Callable[[Dict[str, Any]], None]
 
 class PipelineController:
     """流水线控制器 - 纯核心逻辑"""
     
-    def __init__(self, config_file: str = "config/config.ini"):
+    def __init__(self, config_file: str = "config/config.ini", max_parallel_rounds: Optional[int] = None,
+                 cache: Optional[LLMCache] = None, checkpoint_store: Optional[CheckpointStore] = None,
+                 metrics_sink: Optional[MetricsSink] = None, media_pool: Optional[MediaWorkerPool] = None,
+                 coalescer: Optional[RequestCoalescer] = None, memory_budget: Optional[int] = None,
+                 round_cache: Optional[RoundCache] = None):
+        """
+        Args:
+            config_file: 配置文件路径
+            max_parallel_rounds: 并行模式下同时执行的轮次上限，None表示不限制
+            cache: 可选的LLM响应缓存，可在多个控制器之间共享
+            checkpoint_store: 可选的检查点存储，启用后每轮输出都会持久化
+            metrics_sink: 可选的指标接收器，每轮结束后收到一条 RoundSpan
+            media_pool: 可选的媒体工作进程池，大图片/视频的base64编解码与响应解析在工作进程中执行
+            coalescer: 可选的请求合并器，可在多个控制器之间共享，相同的并发请求只调用一次模型
+            memory_budget: 可选的单次运行媒体内存预算（字节）；设置后不再被后续轮次引用的大媒体
+                立即溢出到临时文件，驻留内存的媒体超过预算时继续溢出下次使用最晚的媒体
+            round_cache: 可选的轮次结果缓存，可在多个控制器之间共享；按配置节与其引用轮次的
+                Merkle 指纹复用整轮输出，修改某节后只重新执行受影响的轮次
+        """
         # 首先初始化logger，因为其他方法会用到
         self.logger = get_logger('pipeline.controller')
-        self.config_reader = ConfigReader(config_file)
-        self.memory = PipelineMemory()
-        self.pipeline_configs = self._load_pipeline_configs()
+        # 配置的解析、校验、模板编译与依赖图构建按文件缓存，同一配置的多个控制器只做一次
+        compiled, reused = load_compiled_config(config_file)
+        self.config_reader = compiled.reader
+        self.memory_budget = memory_budget
+        self.memory = self._new_memory()
+        self.pipeline_configs = self._load_pipeline_configs(compiled, reused)
+        self.pipeline_graph = compiled.graph
+        self.logger.debug(f"依赖图层级: {self.pipeline_graph.topological_levels()}")
+        self.max_parallel_rounds = max_parallel_rounds
+        self.cache = cache
+        self.checkpoint_store = checkpoint_store
+        self.metrics_sink = metrics_sink
+        self.media_pool = media_pool
+        self.coalescer = coalescer
+        self.round_cache = round_cache
         self.llm_instances = {}  # 缓存LLM实例
         self.config_file = config_file
         self.error_occurred = False  # 错误标志
         self.error_message = ""      # 错误信息
     
-    def _load_pipeline_configs(self) -> List[Dict[str, Any]]:
-        """加载流水线配置，按顺序排列"""
-        configs = self.config_reader.get_pipeline_configs()
+    def _load_pipeline_configs(self, compiled: CompiledConfig, reused: bool) -> List[Dict[str, Any]]:
+        """加载流水线配置，按顺序排列；模型实例在各配置节第一次执行时才创建"""
+        configs = compiled.pipeline_configs()
+        if reused:
+            self.logger.debug(f"♻️ 复用已编译配置: {len(configs)} 轮")
+            return configs
         
-        self.logger.info(f"📋 加载了 {len(configs)} 轮流水线配置")
+        self.logger.info(f"📋 加载了 {len(configs)} 轮流水线配置: "
+                         + " -> ".join(config['section_name'] for config in configs))
         for i, config in enumerate(configs):
-            self.logger.info(f"配置 {i+1}: {config['section_name']} -> {config['model']}")
+            self.logger.debug(f"配置 {i+1}: {config['section_name']} -> {config['model']}")
             if config.get('prompt'):
                 self.logger.debug(f"提示词预览: {config['prompt'][:100]}...")
         
         return configs
     
-    def execute_pipeline(self, initial_input: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """执行完整的流水线 - 纯逻辑，不处理输入输出"""
+    def execute_pipeline(self, initial_input: Dict[str, Any], parallel: bool = False,
+                         on_chunk: Optional[ChunkCallback] = None, resume: bool = False,
+                         run_id: Optional[str] = None, on_round: Optional[RoundCallback] = None) -> List[Dict[str, Any]]:
+        """
+        执行完整的流水线 - 纯逻辑，不处理输入输出
+        
+        Args:
+            initial_input: 初始输入字典
+            parallel: 是否按依赖图并行执行互不依赖的轮次
+            on_chunk: 流式回调，提供时各轮使用模型的流式接口，文本片段到达即回调；
+                并行模式下回调可能来自工作线程
+            resume: 是否从检查点恢复：配置与输入均未变化的已完成轮次直接复用输出
+            run_id: 检查点的运行ID，默认取输入中的 run_id 或 filename
+            on_round: 轮次完成回调，每轮成功写入memory后以该轮结果调用，可用于立即写出输出
+            
+        Returns:
+            List[Dict[str, Any]]: 各轮结果，按轮次排序
+        """
         self.error_occurred = False
-        self.error_message = ""        
+        self.error_message = ""
+        self.memory.error_message = ""
         results = []
         try:
-            for i, config in enumerate(self.pipeline_configs):
-                self.logger.info(f"{'='*20} 第{i}轮: {config['section_name']} {'='*20}")
-                if i == 0:
-                    if isinstance(initial_input, dict) and initial_input.get("promptVariables"):
-                        self.memory.store_round_memory(initial_input["promptVariables"], -1)
-                output = self._execute_single_round(config, i, initial_input)
-                
-                if not self._handle_round_result(output, config, i, results):
-                    break  # 停止流水线
+            self._attach_checkpoint(self.memory, initial_input, resume, run_id)
+            self._attach_round_cache(self.memory)
+            self._attach_liveness(self.memory)
+            self._store_prompt_variables(initial_input, self.memory)
+            if parallel:
+                self._execute_graph(initial_input, results, on_chunk, on_round)
+            else:
+                for i, config in enumerate(self.pipeline_configs):
+                    self.logger.info(f"{'='*20} 第{i}轮: {config['section_name']} {'='*20}")
+                    span = self._start_span(config, i, self.memory)
+                    output = self._execute_single_round(config, i, initial_input, on_chunk, span)
+                    
+                    if not self._handle_round_result(output, config, i, results, span=span, on_round=on_round):
+                        break  # 停止流水线
             
             self._finalize_pipeline()
                 
@@ -62,72 +134,438 @@ class PipelineController:
         
         return results
     
-    def _execute_single_round(self, config: Dict[str, Any], round_index: int, initial_input: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    async def execute_pipeline_async(self, initial_input: Dict[str, Any], parallel: bool = False,
+                                     on_chunk: Optional[ChunkCallback] = None, resume: bool = False,
+                                     run_id: Optional[str] = None, on_round: Optional[RoundCallback] = None) -> List[Dict[str, Any]]:
+        """
+        执行完整的流水线（异步版本）
+        
+        每次调用使用独立的 PipelineMemory，因此同一个控制器可以在一个事件循环中
+        并发驱动多条流水线；错误信息按运行记录，返回时 error_occurred/error_message
+        更新为本次运行的结果（并发运行时为最近结束的一次）
+        
+        Args:
+            initial_input: 初始输入字典
+            parallel: 是否按依赖图并行执行互不依赖的轮次
+            on_chunk: 流式回调，提供时各轮使用模型的 astream 接口
+            resume: 是否从检查点恢复
+            run_id: 检查点的运行ID，默认取输入中的 run_id 或 filename
+            on_round: 轮次完成回调，在事件循环线程中调用，应尽快返回
+            
+        Returns:
+            List[Dict[str, Any]]: 各轮结果，按轮次排序
+        """
+        results, error_message = await self._arun_pipeline(initial_input, parallel, on_chunk, resume, run_id, on_round)
+        self.error_occurred = bool(error_message)
+        self.error_message = error_message
+        return results
+    
+    async def _arun_pipeline(self, initial_input: Dict[str, Any], parallel: bool = False,
+                             on_chunk: Optional[ChunkCallback] = None, resume: bool = False,
+                             run_id: Optional[str] = None, on_round: Optional[RoundCallback] = None) -> Tuple[List[Dict[str, Any]], str]:
+        """执行一次异步运行，返回 (各轮结果, 本次运行的错误信息)，不读写控制器上的错误状态"""
+        memory = self._new_memory()
+        failed = False
+        results = []
+        try:
+            self._attach_checkpoint(memory, initial_input, resume, run_id)
+            self._attach_round_cache(memory)
+            self._attach_liveness(memory)
+            self._store_prompt_variables(initial_input, memory)
+            if parallel:
+                failed = await self._execute_graph_async(initial_input, results, memory, on_chunk, on_round)
+            else:
+                for i, config in enumerate(self.pipeline_configs):
+                    self.logger.info(f"{'='*20} 第{i}轮: {config['section_name']} {'='*20}")
+                    span = self._start_span(config, i, memory)
+                    output = await self._execute_single_round_async(config, i, initial_input, memory, on_chunk, span)
+                    
+                    if not self._handle_round_result(output, config, i, results, memory, span, on_round):
+                        failed = True
+                        break  # 停止流水线
+            
+            self._finalize_pipeline(memory, failed)
+                
+        except Exception as e:
+            self._handle_critical_error(e, memory)
+            memory.clear_memory()
+        
+        return results, memory.error_message
+    
+    async def astream_pipeline(self, initial_input: Dict[str, Any], parallel: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """
+        以异步迭代器的形式执行流水线，逐个产出事件
+        
+        事件类型：
+        - {"type": "chunk", "round": i, "config": 节名称, "text": 文本片段}
+        - {"type": "done", "results": 各轮结果, "error": 错误信息或空字符串}
+        
+        Args:
+            initial_input: 初始输入字典
+            parallel: 是否按依赖图并行执行互不依赖的轮次
+        """
+        # asyncio 按需导入，只使用同步接口时不加载（导入耗时占启动的一半以上）
+        import asyncio
+        events: asyncio.Queue = asyncio.Queue()
+        
+        def on_chunk(round_index: int, section_name: str, text: str):
+            events.put_nowait({"type": "chunk", "round": round_index, "config": section_name, "text": text})
+        
+        task = asyncio.ensure_future(self._arun_pipeline(initial_input, parallel=parallel, on_chunk=on_chunk))
+        try:
+            while not task.done() or not events.empty():
+                getter = asyncio.ensure_future(events.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                else:
+                    getter.cancel()
+            
+            results, error_message = task.result()
+            yield {"type": "done", "results": results, "error": error_message}
+        finally:
+            if not task.done():
+                task.cancel()
+    
+    def _new_memory(self) -> PipelineMemory:
+        """创建单次运行的 memory，按内存预算配置溢出策略"""
+        if self.memory_budget is None:
+            return PipelineMemory()
+        return PipelineMemory(max_resident_bytes=self.memory_budget, spill_min_bytes=DEFAULT_SPILL_MIN_BYTES)
+    
+    def _attach_liveness(self, memory: PipelineMemory):
+        """启用内存预算时，按依赖图告知 memory 各索引的读取轮次"""
+        if self.memory_budget is not None:
+            memory.set_consumers(self.pipeline_graph.memory_consumers())
+    
+    def _attach_checkpoint(self, memory: PipelineMemory, initial_input: Dict[str, Any], resume: bool, run_id: Optional[str]):
+        """为本次运行启用检查点"""
+        if self.checkpoint_store is None:
+            if resume:
+                self.logger.warning("未配置检查点存储，resume 参数被忽略")
+            return
+        memory.attach_checkpoint(self.checkpoint_store, run_id or self._default_run_id(initial_input), resume)
+    
+    def _attach_round_cache(self, memory: PipelineMemory):
+        """为本次运行启用轮次结果缓存"""
+        if self.round_cache is not None:
+            memory.attach_round_cache(self.round_cache)
+    
+    def _default_run_id(self, initial_input: Dict[str, Any]) -> str:
+        """默认运行ID：输入中的 run_id 或 filename，都没有时使用输入内容的摘要"""
+        if isinstance(initial_input, dict):
+            if initial_input.get("run_id"):
+                return str(initial_input["run_id"])
+            if initial_input.get("filename"):
+                return str(initial_input["filename"])
+        raw = json.dumps(initial_input, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+    
+    def _store_prompt_variables(self, initial_input: Dict[str, Any], memory: PipelineMemory):
+        """将 promptVariables 作为全局变量存入 memory[-1]"""
+        if self.pipeline_configs and isinstance(initial_input, dict) and initial_input.get("promptVariables"):
+            memory.store_round_memory(initial_input["promptVariables"], -1)
+    
+    def _next_rounds(self, completed: Set[int], started: Set[int], running_count: int) -> List[int]:
+        """获取可以启动的轮次，受 max_parallel_rounds 限制"""
+        ready = self.pipeline_graph.ready_rounds(completed, started)
+        if self.max_parallel_rounds:
+            ready = ready[:max(0, self.max_parallel_rounds - running_count)]
+        return ready
+    
+    def _execute_graph(self, initial_input: Dict[str, Any], results: List, on_chunk: Optional[ChunkCallback] = None,
+                       on_round: Optional[RoundCallback] = None):
+        """
+        按依赖图并行执行各轮：依赖已满足的轮次同时调用LLM
+        
+        输入渲染和结果写入memory都在当前线程完成，工作线程只负责模型调用；
+        某轮失败后不再启动新轮次，已在执行的轮次会等待其结束
+        """
+        completed: Set[int] = set()
+        started: Set[int] = set()
+        running = {}
+        spans: Dict[int, Optional[RoundSpan]] = {}
+        stopped = False
+        max_workers = self.max_parallel_rounds or max(1, len(self.pipeline_configs))
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                if not stopped:
+                    for i in self._next_rounds(completed, started, len(running)):
+                        config = self.pipeline_configs[i]
+                        self.logger.info(f"{'='*20} 第{i}轮: {config['section_name']} (并行) {'='*20}")
+                        span = spans[i] = self._start_span(config, i, self.memory)
+                        llm = self._get_llm_instance(config)
+                        input_dict = self._prepare_round_input(config, i, initial_input, self.memory, span)
+                        callback = self._bind_chunk_callback(on_chunk, i, config)
+                        running[executor.submit(self._run_round, llm, input_dict, i, callback, self.memory, span)] = i
+                        started.add(i)
+                
+                if not running:
+                    break
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    if self._handle_round_result(future.result(), self.pipeline_configs[i], i, results,
+                                                 span=spans.pop(i), on_round=on_round):
+                        completed.add(i)
+                    else:
+                        stopped = True
+        
+        results.sort(key=lambda r: r["round"])
+    
+    async def _execute_graph_async(self, initial_input: Dict[str, Any], results: List, memory: PipelineMemory,
+                                   on_chunk: Optional[ChunkCallback] = None, on_round: Optional[RoundCallback] = None) -> bool:
+        """按依赖图并行执行各轮（异步版本），返回是否失败"""
+        import asyncio
+        completed: Set[int] = set()
+        started: Set[int] = set()
+        running = {}
+        spans: Dict[int, Optional[RoundSpan]] = {}
+        failed = False
+        
+        try:
+            while True:
+                if not failed:
+                    for i in self._next_rounds(completed, started, len(running)):
+                        config = self.pipeline_configs[i]
+                        self.logger.info(f"{'='*20} 第{i}轮: {config['section_name']} (并行) {'='*20}")
+                        span = spans[i] = self._start_span(config, i, memory)
+                        llm = self._get_llm_instance(config)
+                        input_dict = await self._prepare_round_input_async(config, i, initial_input, memory, span)
+                        callback = self._bind_chunk_callback(on_chunk, i, config)
+                        task = asyncio.ensure_future(self._run_round_async(llm, input_dict, i, callback, memory, span))
+                        running[task] = i
+                        started.add(i)
+                
+                if not running:
+                    break
+                
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    i = running.pop(task)
+                    if self._handle_round_result(task.result(), self.pipeline_configs[i], i, results, memory,
+                                                 spans.pop(i), on_round):
+                        completed.add(i)
+                    else:
+                        failed = True
+        finally:
+            # 外部取消或异常时不遗留后台任务
+            for task in running:
+                task.cancel()
+        
+        results.sort(key=lambda r: r["round"])
+        return failed
+    
+    def _execute_single_round(self, config: Dict[str, Any], round_index: int, initial_input: Optional[Dict[str, Any]],
+                              on_chunk: Optional[ChunkCallback] = None, span: Optional[RoundSpan] = None) -> Dict[str, Any]:
         """执行单轮处理"""
-        # 获取或创建LLM实例（内部会设置环境变量）
+        # 获取或创建LLM实例（同一端点的模型客户端在各节之间共享）
         llm = self._get_llm_instance(config)
-        
-        # 处理输入
-        input_processor = PipelineInputProcessor(self.memory)
+        input_dict = self._prepare_round_input(config, round_index, initial_input, self.memory, span)
+        return self._run_round(llm, input_dict, round_index, self._bind_chunk_callback(on_chunk, round_index, config), self.memory, span)
+    
+    async def _execute_single_round_async(self, config: Dict[str, Any], round_index: int, initial_input: Optional[Dict[str, Any]], memory: PipelineMemory,
+                                          on_chunk: Optional[ChunkCallback] = None, span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """执行单轮处理（异步版本）"""
+        llm = self._get_llm_instance(config)
+        input_dict = await self._prepare_round_input_async(config, round_index, initial_input, memory, span)
+        return await self._run_round_async(llm, input_dict, round_index, self._bind_chunk_callback(on_chunk, round_index, config), memory, span)
+    
+    def _prepare_round_input(self, config: Dict[str, Any], round_index: int, initial_input: Optional[Dict[str, Any]], memory: PipelineMemory,
+                             span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """处理单轮输入，第0轮的输入会写入memory[0]"""
+        input_processor = PipelineInputProcessor(memory, summarizer=functools.partial(self._summarize, config))
         if round_index == 0:
-            input_dict = input_processor.process(config, initial_input)
-            self.memory.store_round_memory(input_dict, 0)  
+            input_dict = input_processor.process(config, initial_input, span)
+            memory.store_round_memory(input_dict, 0)  
         else:
-            input_dict = input_processor.process(config, {})
+            input_dict = input_processor.process(config, {}, span)
       
         # 打印输入信息（避免打印base64等长内容）
         self.logger.info(f"第{round_index}轮输入: {self._mask_media_for_log(input_dict)}")
+        self._set_fingerprints(config, round_index, input_dict, memory)
+        return input_dict
+    
+    async def _prepare_round_input_async(self, config: Dict[str, Any], round_index: int, initial_input: Optional[Dict[str, Any]], memory: PipelineMemory,
+                                         span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """处理单轮输入（异步版本），文件读取与编码在线程中完成，不阻塞事件循环"""
+        input_processor = PipelineInputProcessor(memory, summarizer=functools.partial(self._summarize, config))
+        if round_index == 0:
+            input_dict = await input_processor.aprocess(config, initial_input, span)
+            memory.store_round_memory(input_dict, 0)
+        else:
+            input_dict = await input_processor.aprocess(config, {}, span)
+        
+        self.logger.info(f"第{round_index}轮输入: {self._mask_media_for_log(input_dict)}")
+        self._set_fingerprints(config, round_index, input_dict, memory)
+        return input_dict
+    
+    def _summarize(self, config: Dict[str, Any], prompt: str, max_tokens: int) -> str:
+        """token预算的摘要子轮次：使用本配置节的模型，结果不写入 memory"""
+        output = self._get_llm_instance(config).smart_process({"text": prompt, "image": "", "video": ""})
+        return output.get("text", "")
+    
+    def _set_fingerprints(self, config: Dict[str, Any], round_index: int, input_dict: Dict[str, Any], memory: PipelineMemory):
+        """记录本轮的检查点指纹与轮次缓存指纹（对应功能启用时）"""
+        if memory.checkpoint_store:
+            memory.set_fingerprint(round_index+1, round_fingerprint(config, input_dict))
+        if memory.round_cache:
+            memory.set_cache_fingerprint(round_index+1, merkle_fingerprint(config, round_index, input_dict, memory))
+    
+    def _load_stored_output(self, round_index: int, memory: PipelineMemory, span: Optional[RoundSpan]) -> Optional[Dict[str, Any]]:
+        """读取检查点或轮次结果缓存中的输出，都没有时返回None"""
+        output = memory.load_checkpoint(round_index+1)
+        source = SOURCE_CHECKPOINT
+        if output is None:
+            output = memory.load_cached_round(round_index+1)
+            source = SOURCE_ROUND_CACHE
+        if output is not None and span is not None:
+            span.source = source
+        return output
+    
+    def _run_round(self, llm: LangChainLLM, input_dict: Dict[str, Any], round_index: int,
+                   on_chunk: Optional[Callable[[str], None]], memory: PipelineMemory,
+                   span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """执行单轮模型调用；优先使用检查点（断点续跑）或轮次结果缓存中的输出"""
+        output = self._load_stored_output(round_index, memory, span)
+        if output is not None:
+            return output
+        return self._call_llm(llm, input_dict, round_index, on_chunk, span)
+    
+    async def _run_round_async(self, llm: LangChainLLM, input_dict: Dict[str, Any], round_index: int,
+                               on_chunk: Optional[Callable[[str], None]], memory: PipelineMemory,
+                               span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """执行单轮模型调用（异步版本）；优先使用检查点（断点续跑）或轮次结果缓存中的输出"""
+        output = self._load_stored_output(round_index, memory, span)
+        if output is not None:
+            return output
+        return await self._call_llm_async(llm, input_dict, round_index, on_chunk, span)
+    
+    def _bind_chunk_callback(self, on_chunk: Optional[ChunkCallback], round_index: int, config: Dict[str, Any]) -> Optional[Callable[[str], None]]:
+        """将流水线级流式回调绑定到指定轮次"""
+        if on_chunk is None:
+            return None
+        section_name = config['section_name']
+        return lambda text: on_chunk(round_index, section_name, text)
+    
+    def _call_llm(self, llm: LangChainLLM, input_dict: Dict[str, Any], round_index: int,
+                  on_chunk: Optional[Callable[[str], None]] = None, span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """调用LLM处理单轮输入，提供回调时使用流式接口"""
+        try:
+            if on_chunk:
+                output = llm.stream_process(input_dict, on_chunk, span)
+            else:
+                output = llm.smart_process(input_dict, span)
+        except Exception as e:
+            self.logger.error(f"第{round_index}轮执行失败: {e}")
+            output = create_error_data(str(e))
         
-        # 调用LLM处理
+        self._log_round_output(round_index, output)
+        return output
+    
+    async def _call_llm_async(self, llm: LangChainLLM, input_dict: Dict[str, Any], round_index: int,
+                              on_chunk: Optional[Callable[[str], None]] = None, span: Optional[RoundSpan] = None) -> Dict[str, Any]:
+        """调用LLM处理单轮输入（异步版本），提供回调时使用流式接口"""
         try:
-            output = llm.smart_process(input_dict)
+            if on_chunk:
+                output = await llm.astream_process(input_dict, on_chunk, span)
+            else:
+                output = await llm.asmart_process(input_dict, span)
         except Exception as e:
             self.logger.error(f"第{round_index}轮执行失败: {e}")
             output = create_error_data(str(e))
         
-        # 打印输出信息
+        self._log_round_output(round_index, output)
+        return output
+    
+    def _start_span(self, config: Dict[str, Any], round_index: int, memory: PipelineMemory) -> Optional[RoundSpan]:
+        """开始记录一轮，未配置指标接收器时返回None"""
+        if self.metrics_sink is None:
+            return None
+        llm = self._get_llm_instance(config)
+        return RoundSpan(config['section_name'], llm.full_model_name or config.get('model', ''), round_index, memory.run_id or "")
+    
+    def _emit_span(self, span: Optional[RoundSpan], status: str):
+        """结束记录并交给指标接收器，接收器异常不影响流水线"""
+        if span is None:
+            return
+        span.finish(status)
+        try:
+            self.metrics_sink.emit(span)
+        except Exception as e:
+            self.logger.warning(f"指标接收器处理失败: {e}")
+    
+    def _log_round_output(self, round_index: int, output: Dict[str, Any]):
+        """打印单轮输出信息"""
         self.logger.info(f"📥 第{round_index}轮输出:")
         self.logger.info(f"  文本: {output.get('text', '')[:100]}..." if output.get('text') else "  文本: 无")
         self.logger.info(f"  图片: {'已生成' if output.get('image') else '无'}")
         self.logger.info(f"  视频: {'已生成' if output.get('video') else '无'}")
-        
-        return output
     
 
-    def _handle_round_result(self, output: Dict[str, Any], config: Dict[str, Any], round_index: int, results: List) -> bool:
+    def _handle_round_result(self, output: Dict[str, Any], config: Dict[str, Any], round_index: int, results: List,
+                             memory: Optional[PipelineMemory] = None, span: Optional[RoundSpan] = None,
+                             on_round: Optional[RoundCallback] = None) -> bool:
         """处理单轮结果，返回是否继续执行"""
+        if memory is None:
+            memory = self.memory
+        
         # 检查输出是否有错误
         if self._is_error_output(output):
-            self._handle_pipeline_error(round_index, config, output)
+            self._handle_pipeline_error(round_index, config, output, memory)
+            self._emit_span(span, "error")
             return False  # 停止流水线
         
-        # 存储输出到memory
-        self.memory.store_round_memory(output, round_index+1)
-        results.append({
+        # 存储输出到memory（含检查点写入）
+        with timed(span, "memory_store"):
+            memory.store_round_memory(output, round_index+1)
+        memory.release_round(round_index)
+        result = {
             "round": round_index+1,
             "config": config['section_name'],
             "output": output,
             "status": "success"
-        })
+        }
+        results.append(result)
+        if on_round is not None:
+            with timed(span, "output_write"):
+                self._emit_round(on_round, result)
         
-        self.memory.print_memory_status()
+        memory.print_memory_status()
         self.logger.info(f"✅ 第{round_index}轮执行成功")
+        self._emit_span(span, "success")
         
         return True  # 继续执行
     
-    def _finalize_pipeline(self) -> None:
+    def _emit_round(self, on_round: Optional[RoundCallback], result: Dict[str, Any]):
+        """调用轮次完成回调，回调异常不影响流水线"""
+        if on_round is None:
+            return
+        try:
+            on_round(result)
+        except Exception as e:
+            self.logger.warning(f"轮次回调执行失败: {e}")
+    
+    def _finalize_pipeline(self, memory: Optional[PipelineMemory] = None, error_occurred: Optional[bool] = None) -> None:
         """完成流水线处理"""
-        if not self.error_occurred:
+        if memory is None:
+            memory = self.memory
+        if error_occurred is None:
+            error_occurred = self.error_occurred
+        
+        if not error_occurred:
             self.logger.info("🎉 流水线执行完成！")
             # 避免直接打印包含base64的完整内存
             self.logger.info("流水线结果概要:")
-            self.logger.info(self.memory.get_memory_summary())
+            self.logger.info(memory.get_memory_summary())
         else:
             self.logger.error("流水线执行失败")
-            self.logger.error(f"错误信息: {self.error_message}")
+            self.logger.error(f"错误信息: {memory.error_message}")
         
         # 所有轮次结束后清空记忆
-        self.memory.clear_memory()
+        memory.clear_memory()
 
     def _get_llm_instance(self, config: Dict[str, Any]) -> LangChainLLM:
         """获取或创建LLM实例"""
@@ -135,19 +573,25 @@ class PipelineController:
         
         if section_name not in self.llm_instances:
             llm = LangChainLLM(self.config_file)
-            llm.init_model_with_config(config)  # 这里会设置环境变量
+            llm.init_model_with_config(config)  # 模型客户端来自共享注册表
+            llm.cache = self.cache
+            llm.media_pool = self.media_pool
+            llm.coalescer = self.coalescer
             self.llm_instances[section_name] = llm
         
         return self.llm_instances[section_name]
     
 
     def _is_error_output(self, output: Dict[str, Any]) -> bool:
-        """检查输出是否表示错误"""
+        """检查输出是否表示错误：带有 error 标记（模型调用失败），或文本包含错误关键字"""
+        if output.get('error'):
+            return True
         text = output.get('text', '').lower()
         error_keywords = ['执行失败', 'error', '失败', '错误', 'exception']
         return any(keyword in text for keyword in error_keywords)
     
-    def _handle_pipeline_error(self, round_index: int, config: Dict[str, Any], output: Dict[str, Any]):
+    def _handle_pipeline_error(self, round_index: int, config: Dict[str, Any], output: Dict[str, Any],
+                               memory: Optional[PipelineMemory] = None):
         """处理流水线错误"""
         error_message = f"第{round_index}轮 ({config['section_name']}) 执行失败: {output.get('text', '未知错误')}"
         self._stop_pipeline(
@@ -156,25 +600,31 @@ class PipelineController:
             extra_info={
                 "错误轮次": f"第{round_index}轮",
                 "错误配置": config['section_name']
-            }
+            },
+            memory=memory
         )
     
-    def _handle_critical_error(self, error: Exception):
+    def _handle_critical_error(self, error: Exception, memory: Optional[PipelineMemory] = None):
         """处理严重错误"""
         self._stop_pipeline(
             title="严重错误",
-            error_message=f"严重错误: {str(error)}"
+            error_message=f"严重错误: {str(error)}",
+            memory=memory
         )
 
-    def _stop_pipeline(self, title: str, error_message: str, extra_info: Dict[str, Any] | None = None):
-        """统一停止流水线并输出错误信息"""
-        self.error_occurred = True
-        self.error_message = error_message
+    def _stop_pipeline(self, title: str, error_message: str, extra_info: Dict[str, Any] | None = None,
+                       memory: Optional[PipelineMemory] = None):
+        """统一停止流水线并输出错误信息；错误记录在本次运行的 memory 上，同步运行同时写入控制器"""
+        if memory is None or memory is self.memory:
+            self.error_occurred = True
+            self.error_message = error_message
+            memory = self.memory
+        memory.error_message = error_message
         self.logger.critical(f"{title}")
         if extra_info:
             for key, value in extra_info.items():
                 self.logger.error(f"{key}: {value}")
-        self.logger.error(f"错误信息: {self.error_message}")
+        self.logger.error(f"错误信息: {error_message}")
         self.logger.error("流水线已停止执行！")
     
     def print_pipeline_status(self):
@@ -195,10 +645,10 @@ class PipelineController:
         if not isinstance(data, dict):
             return data
         masked: Dict[str, Any] = dict(data)
-        if masked.get('image'):
-            masked['image'] = '[image base64 omitted]'
-        if masked.get('video'):
-            masked['video'] = '[video base64 omitted]'
+        # 媒体句柄的repr只包含类型、大小与摘要；其他形式的媒体数据直接省略
+        for kind in ('image', 'video'):
+            if masked.get(kind) and not isinstance(masked[kind], MediaHandle):
+                masked[kind] = f'[{kind} base64 omitted]'
         if isinstance(masked.get('text'), str) and len(masked.get('text')) > 200:
             masked['text'] = masked['text'][:200] + '...'
         return masked
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+流水线依赖图模块
+根据提示词中的 {textN}/{imageN}/{videoN} 引用构建轮次之间的依赖关系
+"""
+
+from typing import Dict, Any, List, Set
+from processors.prompt_template import PromptTemplate
+
+class PipelineGraph:
+    """
+    流水线依赖图
+
+    memory 索引与轮次的对应关系：
+    - 索引0：第0轮的输入（第0轮开始前写入）
+    - 索引N (N>=1)：第N-1轮的输出
+    因此第i轮引用 {textN} (N>=1) 时依赖第N-1轮；引用索引0不产生依赖。
+    只有指向更早轮次的引用才计为依赖，指向自身或之后轮次的引用会被忽略。
+    """
+
+    def __init__(self, configs: List[Dict[str, Any]]):
+        self.size = len(configs)
+        self.dependencies: Dict[int, Set[int]] = {}
+        self.dependents: Dict[int, Set[int]] = {i: set() for i in range(self.size)}
+        # memory 索引 -> 读取它的轮次；第0轮总是读取自己的输入（索引0）
+        self.consumers: Dict[int, Set[int]] = {0: {0}} if self.size else {}
+
+        for i, config in enumerate(configs):
+            template = config.get('prompt_template') or PromptTemplate.compile(config.get('prompt', ''))
+            deps = self._parse_dependencies(template, i)
+            self.dependencies[i] = deps
+            for dep in deps:
+                self.dependents[dep].add(i)
+            for memory_index in template.memory_indices:
+                self.consumers.setdefault(memory_index, set()).add(i)
+
+    def _parse_dependencies(self, template: PromptTemplate, round_index: int) -> Set[int]:
+        """根据模板中的 memory 索引引用解析单轮依赖的轮次集合"""
+        deps = set()
+        for memory_index in template.memory_indices:
+            dep_round = memory_index - 1
+            if 0 <= dep_round < round_index:
+                deps.add(dep_round)
+        return deps
+
+    def ready_rounds(self, completed: Set[int], started: Set[int]) -> List[int]:
+        """
+        获取依赖已全部完成且尚未开始的轮次
+
+        Args:
+            completed: 已成功完成的轮次
+            started: 已开始（含已完成）的轮次
+
+        Returns:
+            List[int]: 可以立即执行的轮次，按轮次顺序排列
+        """
+        return [
+            i for i in range(self.size)
+            if i not in started and self.dependencies[i] <= completed
+        ]
+
+    def memory_consumers(self) -> Dict[int, Set[int]]:
+        """
+        各 memory 索引仍会被哪些轮次读取（副本，供 PipelineMemory 做存活分析）
+
+        Returns:
+            Dict[int, Set[int]]: memory 索引 -> 读取它的轮次集合，未出现的索引没有读取者
+        """
+        return {index: set(rounds) for index, rounds in self.consumers.items()}
+
+    def topological_levels(self) -> List[List[int]]:
+        """按层级划分轮次，同一层的轮次互不依赖，层数即关键路径长度"""
+        levels: List[List[int]] = []
+        depth: Dict[int, int] = {}
+        for i in range(self.size):
+            # 依赖只指向更早的轮次，按顺序遍历即为拓扑序
+            depth[i] = max((depth[d] + 1 for d in self.dependencies[i]), default=0)
+            if depth[i] == len(levels):
+                levels.append([])
+            levels[depth[i]].append(i)
+        return levels
@@ -4,19 +4,149 @@
 管理多轮对话的状态和输出
 """
 
-from typing import Dict, Any, List, Optional
+import math
+from typing import Dict, Any, List, Optional, Set
 
 from utils.log_config import get_logger
+from utils.media_store import MediaHandle
+
+# 启用内存预算时，不再被引用的媒体超过该大小才溢出到磁盘，小文件的写盘开销高于收益
+DEFAULT_SPILL_MIN_BYTES = 256 * 1024
 
 class PipelineMemory:
-    """流水线记忆管理"""
+    """
+    流水线记忆管理
+    
+    设置读取者（set_consumers）后按存活分析管理媒体内存：某个索引不再被后续轮次引用时，
+    其中较大的媒体溢出到临时文件；驻留内存的媒体总量超过 max_resident_bytes 时，
+    优先溢出下次使用最晚的媒体。溢出是句柄原地转换，读取方无需感知
+    """
     
-    def __init__(self):
+    def __init__(self, max_resident_bytes: Optional[int] = None, spill_min_bytes: Optional[int] = None,
+                 spill_dir: Optional[str] = None):
+        """
+        Args:
+            max_resident_bytes: 驻留内存的媒体字节上限，None表示不限制
+            spill_min_bytes: 不再被引用的媒体达到该大小即溢出，None表示不按存活溢出
+            spill_dir: 溢出文件目录，默认使用进程级临时目录
+        """
         # memory结构: {index: {"text": "...", "image": "...", "video": "..."}}
         # index: 0=初始输入, 1=第一轮输出, 2=第二轮输出...
         self.memory = {}
         self.current_round = 0
         self.logger = get_logger('pipeline.memory')
+        
+        # 检查点（可选）：每轮输出写入 CheckpointStore，resume 时按指纹恢复
+        self.checkpoint_store = None
+        self.run_id = None
+        self.resume = False
+        self.fingerprints: Dict[int, str] = {}
+        self._restored = set()
+        
+        # 轮次结果缓存（可选）：按 Merkle 指纹跨运行复用整轮输出
+        self.round_cache = None
+        self.cache_fingerprints: Dict[int, str] = {}
+        self._from_round_cache = set()
+        
+        # 内存预算与存活分析（可选）
+        self.max_resident_bytes = max_resident_bytes
+        self.spill_min_bytes = spill_min_bytes
+        self.spill_dir = spill_dir
+        self.consumers: Optional[Dict[int, Set[int]]] = None
+        self.spilled_bytes = 0
+        self.peak_resident_bytes = 0
+        
+        # 本次运行的错误信息，空字符串表示未失败；clear_memory 不清除，运行结束后仍可读取
+        self.error_message = ""
+    
+    def set_consumers(self, consumers: Dict[int, Set[int]]):
+        """
+        设置各 memory 索引的读取轮次（来自 PipelineGraph.memory_consumers），启用存活分析
+        
+        Args:
+            consumers: memory 索引 -> 读取它的轮次集合
+        """
+        self.consumers = {index: set(rounds) for index, rounds in consumers.items()}
+    
+    def release_round(self, round_index: int):
+        """
+        标记某一轮已执行完毕，不再读取任何 memory 索引；随后溢出不再被引用的媒体
+        
+        Args:
+            round_index: 轮次（从0开始）
+        """
+        if self.consumers is None:
+            return
+        for rounds in self.consumers.values():
+            rounds.discard(round_index)
+        self._enforce_budget()
+    
+    def attach_checkpoint(self, checkpoint_store, run_id: str, resume: bool = False):
+        """
+        启用检查点持久化
+        
+        Args:
+            checkpoint_store: CheckpointStore 实例
+            run_id: 运行ID
+            resume: 是否从已有检查点恢复
+        """
+        self.checkpoint_store = checkpoint_store
+        self.run_id = run_id
+        self.resume = resume
+        self.logger.info(f"💾 检查点已启用: {run_id}{' (断点续跑)' if resume else ''}")
+    
+    def attach_round_cache(self, round_cache):
+        """
+        启用轮次结果缓存
+        
+        Args:
+            round_cache: RoundCache 实例
+        """
+        self.round_cache = round_cache
+    
+    def set_cache_fingerprint(self, round_index: int, fingerprint: str):
+        """记录某个memory索引对应轮次的 Merkle 指纹，下游轮次的指纹由它派生"""
+        self.cache_fingerprints[round_index] = fingerprint
+    
+    def load_cached_round(self, round_index: int) -> Optional[Dict[str, Any]]:
+        """
+        读取轮次结果缓存
+        
+        Args:
+            round_index: memory索引
+            
+        Returns:
+            Optional[Dict[str, Any]]: 缓存的输出，未命中时返回None
+        """
+        if not (self.round_cache and round_index in self.cache_fingerprints):
+            return None
+        output = self.round_cache.get(self.cache_fingerprints[round_index])
+        if output is not None:
+            self._from_round_cache.add(round_index)
+            self.logger.info(f"♻️ 复用第{round_index-1}轮的缓存结果")
+        return output
+    
+    def set_fingerprint(self, round_index: int, fingerprint: str):
+        """记录某个memory索引对应轮次的指纹，存储输出时用于写检查点"""
+        self.fingerprints[round_index] = fingerprint
+    
+    def load_checkpoint(self, round_index: int) -> Optional[Dict[str, Any]]:
+        """
+        断点续跑时读取检查点，配置或输入变化（指纹不一致）时返回None
+        
+        Args:
+            round_index: memory索引
+            
+        Returns:
+            Optional[Dict[str, Any]]: 保存的输出
+        """
+        if not (self.resume and self.checkpoint_store and round_index in self.fingerprints):
+            return None
+        output = self.checkpoint_store.load_round(self.run_id, round_index, self.fingerprints[round_index])
+        if output is not None:
+            self._restored.add(round_index)
+            self.logger.info(f"♻️ 从检查点恢复第{round_index-1}轮输出")
+        return output
     
     def store_round_memory(self, output: Dict[str, Any], round_index: Optional[int] = None):
         """存储一轮的内存数据"""
@@ -36,6 +166,74 @@ class PipelineMemory:
             self.logger.info(f"💾 存储初始输入: {list(output.keys())}")
         else:
             self.logger.info(f"💾 存储第{round_index-1}轮输出: {list(output.keys())}")
+            self._save_checkpoint(output, round_index)
+            self._save_round_cache(output, round_index)
+        self._enforce_budget()
+    
+    def _next_use(self, index: int) -> float:
+        """索引下一次被读取的轮次，不再被读取时为无穷大"""
+        rounds = self.consumers.get(index) if self.consumers is not None else None
+        return min(rounds) if rounds else math.inf
+    
+    def _resident_handles(self) -> Dict[int, List]:
+        """
+        驻留内存的媒体句柄：id -> [句柄, 下次使用的轮次]；同一句柄出现在多个索引时取最早的使用
+        """
+        handles: Dict[int, List] = {}
+        for index, output in self.memory.items():
+            if index == -1 or not isinstance(output, dict):
+                continue
+            # 没有存活信息时先溢出较早的索引
+            next_use = self._next_use(index) if self.consumers is not None else -index
+            for value in output.values():
+                for handle in (value if isinstance(value, list) else [value]):
+                    if isinstance(handle, MediaHandle) and handle.resident:
+                        entry = handles.setdefault(id(handle), [handle, next_use])
+                        entry[1] = min(entry[1], next_use)
+        return handles
+    
+    def _enforce_budget(self):
+        """溢出不再被引用的大媒体；超出预算时按下次使用从晚到早继续溢出"""
+        if self.max_resident_bytes is None and (self.spill_min_bytes is None or self.consumers is None):
+            return
+        handles = sorted(self._resident_handles().values(), key=lambda e: (e[1], e[0].size), reverse=True)
+        resident = sum(handle.size for handle, _ in handles)
+        self.peak_resident_bytes = max(self.peak_resident_bytes, resident)
+        
+        spilled = 0
+        for handle, next_use in handles:
+            dead = next_use == math.inf and self.consumers is not None
+            over_budget = self.max_resident_bytes is not None and resident > self.max_resident_bytes
+            if not over_budget and not (dead and self.spill_min_bytes is not None and handle.size >= self.spill_min_bytes):
+                continue
+            try:
+                if handle.spill(self.spill_dir):
+                    resident -= handle.size
+                    spilled += handle.size
+            except OSError as e:
+                self.logger.error(f"媒体溢出到磁盘失败: {e}")
+                break
+        if spilled:
+            self.spilled_bytes += spilled
+            self.logger.info(f"📤 媒体溢出到磁盘: {spilled / 1024 / 1024:.1f}MB，驻留 {resident / 1024 / 1024:.1f}MB")
+    
+    def _save_checkpoint(self, output: Dict[str, Any], round_index: int):
+        """将轮次输出写入检查点（恢复得到的输出不重复写入）"""
+        if not self.checkpoint_store or round_index not in self.fingerprints or round_index in self._restored:
+            return
+        try:
+            self.checkpoint_store.save_round(self.run_id, round_index, output, self.fingerprints[round_index])
+        except Exception as e:
+            self.logger.error(f"检查点保存失败: {e}")
+    
+    def _save_round_cache(self, output: Dict[str, Any], round_index: int):
+        """将轮次输出写入轮次结果缓存（缓存命中得到的输出不重复写入）"""
+        if not self.round_cache or round_index not in self.cache_fingerprints or round_index in self._from_round_cache:
+            return
+        try:
+            self.round_cache.put(self.cache_fingerprints[round_index], output)
+        except Exception as e:
+            self.logger.error(f"轮次缓存保存失败: {e}")
     
     def get_round_memory(self, round_index: int) -> Dict[str, Any]:
         """获取指定轮次的内存数据"""
@@ -64,6 +262,16 @@ class PipelineMemory:
         """清空记忆"""
         self.memory.clear()
         self.current_round = 0
+        # 检查点只对单次运行有效，磁盘上的检查点保留
+        self.checkpoint_store = None
+        self.run_id = None
+        self.resume = False
+        self.fingerprints.clear()
+        self._restored.clear()
+        self.round_cache = None
+        self.cache_fingerprints.clear()
+        self._from_round_cache.clear()
+        self.consumers = None
         self.logger.info("记忆已清空")
     
  
\ No newline at end of file
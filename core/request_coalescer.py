@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+请求合并模块
+相同模型、相同内容的并发请求共享同一次进行中的模型调用及其结果
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, Awaitable, Tuple
+from utils.log_config import get_logger
+
+class _LeaderAborted(Exception):
+    """发起调用的请求被取消，等待方需要自行重新发起"""
+
+class RequestCoalescer:
+    """
+    进行中请求的合并器，线程安全，可在多个控制器、线程与事件循环之间共享
+
+    第一个到达的请求（leader）实际调用模型，调用期间到达的相同请求（follower）
+    等待并复用其结果；调用结束后立即移除，不承担缓存职责（跨时间的复用由 LLMCache 负责）。
+    同步与异步调用共用同一张表，因此同步线程也可以复用事件循环中进行中的调用，反之亦然
+    """
+
+    def __init__(self):
+        self.logger = get_logger('core.request_coalescer')
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        # 统计
+        self.leaders = 0
+        self.followers = 0
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """登记请求，返回 (共享的Future, 是否为leader)"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.followers += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future):
+        """移除进行中的登记"""
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def run(self, key: str, fn: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+        """
+        执行或复用一次调用
+
+        Args:
+            key: 请求键（模型与内容摘要），为空时不合并
+            fn: 实际的调用
+
+        Returns:
+            Tuple[Dict[str, Any], bool]: (结果, 是否复用了其他请求的结果)；复用的结果为浅拷贝
+        """
+        if not key:
+            return fn(), False
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                return self._lead(key, future, fn), False
+            try:
+                return dict(future.result()), True
+            except _LeaderAborted:
+                continue
+
+    async def arun(self, key: str, fn: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], bool]:
+        """
+        run 的异步版本，等待其他请求时不阻塞事件循环
+
+        Args:
+            key: 请求键，为空时不合并
+            fn: 返回协程的实际调用
+
+        Returns:
+            Tuple[Dict[str, Any], bool]: (结果, 是否复用了其他请求的结果)
+        """
+        import asyncio
+        if not key:
+            return await fn(), False
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                try:
+                    result = await fn()
+                except BaseException as e:
+                    self._abort(key, future, e)
+                    raise
+                self._complete(key, future, result)
+                return result, False
+            try:
+                # shield：等待方被取消时不影响共享的 Future
+                return dict(await asyncio.shield(asyncio.wrap_future(future))), True
+            except _LeaderAborted:
+                continue
+
+    def _lead(self, key: str, future: Future, fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """以leader身份执行调用并发布结果"""
+        try:
+            result = fn()
+        except BaseException as e:
+            self._abort(key, future, e)
+            raise
+        self._complete(key, future, result)
+        return result
+
+    def _complete(self, key: str, future: Future, result: Dict[str, Any]):
+        """先移除登记再发布结果，之后到达的请求不会拿到已完成的调用"""
+        self._finish(key, future)
+        future.set_result(result)
+
+    def _abort(self, key: str, future: Future, error: BaseException):
+        """leader 失败或被取消：等待方各自重新发起调用"""
+        self._finish(key, future)
+        self.logger.debug(f"合并请求的发起方中止: {type(error).__name__}")
+        future.set_exception(_LeaderAborted())
+
+    def stats(self) -> Dict[str, Any]:
+        """合并统计"""
+        with self._lock:
+            total = self.leaders + self.followers
+            return {
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "inflight": len(self._inflight),
+                "dedup_rate": self.followers / total if total else 0.0,
+            }
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+轮次结果缓存模块
+按 Merkle 指纹缓存整轮输出并跨运行复用：指纹由配置节内容与其引用轮次的指纹组成，
+修改某一节后只有它和（直接或间接）引用它的轮次失效，其余轮次直接复用，类似构建系统的增量构建
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+from core.checkpoint_store import MediaRecordStore, update_input_digest
+from processors.prompt_template import PromptTemplate
+from utils.log_config import get_logger
+
+# 指纹格式版本，格式变化时递增，旧条目自然失效
+_FINGERPRINT_VERSION = b"round-cache-v1"
+# 不影响输出内容的配置项：密钥、由prompt派生的模板对象、调用策略（重试/超时/限流/并发）、媒体传输方式
+_NON_SEMANTIC_KEYS = ("api_key", "prompt_template", "max_retries", "retry_backoff", "retry_backoff_max",
+                      "timeout", "rpm", "tpm", "adaptive_concurrency", "max_concurrency",
+                      "upload_media_mb")
+
+def section_digest(config: Dict[str, Any]) -> str:
+    """
+    配置节内容摘要：模型、提供商、端点、提示词原文与其他参数
+
+    Args:
+        config: 配置节字典
+
+    Returns:
+        str: sha256十六进制摘要
+    """
+    h = hashlib.sha256()
+    for key in sorted(config):
+        if key in _NON_SEMANTIC_KEYS:
+            continue
+        h.update(f"{key}={config[key]}".encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def merkle_fingerprint(config: Dict[str, Any], round_index: int, input_dict: Dict[str, Any], memory) -> str:
+    """
+    计算单轮的 Merkle 指纹
+
+    - 第0轮：配置节摘要 + 渲染后的输入内容（运行输入没有上游轮次）
+    - 第i轮：配置节摘要 + 模板用到的 promptVariables 变量值 + 引用的 memory 索引的指纹；
+      索引0取第0轮输入的内容摘要，索引N (1<=N<=i) 取第N-1轮的指纹，之后轮次的引用渲染时不存在，不计入
+
+    Args:
+        config: 配置节字典
+        round_index: 轮次（从0开始）
+        input_dict: 本轮最终输入（仅第0轮使用）
+        memory: 本次运行的 PipelineMemory，cache_fingerprints 中已有上游轮次的指纹
+
+    Returns:
+        str: sha256十六进制摘要
+    """
+    h = hashlib.sha256(_FINGERPRINT_VERSION)
+    h.update(section_digest(config).encode("ascii"))
+    if round_index == 0:
+        h.update(b"\0input\0")
+        update_input_digest(h, input_dict)
+        return h.hexdigest()
+
+    template = config.get('prompt_template') or PromptTemplate.compile(config.get('prompt', ''))
+    variables = memory.get_round_memory(-1)
+    for name in sorted(set(template.variables)):
+        value = str(variables[name]) if name in variables else "\0missing"
+        h.update(f"\0var:{name}={value}".encode("utf-8"))
+    for index in sorted(set(template.memory_indices)):
+        if index == 0:
+            ref = hashlib.sha256()
+            update_input_digest(ref, memory.get_round_memory(0))
+            upstream = ref.hexdigest()
+        elif index <= round_index:
+            upstream = memory.cache_fingerprints.get(index, "")
+        else:
+            upstream = ""
+        h.update(f"\0ref:{index}={upstream}".encode("ascii"))
+    return h.hexdigest()
+
+class RoundCache(MediaRecordStore):
+    """
+    轮次结果缓存，线程安全，可在多个控制器与多次运行之间共享
+
+    目录结构：
+    cache/rounds/
+    ├── media/{sha256}          # 媒体内容按摘要存储，与各条目共享
+    └── entries/{ab}/{指纹}.json
+    """
+
+    def __init__(self, root_dir: str = "cache/rounds"):
+        super().__init__(root_dir)
+        self.entries_dir = self.root / "entries"
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        self.logger = get_logger('core.round_cache')
+        self._lock = threading.Lock()
+
+        # 命中统计
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, fingerprint: str) -> Path:
+        """条目路径，按指纹前两位分目录"""
+        return self.entries_dir / fingerprint[:2] / f"{fingerprint}.json"
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存的轮次输出
+
+        Args:
+            fingerprint: 轮次的 Merkle 指纹
+
+        Returns:
+            Optional[Dict[str, Any]]: 输出字典，不存在或已损坏时返回None
+        """
+        target = self._entry_path(fingerprint)
+        output = None
+        try:
+            with open(target, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            if record.get("fingerprint") == fingerprint and self._media_available(record["output"]):
+                output = self.deserialize_output(record["output"])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.warning(f"轮次缓存读取失败，将重新执行: {target} ({e})")
+        with self._lock:
+            if output is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return output
+
+    def _media_available(self, record: Dict[str, Any]) -> bool:
+        """条目引用的媒体文件是否都存在；缺失时视为未命中，不返回缺图的输出"""
+        for value in record.values():
+            for item in (value if isinstance(value, list) else [value]):
+                if isinstance(item, dict) and "__media__" in item and not (self.media_dir / item["__media__"]).exists():
+                    return False
+        return True
+
+    def put(self, fingerprint: str, output: Dict[str, Any]):
+        """
+        写入轮次输出，先写临时文件再原子替换
+
+        Args:
+            fingerprint: 轮次的 Merkle 指纹
+            output: 轮次输出字典
+        """
+        target = self._entry_path(fingerprint)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        record = {"fingerprint": fingerprint, "output": self.serialize_output(output)}
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp, target)
+        self.logger.debug(f"💾 写入轮次缓存: {fingerprint[:12]}")
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+持久化工作队列模块
+基于SQLite的批量记录队列：协调方入队，任意数量的工作进程以租约方式领取记录、
+定期续约并回报结果；租约过期（工作进程崩溃或失联）的记录重新投递给其他工作进程
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, Iterator
+from utils.log_config import get_logger
+
+# 记录状态
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    record TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, lease_until);
+CREATE INDEX IF NOT EXISTS idx_tasks_job ON tasks (job, status);
+"""
+
+class WorkQueue:
+    """
+    SQLite工作队列，线程安全、多进程安全
+
+    - enqueue/enqueue_file：协调方写入记录
+    - lease：工作进程领取记录，租约期内其他工作进程不会领取
+    - heartbeat：续约执行中的记录
+    - complete/fail：回报结果；失败且未超过最大尝试次数的记录重新排队
+    - 租约过期的记录在下一次 lease 时重新投递，尝试次数用尽后标记为失败
+
+    所有状态变更都带 worker 条件：租约已被其他工作进程接管时，原工作进程的回报被忽略。
+    多台主机共享时数据库需位于支持文件锁的共享存储上，且各主机时钟同步（租约按墙钟计算）
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 60.0, max_attempts: int = 3):
+        """
+        Args:
+            db_path: SQLite数据库路径，不存在时创建
+            lease_seconds: 租约时长（秒），工作进程需在到期前续约
+            max_attempts: 每条记录的最大尝试次数（含租约过期的尝试）
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, int(max_attempts))
+        self.logger = get_logger('core.work_queue')
+        self._local = threading.local()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> "sqlite3.Connection":
+        """每个线程一个连接；自动提交模式，事务显式开启"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3  # 只在使用队列时加载
+            conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        """写事务：BEGIN IMMEDIATE 立即取得写锁，领取时不会有两个工作进程拿到同一条记录"""
+        return _Transaction(self._conn())
+
+    def enqueue(self, records: Iterable[Dict[str, Any]], job: str = "default") -> int:
+        """
+        批量入队
+
+        Args:
+            records: 与 execute_pipeline 相同格式的输入字典，需包含 filename
+            job: 任务名，用于分组统计与查询
+
+        Returns:
+            int: 入队的记录数
+        """
+        now = time.time()
+        rows = [
+            (job, str(record.get("filename", "")), json.dumps(record, ensure_ascii=False), PENDING, now, now)
+            for record in records
+        ]
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO tasks (job, filename, record, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        self.logger.info(f"📥 入队 {len(rows)} 条记录 ({job})")
+        return len(rows)
+
+    def enqueue_file(self, input_file: str, job: str = "default", batch_size: int = 1000) -> int:
+        """
+        读取JSONL文件并分批入队，缺少 filename 的记录按行号命名（与 BatchRunner 一致）
+
+        Args:
+            input_file: JSONL文件路径
+            job: 任务名
+            batch_size: 每个事务写入的记录数
+
+        Returns:
+            int: 入队的记录数
+        """
+        from core.batch_runner import iter_jsonl_records
+
+        total = 0
+        batch: List[Dict[str, Any]] = []
+        for record in iter_jsonl_records(input_file, self.logger):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                total += self.enqueue(batch, job)
+                batch = []
+        if batch:
+            total += self.enqueue(batch, job)
+        return total
+
+    def lease(self, worker_id: str, limit: int = 1, job: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        领取记录：优先领取排队中的记录，其次是租约已过期的记录
+
+        Args:
+            worker_id: 工作进程ID
+            limit: 最多领取的记录数
+            job: 只领取指定任务的记录，None表示全部
+
+        Returns:
+            List[Dict[str, Any]]: 每项包含 id、job、filename、record、attempts
+        """
+        now = time.time()
+        job_clause, job_args = ("AND job = ?", [job]) if job is not None else ("", [])
+        with self._transaction() as conn:
+            # 租约过期且尝试次数已用尽的记录直接标记失败，不再投递
+            conn.execute(
+                f"UPDATE tasks SET status = ?, error = ?, worker = NULL, lease_until = NULL, updated_at = ? "
+                f"WHERE status = ? AND lease_until < ? AND attempts >= ? {job_clause}",
+                [FAILED, "租约过期次数超过上限", now, LEASED, now, self.max_attempts] + job_args,
+            )
+            rows = conn.execute(
+                f"SELECT id, job, filename, record, attempts FROM tasks "
+                f"WHERE (status = ? OR (status = ? AND lease_until < ?)) {job_clause} "
+                f"ORDER BY status = ? DESC, id LIMIT ?",
+                [PENDING, LEASED, now] + job_args + [PENDING, max(1, int(limit))],
+            ).fetchall()
+            for row in rows:
+                if row["attempts"] > 0:
+                    self.logger.warning(f"🔁 重新投递记录 {row['filename']} (第{row['attempts'] + 1}次尝试)")
+            conn.executemany(
+                "UPDATE tasks SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ?",
+                [(LEASED, worker_id, now + self.lease_seconds, now, row["id"]) for row in rows],
+            )
+        return [
+            {
+                "id": row["id"],
+                "job": row["job"],
+                "filename": row["filename"],
+                "record": json.loads(row["record"]),
+                "attempts": row["attempts"] + 1,
+            }
+            for row in rows
+        ]
+
+    def heartbeat(self, worker_id: str, task_ids: List[int]) -> List[int]:
+        """
+        续约执行中的记录
+
+        Args:
+            worker_id: 工作进程ID
+            task_ids: 执行中的记录ID
+
+        Returns:
+            List[int]: 续约成功（仍由该工作进程持有）的记录ID
+        """
+        if not task_ids:
+            return []
+        now = time.time()
+        placeholders = ",".join("?" * len(task_ids))
+        with self._transaction() as conn:
+            conn.execute(
+                f"UPDATE tasks SET lease_until = ?, updated_at = ? "
+                f"WHERE worker = ? AND status = ? AND id IN ({placeholders})",
+                [now + self.lease_seconds, now, worker_id, LEASED] + list(task_ids),
+            )
+            rows = conn.execute(
+                f"SELECT id FROM tasks WHERE worker = ? AND status = ? AND id IN ({placeholders})",
+                [worker_id, LEASED] + list(task_ids),
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def complete(self, task_id: int, worker_id: str, result: Dict[str, Any]) -> bool:
+        """
+        回报成功
+
+        Args:
+            task_id: 记录ID
+            worker_id: 工作进程ID
+            result: 结果摘要（可JSON序列化）
+
+        Returns:
+            bool: 是否记录成功；租约已被其他工作进程接管时返回False
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = ?, result = ?, error = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (DONE, json.dumps(result, ensure_ascii=False, default=str), time.time(), task_id, worker_id, LEASED),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, task_id: int, worker_id: str, error: str, result: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        回报失败：未超过最大尝试次数时重新排队，否则标记为失败
+
+        Args:
+            task_id: 记录ID
+            worker_id: 工作进程ID
+            error: 错误信息
+            result: 可选的部分结果摘要
+
+        Returns:
+            bool: 是否记录成功；租约已被其他工作进程接管时返回False
+        """
+        payload = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, "
+                "worker = NULL, lease_until = NULL, error = ?, result = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (self.max_attempts, PENDING, FAILED, error, payload, time.time(), task_id, worker_id, LEASED),
+            )
+        return cursor.rowcount == 1
+
+    def release(self, task_id: int, worker_id: str) -> bool:
+        """
+        主动归还未执行完的记录（工作进程正常退出时），不计入尝试次数
+
+        Args:
+            task_id: 记录ID
+            worker_id: 工作进程ID
+
+        Returns:
+            bool: 是否归还成功
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = ?, worker = NULL, lease_until = NULL, attempts = MAX(attempts - 1, 0), "
+                "updated_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (PENDING, time.time(), task_id, worker_id, LEASED),
+            )
+        return cursor.rowcount == 1
+
+    def requeue_failed(self, job: Optional[str] = None) -> int:
+        """
+        将失败的记录重新排队并清零尝试次数
+
+        Args:
+            job: 只处理指定任务，None表示全部
+
+        Returns:
+            int: 重新排队的记录数
+        """
+        job_clause, job_args = ("AND job = ?", [job]) if job is not None else ("", [])
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE tasks SET status = ?, attempts = 0, error = NULL, updated_at = ? WHERE status = ? {job_clause}",
+                [PENDING, time.time(), FAILED] + job_args,
+            )
+        return cursor.rowcount
+
+    def stats(self, job: Optional[str] = None) -> Dict[str, int]:
+        """
+        各状态的记录数
+
+        Args:
+            job: 只统计指定任务，None表示全部
+
+        Returns:
+            Dict[str, int]: pending、leased、done、failed 与 total
+        """
+        job_clause, job_args = ("WHERE job = ?", [job]) if job is not None else ("", [])
+        rows = self._conn().execute(
+            f"SELECT status, COUNT(*) AS n FROM tasks {job_clause} GROUP BY status", job_args
+        ).fetchall()
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for row in rows:
+            counts[row["status"]] = row["n"]
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def is_drained(self, job: Optional[str] = None) -> bool:
+        """没有排队中或执行中的记录"""
+        counts = self.stats(job)
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+
+    def wait(self, job: Optional[str] = None, poll_interval: float = 2.0,
+             timeout: Optional[float] = None) -> Dict[str, int]:
+        """
+        等待队列中的记录全部结束（完成或失败）
+
+        Args:
+            job: 只等待指定任务，None表示全部
+            poll_interval: 轮询间隔（秒）
+            timeout: 最长等待秒数，None表示不限
+
+        Returns:
+            Dict[str, int]: 结束时的统计
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while not self.is_drained(job):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(poll_interval)
+        return self.stats(job)
+
+    def iter_results(self, job: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        遍历已结束的记录
+
+        Args:
+            job: 只遍历指定任务，None表示全部
+
+        Yields:
+            Dict[str, Any]: filename、status、attempts、worker、error、result
+        """
+        job_clause, job_args = ("AND job = ?", [job]) if job is not None else ("", [])
+        cursor = self._conn().execute(
+            f"SELECT filename, status, attempts, worker, error, result FROM tasks "
+            f"WHERE status IN (?, ?) {job_clause} ORDER BY id",
+            [DONE, FAILED] + job_args,
+        )
+        for row in cursor:
+            yield {
+                "filename": row["filename"],
+                "status": row["status"],
+                "attempts": row["attempts"],
+                "worker": row["worker"],
+                "error": row["error"],
+                "result": json.loads(row["result"]) if row["result"] else None,
+            }
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+def default_worker_id() -> str:
+    """默认工作进程ID：主机名与进程号"""
+    return f"{os.uname().nodename if hasattr(os, 'uname') else 'host'}-{os.getpid()}"
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT，异常时回滚"""
+
+    def __init__(self, conn: "sqlite3.Connection"):
+        self.conn = conn
+
+    def __enter__(self) -> "sqlite3.Connection":
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
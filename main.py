@@ -4,6 +4,7 @@
 使用流水线框架执行多轮AI处理
 """
 
+import argparse
 from core.pipeline_controller import PipelineController
 from processors.output_processor import FileOutputProcessor, ConsoleOutputProcessor
 from utils.log_config import setup_logging
@@ -62,5 +63,197 @@ Next to the computer screen, place a BANDAI-style toy packaging box printed with
     logger.info("🎉 流水线系统运行完成！")
     return results
 
+def _create_batch_runner(args, aggregator, media_pool, output_writer):
+    """按命令行参数创建批量运行器（批量模式与队列工作进程共用）"""
+    from core.batch_runner import BatchRunner
+    from core.checkpoint_store import CheckpointStore
+    from core.llm_cache import LLMCache
+    from core.request_coalescer import RequestCoalescer
+    from core.round_cache import RoundCache
+
+    return BatchRunner(
+        config_file=args.config,
+        concurrency=args.concurrency,
+        output_dir=args.output_dir,
+        parallel_rounds=args.parallel,
+        cache=LLMCache(db_path=args.cache_db) if args.cache_db else None,
+        checkpoint_store=CheckpointStore(args.checkpoint_dir) if args.checkpoint_dir else None,
+        resume=args.resume,
+        metrics_sink=aggregator,
+        media_pool=media_pool,
+        output_writer=output_writer,
+        coalescer=RequestCoalescer() if args.coalesce else None,
+        memory_budget=args.memory_budget_mb * 1024 * 1024 if args.memory_budget_mb is not None else None,
+        round_cache=RoundCache(args.round_cache_dir) if args.round_cache_dir else None
+    )
+
+def run_batch(args):
+    """批量模式 - 从JSONL文件读取输入并发执行"""
+    from processors.output_writer import OutputWriter
+    from utils.media_worker_pool import MediaWorkerPool
+    from utils.metrics import InMemoryAggregator, PrometheusExporter
+
+    logger = setup_logging(level='INFO', log_file='logs/pipeline.log')
+    logger.info("启动LangChain流水线系统（批量模式）")
+
+    aggregator = InMemoryAggregator() if args.metrics_out else None
+    media_pool = MediaWorkerPool(args.media_workers) if args.media_workers else None
+    output_writer = OutputWriter(args.output_dir) if args.async_output else None
+    runner = _create_batch_runner(args, aggregator, media_pool, output_writer)
+    try:
+        stats = runner.run(args.batch)
+    finally:
+        if output_writer is not None:
+            output_writer.close()
+        if media_pool is not None:
+            media_pool.shutdown()
+    if aggregator is not None:
+        PrometheusExporter(aggregator).write(args.metrics_out)
+        logger.info(f"📊 指标已写出: {args.metrics_out}")
+    return stats
+
+def run_queue(args):
+    """队列模式 - 入队记录、查看进度，或作为工作进程消费队列"""
+    import json
+    import signal
+    from core.work_queue import WorkQueue
+    from service.queue_worker import QueueWorker
+    from processors.output_writer import OutputWriter
+    from utils.media_worker_pool import MediaWorkerPool
+    from utils.metrics import InMemoryAggregator, PrometheusExporter
+
+    logger = setup_logging(level='INFO', log_file='logs/pipeline.log')
+    work_queue = WorkQueue(args.queue_db, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+
+    if args.requeue_failed:
+        logger.info(f"🔁 重新排队失败记录 {work_queue.requeue_failed(args.job)} 条")
+    if args.enqueue:
+        work_queue.enqueue_file(args.enqueue, job=args.job or "default")
+        if args.wait:
+            work_queue.wait(args.job or "default")
+    if not args.worker:
+        stats = work_queue.stats(args.job)
+        print(json.dumps(stats, ensure_ascii=False))
+        return stats
+
+    logger.info("启动LangChain流水线系统（队列工作进程）")
+    aggregator = InMemoryAggregator() if args.metrics_out else None
+    media_pool = MediaWorkerPool(args.media_workers) if args.media_workers else None
+    output_writer = OutputWriter(args.output_dir) if args.async_output else None
+    worker = QueueWorker(
+        work_queue,
+        _create_batch_runner(args, aggregator, media_pool, output_writer),
+        worker_id=args.worker_id,
+        job=args.job,
+        exit_when_empty=args.exit_when_empty
+    )
+    # SIGTERM 与 Ctrl+C 一样：停止领取，执行中的记录完成并回报后退出
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    try:
+        stats = worker.run()
+    finally:
+        if output_writer is not None:
+            output_writer.close()
+        if media_pool is not None:
+            media_pool.shutdown()
+    if aggregator is not None:
+        PrometheusExporter(aggregator).write(args.metrics_out)
+        logger.info(f"📊 指标已写出: {args.metrics_out}")
+    return stats
+
+def _parse_pairs(items, option: str, value_type=str):
+    """解析 NAME=VALUE 形式的重复参数"""
+    pairs = {}
+    for item in items or []:
+        name, sep, value = item.partition("=")
+        if not sep or not name:
+            raise SystemExit(f"{option} 参数格式应为 NAME=VALUE: {item}")
+        pairs[name] = value_type(value)
+    return pairs
+
+def run_server(args):
+    """服务模式 - 以HTTP接口接收运行请求"""
+    from core.llm_cache import LLMCache
+    from core.request_coalescer import RequestCoalescer
+    from core.round_cache import RoundCache
+    from service import JobManager, serve
+    from utils.metrics import InMemoryAggregator, PrometheusExporter
+
+    logger = setup_logging(level='INFO', log_file='logs/pipeline.log')
+    logger.info("启动LangChain流水线系统（服务模式）")
+
+    workflows = _parse_pairs(args.workflow, "--workflow") or {"default": args.config}
+    aggregator = InMemoryAggregator()
+    job_manager = JobManager(
+        workflows,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        max_queue=args.max_queue,
+        max_per_workflow=args.max_per_workflow,
+        workflow_limits=_parse_pairs(args.workflow_limit, "--workflow-limit", int),
+        cache=LLMCache(db_path=args.cache_db) if args.cache_db else None,
+        coalescer=RequestCoalescer() if args.coalesce else None,
+        metrics_sink=aggregator,
+        memory_budget=args.memory_budget_mb * 1024 * 1024 if args.memory_budget_mb is not None else None,
+        allow_file_inputs=args.allow_file_inputs,
+        round_cache=RoundCache(args.round_cache_dir) if args.round_cache_dir else None
+    )
+    serve(job_manager, host=args.host, port=args.port, exporter=PrometheusExporter(aggregator))
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="LangChain流水线系统")
+    parser.add_argument("--config", default="config/config.ini", help="配置文件路径")
+    parser.add_argument("--batch", help="批量输入的JSONL文件，每行一个输入字典")
+    parser.add_argument("--concurrency", type=int, default=4, help="批量模式下同时执行的流水线数量")
+    parser.add_argument("--output-dir", default="outputs", help="批量模式与服务模式的输出目录")
+    parser.add_argument("--parallel", action="store_true", help="按依赖图并行执行互不依赖的轮次")
+    parser.add_argument("--cache-db", help="LLM响应缓存的SQLite文件路径，重复运行时复用已有响应")
+    parser.add_argument("--checkpoint-dir", help="检查点目录，每轮输出持久化，失败后可断点续跑")
+    parser.add_argument("--resume", action="store_true", help="从检查点恢复配置与输入未变化的已完成轮次")
+    parser.add_argument("--round-cache-dir",
+                        help="轮次结果缓存目录：配置节及其引用的轮次都未变化时直接复用上次的整轮输出，修改某节后只重跑受影响的轮次")
+    parser.add_argument("--media-workers", type=int, default=0,
+                        help="媒体工作进程数，大于0时大图片/视频的base64编解码在独立进程中执行")
+    parser.add_argument("--memory-budget-mb", type=int,
+                        help="每条记录的媒体内存预算（MB），不再被后续轮次引用的大媒体与超出预算的媒体溢出到临时文件")
+    parser.add_argument("--coalesce", action="store_true",
+                        help="合并相同模型、相同内容的并发请求，只调用一次模型并共享结果")
+    parser.add_argument("--async-output", action="store_true",
+                        help="后台写出输出：每轮完成即保存，所有记录追加到 output-dir/summary.jsonl")
+    parser.add_argument("--metrics-out", help="批量模式结束后以Prometheus文本格式写出各配置节的耗时、token与载荷统计")
+    parser.add_argument("--serve", action="store_true", help="以HTTP服务方式运行，通过 POST /runs 提交任务")
+    parser.add_argument("--host", default="127.0.0.1", help="服务模式的监听地址")
+    parser.add_argument("--port", type=int, default=8080, help="服务模式的监听端口")
+    parser.add_argument("--workers", type=int, default=4, help="服务模式下同时执行的任务数（全部工作流共享）")
+    parser.add_argument("--max-queue", type=int, default=64, help="服务模式的排队任务上限，超过时返回429")
+    parser.add_argument("--workflow", action="append", metavar="NAME=CONFIG",
+                        help="服务模式的工作流（可重复），默认只有 default=--config")
+    parser.add_argument("--max-per-workflow", type=int, help="每个工作流同时执行的任务数上限，默认等于 --workers")
+    parser.add_argument("--workflow-limit", action="append", metavar="NAME=N", help="指定工作流的并发上限（可重复）")
+    parser.add_argument("--allow-file-inputs", action="store_true",
+                        help="服务模式下允许输入中的图片/视频使用服务器本地文件路径")
+    parser.add_argument("--queue-db", help="持久化工作队列的SQLite文件路径；单独指定时打印队列进度")
+    parser.add_argument("--enqueue", metavar="FILE", help="将JSONL文件中的记录写入工作队列")
+    parser.add_argument("--job", help="队列任务名：入队时默认 default，工作进程与进度查询默认全部任务")
+    parser.add_argument("--wait", action="store_true", help="入队后等待全部记录结束再打印进度")
+    parser.add_argument("--requeue-failed", action="store_true", help="将失败的记录重新排队并清零尝试次数")
+    parser.add_argument("--worker", action="store_true",
+                        help="作为工作进程消费队列（可在多台主机上启动任意数量），并发数为 --concurrency")
+    parser.add_argument("--worker-id", help="工作进程ID，默认主机名与进程号")
+    parser.add_argument("--lease-seconds", type=float, default=60.0,
+                        help="记录的租约时长（秒），工作进程每 1/3 租约续约一次，失联超过租约后记录重新投递")
+    parser.add_argument("--max-attempts", type=int, default=3, help="每条记录的最大尝试次数，超过后标记为失败")
+    parser.add_argument("--exit-when-empty", action="store_true", help="队列中没有排队或执行中的记录时工作进程退出")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    main()
+    cli_args = parse_args()
+    if cli_args.serve:
+        run_server(cli_args)
+    elif cli_args.queue_db:
+        run_queue(cli_args)
+    elif cli_args.batch:
+        run_batch(cli_args)
+    else:
+        main()
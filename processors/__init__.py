@@ -4,9 +4,17 @@
 """
 from .input_processor import PipelineInputProcessor
 from .output_processor import FileOutputProcessor, ConsoleOutputProcessor
+from .output_writer import OutputWriter, JsonlAppender
+from .prompt_template import PromptTemplate
+from .token_budget import TokenBudget, count_tokens
 
 __all__ = [
     'PipelineInputProcessor',
     'FileOutputProcessor',
     'ConsoleOutputProcessor',
+    'OutputWriter',
+    'JsonlAppender',
+    'PromptTemplate',
+    'TokenBudget',
+    'count_tokens',
 ]
@@ -70,49 +70,27 @@ class FileOutputProcessor:
         
         self.logger.info("✅ 所有输出已保存完成")
     
+    async def aprocess(self, results: List[Dict[str, Any]], output_dir: str = "outputs", filename: str = "default", save_mode: str = "rounds", **kwargs):
+        """
+        process 的异步版本，文件写入在线程中执行，不阻塞事件循环
+        
+        Args:
+            results: 流水线执行结果
+            output_dir: 输出目录
+            filename: 文件名前缀，用于组织文件结构
+            save_mode: 保存模式 ("combined" 或 "rounds")
+        """
+        import asyncio
+        await asyncio.to_thread(self.process, results, output_dir, filename, save_mode, **kwargs)
+    
     def _save_combined(self, results: List[Dict[str, Any]], filename_dir: Path, filename: str):
         """默认的合并保存模式"""
         # 创建images和videos子目录
-        images_dir = filename_dir / "images"
-        videos_dir = filename_dir / "videos"
-        images_dir.mkdir(exist_ok=True)
-        videos_dir.mkdir(exist_ok=True)
+        (filename_dir / "images").mkdir(exist_ok=True)
+        (filename_dir / "videos").mkdir(exist_ok=True)
         
         # 处理每轮输出并创建简化的结果
-        simplified_results = []
-        for result in results:
-            round_num = result["round"]
-            output = result["output"]
-            
-            # 保存图片内容
-            if output.get("image"):
-                image_file = images_dir / f"{filename}_{round_num}.png"
-                if save_image(output["image"], str(image_file)):
-                    self.logger.info(f"保存图片: {image_file}")
-                else:
-                    self.logger.error(f"保存图片失败: {image_file}")
-            
-            # 保存视频内容
-            if output.get("video"):
-                video_file = videos_dir / f"{filename}_{round_num}.mp4"
-                if save_image(output["video"], str(video_file)):  # 视频也用save_image，因为都是base64
-                    self.logger.info(f"保存视频: {video_file}")
-                else:
-                    self.logger.error(f"保存视频失败: {video_file}")
-            
-            # 创建简化的result，只保留text内容，去掉base64数据
-            simplified_result = {
-                "filename": filename,
-                "round": result["round"],
-                "config": result["config"],
-                "status": result["status"],
-                "output": {
-                    "text": output.get("text", ""),
-                    "has_image": bool(output.get("image")),
-                    "has_video": bool(output.get("video"))
-                }
-            }
-            simplified_results.append(simplified_result)
+        simplified_results = [self.save_round(result, filename_dir.parent, filename, "filename") for result in results]
         
         # 保存JSONL格式文件，每行一个JSON对象（只包含文本内容）
         output_jsonl = filename_dir / "output.jsonl"
@@ -123,65 +101,101 @@ class FileOutputProcessor:
     
     def _save_by_rounds(self, results: List[Dict[str, Any]], output_path: Path, filename: str):
         """按轮次分组的保存模式 - 直接在outputs下创建round1, round2等目录"""
-        simplified_results = []
+        simplified_results = [self.save_round(result, output_path, filename, "rounds") for result in results]
         
-        for result in results:
-            round_num = result["round"]
-            output = result["output"]
-            
-            # 创建轮次目录（直接在outputs下）
-            round_dir = output_path / f"round{round_num}"
-            round_dir.mkdir(exist_ok=True)
-            
-            # 创建images和videos子目录
-            images_dir = round_dir / "images"
-            videos_dir = round_dir / "videos"
-            
-            # 保存图片内容
-            if output.get("image"):
-                images_dir.mkdir(exist_ok=True)
-                image_file = images_dir / f"{filename}.png"
-                if save_image(output["image"], str(image_file)):
-                    self.logger.info(f"保存图片: {image_file}")
-                else:
-                    self.logger.error(f"保存图片失败: {image_file}")
-            
-            # 保存视频内容
-            if output.get("video"):
-                videos_dir.mkdir(exist_ok=True)
-                video_file = videos_dir / f"{filename}.mp4"
-                if save_image(output["video"], str(video_file)):
-                    self.logger.info(f"保存视频: {video_file}")
-                else:
-                    self.logger.error(f"保存视频失败: {video_file}")
+        # 追加到汇总JSONL文件（在outputs根目录下），多条记录写入同一目录时不会相互覆盖
+        from processors.output_writer import JsonlAppender
+        summary_jsonl = output_path / "summary.jsonl"
+        try:
+            with JsonlAppender(str(summary_jsonl)) as appender:
+                appender.append(simplified_results)
+            self.logger.info(f"保存汇总JSONL: {summary_jsonl}")
+        except OSError as e:
+            self.logger.error(f"保存汇总JSONL失败: {summary_jsonl}, {e}")
+    
+    def save_round(self, result: Dict[str, Any], output_path: Path, filename: str, save_mode: str = "rounds") -> Dict[str, Any]:
+        """
+        保存单轮的图片、视频（rounds 模式下还有轮次JSON），返回不含媒体数据的简化结果
+        
+        Args:
+            result: 单轮结果
+            output_path: 输出根目录
+            filename: 文件名前缀
+            save_mode: 保存模式，"filename" 为合并模式，其余为按轮次模式
             
-            # 保存当前轮次的JSON文件
-            round_result = {
-                "filename": filename,
-                "round": result["round"],
-                "config": result["config"],
-                "status": result["status"],
-                "output": {
-                    "text": output.get("text", ""),
-                    "has_image": bool(output.get("image")),
-                    "has_video": bool(output.get("video"))
-                }
+        Returns:
+            Dict[str, Any]: 简化结果，只保留text内容和媒体标记
+        """
+        round_num = result["round"]
+        output = result["output"]
+        
+        if save_mode == "filename":
+            # 合并模式：{filename}/images/{filename}_{round}.png
+            base_dir = output_path / filename
+            stem = f"{filename}_{round_num}"
+        else:
+            # 按轮次模式：round{n}/images/{filename}.png
+            base_dir = output_path / f"round{round_num}"
+            stem = filename
+        images_dir = base_dir / "images"
+        videos_dir = base_dir / "videos"
+        
+        # 保存图片内容
+        if output.get("image"):
+            images_dir.mkdir(parents=True, exist_ok=True)
+            image_file = images_dir / f"{stem}.png"
+            if save_image(output["image"], str(image_file)):
+                self.logger.info(f"保存图片: {image_file}")
+            else:
+                self.logger.error(f"保存图片失败: {image_file}")
+        # 多图输出（multi_image）：第一张之外的图片依次编号保存
+        for k, extra in enumerate(output.get("images", [])[1:], start=2):
+            images_dir.mkdir(parents=True, exist_ok=True)
+            self._save_extra_image(extra, images_dir / f"{stem}_{k}.png")
+        
+        # 保存视频内容
+        if output.get("video"):
+            videos_dir.mkdir(parents=True, exist_ok=True)
+            video_file = videos_dir / f"{stem}.mp4"
+            if save_image(output["video"], str(video_file)):  # 视频也用save_image，句柄直接写出字节
+                self.logger.info(f"保存视频: {video_file}")
+            else:
+                self.logger.error(f"保存视频失败: {video_file}")
+        
+        # 创建简化的result，只保留text内容，去掉base64数据
+        simplified_result = {
+            "filename": filename,
+            "round": result["round"],
+            "config": result["config"],
+            "status": result["status"],
+            "output": {
+                "text": output.get("text", ""),
+                "has_image": bool(output.get("image")),
+                "has_video": bool(output.get("video"))
             }
-            
-            round_json = round_dir / "output.json"
-            if save_json(round_result, str(round_json), format="json"):
+        }
+        if "images" in output:
+            simplified_result["output"]["image_count"] = len(output["images"])
+        
+        if save_mode != "filename":
+            # 保存当前轮次的JSON文件
+            base_dir.mkdir(parents=True, exist_ok=True)
+            round_json = base_dir / "output.json"
+            if save_json(simplified_result, str(round_json), format="json"):
                 self.logger.info(f"保存轮次JSON: {round_json}")
             else:
                 self.logger.error(f"保存轮次JSON失败: {round_json}")
-            
-            simplified_results.append(round_result)
         
-        # 保存汇总JSONL文件（在outputs根目录下）
-        summary_jsonl = output_path / "summary.jsonl"
-        if save_json(simplified_results, str(summary_jsonl), format="jsonl"):
-            self.logger.info(f"保存汇总JSONL: {summary_jsonl}")
+        return simplified_result
+    
+    def _save_extra_image(self, image: Any, image_file: Path):
+        """保存多图输出中的附加图片"""
+        if not image:
+            return
+        if save_image(image, str(image_file)):
+            self.logger.info(f"保存图片: {image_file}")
         else:
-            self.logger.error(f"保存汇总JSONL失败: {summary_jsonl}")
+            self.logger.error(f"保存图片失败: {image_file}")
 
 class ConsoleOutputProcessor:
     """控制台输出处理器"""
@@ -206,7 +220,8 @@ class ConsoleOutputProcessor:
             if result["output"].get("text"):
                 self.logger.info(f"文本: {result['output']['text']}")
             if result["output"].get("image"):
-                self.logger.info("图片: [已生成]")
+                count = len(result["output"].get("images") or [None])
+                self.logger.info("图片: [已生成]" if count <= 1 else f"图片: [已生成 {count} 张]")
             if result["output"].get("video"):
                 self.logger.info("视频: [已生成]")
 
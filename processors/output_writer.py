@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+后台输出写入模块
+每轮结束后立即由后台线程写出图片、视频与JSON，输出I/O与模型调用重叠；
+所有记录的简化结果追加到同一个汇总JSONL，缓冲写入并定期fsync
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Callable
+from processors.output_processor import FileOutputProcessor
+from utils import save_json
+from utils.log_config import get_logger
+
+# 队列中的停止标记
+_STOP = object()
+
+class JsonlAppender:
+    """
+    线程安全的JSONL追加写入器
+
+    行先写入内存缓冲，缓冲超过 buffer_bytes 或距上次写出超过 flush_interval 秒时
+    以一次 write 追加到文件（O_APPEND，多个进程写同一文件也不会产生交错的半行）；
+    距上次 fsync 超过 fsync_interval 秒时同步到磁盘
+    """
+
+    def __init__(self, path: str, buffer_bytes: int = 64 * 1024, flush_interval: float = 0.5,
+                 fsync_interval: float = 1.0):
+        """
+        Args:
+            path: JSONL文件路径，不存在时创建
+            buffer_bytes: 缓冲上限（字节）
+            flush_interval: 缓冲写出到文件的最长间隔（秒）
+            fsync_interval: fsync 的最长间隔（秒），为0时每次写出都 fsync
+        """
+        self.path = path
+        self.buffer_bytes = buffer_bytes
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._dirty = False
+        self._last_flush = self._last_fsync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def append(self, rows: List[Dict[str, Any]]):
+        """追加若干行"""
+        with self._lock:
+            for row in rows:
+                line = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+                self._buffer.append(line)
+                self._buffered += len(line)
+            if self._buffered >= self.buffer_bytes or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked(fsync=False)
+
+    def flush(self, fsync: bool = False):
+        """
+        写出缓冲
+
+        Args:
+            fsync: 是否强制同步到磁盘；否则只在超过 fsync_interval 时同步
+        """
+        with self._lock:
+            self._flush_locked(fsync)
+
+    def _flush_locked(self, fsync: bool):
+        """写出缓冲并按需 fsync（调用方需持有锁）"""
+        if self._fd is None:
+            return
+        if self._buffer:
+            data = b"".join(self._buffer)
+            self._buffer.clear()
+            self._buffered = 0
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view):]
+            self._dirty = True
+        now = time.monotonic()
+        self._last_flush = now
+        if self._dirty and (fsync or now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._fd)
+            self._dirty = False
+            self._last_fsync = now
+
+    def close(self):
+        """写出剩余缓冲、同步到磁盘并关闭文件"""
+        with self._lock:
+            if self._fd is None:
+                return
+            try:
+                self._flush_locked(fsync=True)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+
+    def __enter__(self) -> "JsonlAppender":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class OutputWriter:
+    """
+    后台输出写入器，可在多条记录、多个控制器之间共享
+
+    - round_callback(filename)：传给 execute_pipeline(on_round=...)，每轮成功后把该轮加入写入队列
+    - finish_record(filename)：记录结束后写出合并模式下该记录的 output.jsonl
+    - flush()/close()：等待队列写完并同步汇总文件
+
+    文件布局与 FileOutputProcessor 相同；另外所有记录的简化结果追加到 {output_dir}/summary.jsonl。
+    队列有上限，写入跟不上时提交方会阻塞，避免待写的媒体在内存中无限堆积
+    """
+
+    def __init__(self, output_dir: str = "outputs", save_mode: str = "filename", max_pending: int = 64,
+                 workers: int = 2, fsync_interval: float = 1.0):
+        """
+        Args:
+            output_dir: 输出目录
+            save_mode: 保存模式，"filename" 为合并模式，其余为按轮次模式（同 FileOutputProcessor）
+            max_pending: 队列中待写轮次的上限
+            workers: 写入线程数
+            fsync_interval: 汇总JSONL的 fsync 间隔（秒）
+        """
+        self.output_path = Path(output_dir)
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        self.save_mode = save_mode
+        self.fsync_interval = fsync_interval
+        self.logger = get_logger('pipeline.output_writer')
+        self.processor = FileOutputProcessor()
+        self.summary = JsonlAppender(str(self.output_path / "summary.jsonl"), fsync_interval=fsync_interval)
+        self.errors = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_pending))
+        self._record_rows: Dict[str, List[Dict[str, Any]]] = {}
+        self._pending_rounds: Dict[str, int] = {}  # 各记录已提交但尚未写完的轮次数
+        self._lock = threading.Lock()
+        self._rounds_done = threading.Condition(self._lock)
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"output-writer-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit_round(self, filename: str, result: Dict[str, Any]):
+        """
+        将一轮结果加入写入队列，队列已满时阻塞
+
+        Args:
+            filename: 记录的文件名前缀
+            result: 单轮结果（round、config、output、status）
+        """
+        if self._closed:
+            raise RuntimeError("OutputWriter 已关闭")
+        with self._lock:
+            self._pending_rounds[filename] = self._pending_rounds.get(filename, 0) + 1
+        self._queue.put((self._write_round, (filename, result)))
+
+    def round_callback(self, filename: str) -> Callable[[Dict[str, Any]], None]:
+        """生成传给 execute_pipeline(on_round=...) 的回调"""
+        return lambda result: self.submit_round(filename, result)
+
+    def finish_record(self, filename: str):
+        """
+        标记记录结束：合并模式下在该记录的所有轮次写完后写出 {filename}/output.jsonl
+
+        Args:
+            filename: 记录的文件名前缀
+        """
+        if self._closed:
+            raise RuntimeError("OutputWriter 已关闭")
+        self._queue.put((self._write_record, (filename,)))
+
+    def flush(self):
+        """等待队列中的写入全部完成，并将汇总文件同步到磁盘"""
+        self._queue.join()
+        self.summary.flush(fsync=True)
+
+    def close(self):
+        """写完剩余内容并停止写入线程"""
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self.summary.close()
+        if self.errors:
+            self.logger.warning(f"⚠️ 输出写入共失败 {self.errors} 次")
+
+    def _worker(self):
+        """写入线程：空闲时顺带写出汇总文件的缓冲"""
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                self._safe_flush_summary()
+                continue
+            try:
+                if item is _STOP:
+                    return
+                fn, args = item
+                fn(*args)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                self.logger.error(f"输出写入失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _safe_flush_summary(self):
+        """定期写出汇总缓冲，失败只记录日志"""
+        try:
+            self.summary.flush()
+        except OSError as e:
+            self.logger.error(f"汇总JSONL写出失败: {e}")
+
+    def _write_round(self, filename: str, result: Dict[str, Any]):
+        """写出一轮的媒体与JSON，并追加到汇总文件"""
+        try:
+            row = self.processor.save_round(result, self.output_path, filename, self.save_mode)
+            self.summary.append([row])
+            if self.save_mode == "filename":
+                with self._lock:
+                    self._record_rows.setdefault(filename, []).append(row)
+        finally:
+            with self._lock:
+                self._pending_rounds[filename] -= 1
+                self._rounds_done.notify_all()
+
+    def _write_record(self, filename: str):
+        """
+        写出合并模式下单条记录的 output.jsonl
+
+        同一记录的轮次可能仍在其他写入线程中，先等待它们写完；finish_record 在记录的
+        所有轮次提交之后才入队，等待时这些轮次都已出队，不会相互等待
+        """
+        with self._lock:
+            while self._pending_rounds.get(filename, 0) > 0:
+                self._rounds_done.wait()
+            self._pending_rounds.pop(filename, None)
+        if self.save_mode != "filename":
+            return
+        with self._lock:
+            rows = sorted(self._record_rows.pop(filename, []), key=lambda r: r["round"])
+        if not rows:
+            return
+        filename_dir = self.output_path / filename
+        filename_dir.mkdir(parents=True, exist_ok=True)
+        (filename_dir / "images").mkdir(exist_ok=True)
+        (filename_dir / "videos").mkdir(exist_ok=True)
+        output_jsonl = filename_dir / "output.jsonl"
+        if save_json(rows, str(output_jsonl), format="jsonl"):
+            self.logger.info(f"保存输出JSONL: {output_jsonl}")
+        else:
+            self.logger.error(f"保存JSONL失败: {output_jsonl}")
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
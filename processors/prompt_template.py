@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+提示词模板模块
+将提示词预编译为字面量片段与类型化占位符，渲染时只需一次拼接
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple
+
+# 所有花括号占位符，例如 {country}、{text1}、{image2}
+_PLACEHOLDER_PATTERN = re.compile(r'\{([a-zA-Z_][a-zA-Z0-9_]*)\}')
+# memory 索引引用，例如 text1、image2
+_MEMORY_REF_PATTERN = re.compile(r'^([a-zA-Z]+)(\d+)$')
+
+# 片段类型
+LITERAL = "literal"        # 字面量文本
+VARIABLE = "variable"      # 简单变量，来自 memory[-1]（promptVariables）
+MEMORY_REF = "memory_ref"  # memory 索引引用，例如 {text1}
+MEDIA_REF = "media_ref"    # 媒体引用 {imageN}/{videoN}，不进入文本
+
+class PromptTemplate:
+    """
+    预编译的提示词模板
+
+    渲染规则与原有的逐步替换一致：
+    - {name}：替换为 memory[-1] 中的同名变量，不存在时保留原样
+    - {textN} 等：替换为 memory[N] 中对应字段，不存在时保留原样
+    - {imageN}/{videoN}：从文本中移除，并按出现顺序选出第一个可用的图片/视频
+    """
+
+    def __init__(self, source: str):
+        self.source = source or ""
+        self.segments: List[Tuple[str, Any]] = self._compile(self.source)
+        self.variables = [value for kind, value in self.segments if kind == VARIABLE]
+        self.memory_refs = [value for kind, value in self.segments if kind == MEMORY_REF]
+        self.media_refs = [value for kind, value in self.segments if kind == MEDIA_REF]
+
+    @classmethod
+    @lru_cache(maxsize=256)
+    def compile(cls, source: str) -> "PromptTemplate":
+        """
+        编译提示词，相同文本复用同一个模板对象
+
+        Args:
+            source: 提示词文本
+
+        Returns:
+            PromptTemplate: 编译后的模板（只读，可在线程间共享）
+        """
+        return cls(source)
+
+    @staticmethod
+    def _compile(source: str) -> List[Tuple[str, Any]]:
+        """解析为 (类型, 值) 片段列表，相邻字面量合并"""
+        segments: List[Tuple[str, Any]] = []
+        pos = 0
+        for match in _PLACEHOLDER_PATTERN.finditer(source):
+            if match.start() > pos:
+                segments.append((LITERAL, source[pos:match.start()]))
+            key = match.group(1)
+            ref = _MEMORY_REF_PATTERN.match(key)
+            if ref is None:
+                segments.append((VARIABLE, key))
+            elif ref.group(1) in ("image", "video"):
+                segments.append((MEDIA_REF, (ref.group(1), int(ref.group(2)))))
+            else:
+                segments.append((MEMORY_REF, (ref.group(1), int(ref.group(2)))))
+            pos = match.end()
+        if pos < len(source):
+            segments.append((LITERAL, source[pos:]))
+        return segments
+
+    @property
+    def memory_indices(self) -> List[int]:
+        """模板引用的所有 memory 索引（文本与媒体引用）"""
+        return [idx for _, idx in self.memory_refs + self.media_refs]
+
+    def render(self, memory=None) -> Tuple[str, Any, Any]:
+        """
+        渲染模板
+
+        Args:
+            memory: PipelineMemory 对象，为None时只输出字面量与未解析的占位符
+
+        Returns:
+            Tuple[str, Any, Any]: (提示词文本, 引用的图片, 引用的视频)，未引用的媒体为空字符串
+        """
+        parts, image, video = self.render_parts(memory)
+        return join_parts(parts), image, video
+
+    def render_parts(self, memory=None) -> Tuple[List[Tuple[str, str]], Any, Any]:
+        """
+        渲染为 (片段类型, 文本) 列表，供token预算按片段压缩历史轮次引用；
+        join_parts 拼接后与 render 的结果相同
+
+        Args:
+            memory: PipelineMemory 对象
+
+        Returns:
+            Tuple[List[Tuple[str, str]], Any, Any]: (文本片段, 引用的图片, 引用的视频)
+        """
+        variables: Dict[str, Any] = {}
+        if memory and self.variables:
+            minus1 = memory.get_round_memory(-1)
+            if isinstance(minus1, dict):
+                variables = minus1
+
+        parts: List[Tuple[str, str]] = []
+        for kind, value in self.segments:
+            if kind == LITERAL:
+                parts.append((LITERAL, value))
+            elif kind == VARIABLE:
+                parts.append((VARIABLE, str(variables[value]) if value in variables else f"{{{value}}}"))
+            elif kind == MEMORY_REF:
+                ctype, idx = value
+                rd = memory.get_round_memory(idx) if memory else None
+                if rd and rd.get(ctype) is not None:
+                    parts.append((MEMORY_REF, str(rd[ctype])))
+                else:
+                    # 未解析的占位符原样保留，不属于可压缩的引用内容
+                    parts.append((LITERAL, f"{{{ctype}{idx}}}"))
+
+        image, video = "", ""
+        if memory:
+            for ctype, idx in self.media_refs:
+                rd = memory.get_round_memory(idx)
+                if not rd:
+                    continue
+                if ctype == "image" and not image and rd.get("image"):
+                    image = rd["image"]
+                if ctype == "video" and not video and rd.get("video"):
+                    video = rd["video"]
+
+        return parts, image, video
+
+def join_parts(parts: List[Tuple[str, str]]) -> str:
+    """拼接 render_parts 的片段为提示词文本"""
+    return "".join(text for _, text in parts).strip()
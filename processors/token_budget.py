@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+提示词token预算模块
+按配置节限制渲染后提示词的token数：超出预算时只压缩 {textN} 等历史轮次引用的内容，
+提示词本身的字面量与变量保持不变
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Callable
+from processors.prompt_template import MEMORY_REF
+from utils.log_config import get_logger
+
+logger = get_logger('processors.token_budget')
+
+# 超出预算时的处理策略
+TRUNCATE_HEAD = "truncate_head"  # 去掉开头，保留结尾
+TRUNCATE_TAIL = "truncate_tail"  # 去掉结尾，保留开头
+KEEP_LAST = "keep_last"          # 只保留最后 budget_keep_chars 个字符，仍超出时再去掉开头
+SUMMARIZE = "summarize"          # 调用本配置节的模型生成摘要，失败时退回 truncate_head
+POLICIES = (TRUNCATE_HEAD, TRUNCATE_TAIL, KEEP_LAST, SUMMARIZE)
+
+DEFAULT_KEEP_CHARS = 2000
+DEFAULT_SUMMARY_PROMPT = ("请将以下内容压缩为不超过{max_tokens}个token的摘要，"
+                          "保留后续步骤需要的关键事实、数据与结论，只输出摘要：\n\n{text}")
+
+# 摘要函数：(已填入原文的摘要提示词, token上限) -> 摘要
+Summarizer = Callable[[str, int], str]
+
+class _Tokenizer:
+    """token计数器：安装了 tiktoken 时使用本地分词，否则按字符类别估算"""
+
+    def __init__(self, encoding=None):
+        self.encoding = encoding
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return _estimate(text)
+
+    def keep(self, text: str, max_tokens: int, tail: bool) -> str:
+        """保留开头（tail=False）或结尾（tail=True）不超过 max_tokens 的内容"""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            kept = tokens[-max_tokens:] if tail else tokens[:max_tokens]
+            # 按字节解码，切断的多字节字符直接丢弃
+            return self.encoding.decode_bytes(kept).decode("utf-8", errors="ignore")
+        # 估算模式：从保留的一端逐字符累加，只遍历保留部分
+        budget = float(max_tokens)
+        chars = reversed(text) if tail else iter(text)
+        kept_chars = 0
+        for ch in chars:
+            budget -= 0.25 if ch.isascii() else 1.0
+            if budget < 0:
+                break
+            kept_chars += 1
+        return text[len(text) - kept_chars:] if tail else text[:kept_chars]
+
+def _estimate(text: str) -> int:
+    """估算token数：ASCII约4个字符一个token，中日韩等宽字符约一个字符一个token"""
+    if text.isascii():
+        return (len(text) + 3) // 4
+    # UTF-8 中宽字符多为3字节，由多出的字节数估算宽字符数
+    wide = min(len(text), (len(text.encode("utf-8")) - len(text)) // 2)
+    return (len(text) - wide + 3) // 4 + wide
+
+_tokenizers: Dict[Tuple[str, str], _Tokenizer] = {}
+_tokenizers_lock = threading.Lock()
+
+def get_tokenizer(model: str = "", tokenizer: str = "auto") -> _Tokenizer:
+    """
+    获取token计数器（按模型与分词器设置缓存）
+
+    Args:
+        model: 模型名称，tiktoken 认识时使用对应编码，否则使用 cl100k_base
+        tokenizer: auto（有 tiktoken 时使用）、estimate（始终估算）或 tiktoken 编码名
+
+    Returns:
+        _Tokenizer: 计数器，tiktoken 不可用时退回估算
+    """
+    key = (model or "", tokenizer or "auto")
+    with _tokenizers_lock:
+        cached = _tokenizers.get(key)
+    if cached is not None:
+        return cached
+
+    encoding = None
+    if key[1] != "estimate":
+        try:
+            import tiktoken
+            if key[1] != "auto":
+                encoding = tiktoken.get_encoding(key[1])
+            else:
+                try:
+                    encoding = tiktoken.encoding_for_model(key[0].split(":", 1)[-1])
+                except KeyError:
+                    encoding = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            pass
+        except Exception as e:
+            # 编码文件下载失败等
+            logger.warning(f"加载分词器失败，改为估算token数: {e}")
+    result = _Tokenizer(encoding)
+    with _tokenizers_lock:
+        return _tokenizers.setdefault(key, result)
+
+def count_tokens(text: str, model: str = "", tokenizer: str = "auto") -> int:
+    """
+    计算文本的token数
+
+    Args:
+        text: 文本
+        model: 模型名称
+        tokenizer: 分词器设置，见 get_tokenizer
+
+    Returns:
+        int: token数
+    """
+    return get_tokenizer(model, tokenizer).count(text)
+
+# 摘要缓存：同一段历史输出被多个后续轮次引用时只摘要一次
+_SUMMARY_CACHE_SIZE = 256
+_summaries: "OrderedDict[Tuple[str, str, int], str]" = OrderedDict()
+_summaries_lock = threading.Lock()
+
+class BudgetReport:
+    """一次预算检查的结果"""
+
+    __slots__ = ("tokens", "original_tokens", "policy", "applied")
+
+    def __init__(self, tokens: int, original_tokens: int, policy: str, applied: bool):
+        self.tokens = tokens
+        self.original_tokens = original_tokens
+        self.policy = policy
+        self.applied = applied
+
+    @property
+    def trimmed_tokens(self) -> int:
+        return max(0, self.original_tokens - self.tokens)
+
+class TokenBudget:
+    """
+    配置节的提示词token预算
+
+    渲染结果超出 max_prompt_tokens 时，按“先满足短引用、剩余额度平分给长引用”的方式
+    给每个 {textN} 引用分配额度，再对超出额度的引用执行策略
+    """
+
+    def __init__(self, max_tokens: int, policy: str = TRUNCATE_HEAD, keep_chars: int = DEFAULT_KEEP_CHARS,
+                 summary_prompt: str = DEFAULT_SUMMARY_PROMPT, model: str = "", tokenizer: str = "auto"):
+        """
+        Args:
+            max_tokens: 提示词（含本轮输入文本）的token上限
+            policy: 超出预算时的处理策略，见 POLICIES
+            keep_chars: keep_last 策略保留的字符数，必须大于0
+            summary_prompt: summarize 策略的提示词，{text} 为原文，{max_tokens} 为额度
+            model: 模型名称，用于选择分词器
+            tokenizer: 分词器设置，见 get_tokenizer
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"未知的预算策略: {policy}，可选: {', '.join(POLICIES)}")
+        if keep_chars <= 0:
+            raise ValueError(f"budget_keep_chars 必须大于0: {keep_chars}")
+        self.max_tokens = max_tokens
+        self.policy = policy
+        self.keep_chars = keep_chars
+        self.summary_prompt = summary_prompt
+        self.model = model
+        self.tokenizer = get_tokenizer(model, tokenizer)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional["TokenBudget"]:
+        """
+        从配置节读取预算，未设置 max_prompt_tokens 时返回None
+
+        Raises:
+            ValueError: 策略名称不合法或 budget_keep_chars 不大于0
+        """
+        max_tokens = config.get("max_prompt_tokens")
+        if max_tokens is None or str(max_tokens).strip() in ("", "0"):
+            return None
+        keep_chars = config.get("budget_keep_chars")
+        return cls(
+            int(max_tokens),
+            policy=str(config.get("budget_policy") or TRUNCATE_HEAD).strip(),
+            keep_chars=int(keep_chars) if keep_chars is not None and str(keep_chars).strip() else DEFAULT_KEEP_CHARS,
+            summary_prompt=config.get("budget_summary_prompt") or DEFAULT_SUMMARY_PROMPT,
+            model=str(config.get("model", "")),
+            tokenizer=str(config.get("tokenizer") or "auto").strip(),
+        )
+
+    def fit(self, parts: List[Tuple[str, str]], extra_text: str = "",
+            summarizer: Optional[Summarizer] = None) -> Tuple[List[Tuple[str, str]], BudgetReport]:
+        """
+        让渲染结果满足预算
+
+        Args:
+            parts: PromptTemplate.render_parts 返回的 (片段类型, 文本) 列表
+            extra_text: 与提示词拼接的本轮输入文本，计入预算但不压缩
+            summarizer: summarize 策略使用的摘要函数
+
+        Returns:
+            Tuple[List[Tuple[str, str]], BudgetReport]: (压缩后的片段, 预算报告)
+        """
+        count = self.tokenizer.count
+        refs = [i for i, (kind, text) in enumerate(parts) if kind == MEMORY_REF and text]
+        ref_tokens = {i: count(parts[i][1]) for i in refs}
+        fixed = count("".join(text for kind, text in parts if kind != MEMORY_REF or not text)) + count(extra_text)
+        original = fixed + sum(ref_tokens.values())
+        if original <= self.max_tokens:
+            return parts, BudgetReport(original, original, self.policy, False)
+
+        available = self.max_tokens - fixed
+        if available <= 0:
+            logger.warning(f"提示词固定部分已有 {fixed} tokens，超出预算 {self.max_tokens}，历史引用全部省略")
+
+        # 额度分配：从短到长，每个引用最多分到剩余额度的平均值
+        allowance: Dict[int, int] = {}
+        remaining = max(0, available)
+        ordered = sorted(refs, key=lambda i: ref_tokens[i])
+        for n, i in enumerate(ordered):
+            share = min(ref_tokens[i], remaining // (len(ordered) - n))
+            allowance[i] = share
+            remaining -= share
+
+        fitted = list(parts)
+        for i in refs:
+            if ref_tokens[i] > allowance[i]:
+                fitted[i] = (MEMORY_REF, self._shrink(parts[i][1], allowance[i], summarizer))
+        tokens = fixed + sum(count(fitted[i][1]) for i in refs)
+        return fitted, BudgetReport(tokens, original, self.policy, True)
+
+    def _shrink(self, text: str, max_tokens: int, summarizer: Optional[Summarizer]) -> str:
+        """按策略把一个引用压缩到 max_tokens 以内"""
+        keep = self.tokenizer.keep
+        if max_tokens <= 0:
+            return ""
+        if self.policy == TRUNCATE_TAIL:
+            return keep(text, max_tokens, tail=False)
+        if self.policy == KEEP_LAST:
+            return keep(text[-self.keep_chars:], max_tokens, tail=True)
+        if self.policy == SUMMARIZE:
+            summary = self._summarize(text, max_tokens, summarizer)
+            if summary is not None:
+                # 摘要仍可能超出额度，超出部分去掉结尾
+                return keep(summary, max_tokens, tail=False)
+        return keep(text, max_tokens, tail=True)
+
+    def _summarize(self, text: str, max_tokens: int, summarizer: Optional[Summarizer]) -> Optional[str]:
+        """生成摘要（带缓存），失败时返回None"""
+        if summarizer is None:
+            logger.warning("未提供摘要函数，改为截断开头")
+            return None
+        key = (self.model + "\0" + self.summary_prompt, hashlib.sha256(text.encode("utf-8")).hexdigest(), max_tokens)
+        with _summaries_lock:
+            if key in _summaries:
+                _summaries.move_to_end(key)
+                return _summaries[key]
+        prompt = self.summary_prompt.replace("{max_tokens}", str(max_tokens)).replace("{text}", text)
+        try:
+            summary = summarizer(prompt, max_tokens)
+        except Exception as e:
+            logger.warning(f"摘要失败，改为截断开头: {e}")
+            return None
+        if not summary:
+            logger.warning("摘要为空，改为截断开头")
+            return None
+        with _summaries_lock:
+            _summaries[key] = summary
+            if len(_summaries) > _SUMMARY_CACHE_SIZE:
+                _summaries.popitem(last=False)
+        return summary
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""
+服务模块 - 以HTTP接口提供流水线运行，包含任务队列与背压控制；以及消费持久化工作队列的工作进程
+"""
+from .job_manager import JobManager, Job, QueueFullError, UnknownWorkflowError, InvalidInputError
+from .http_server import PipelineHTTPServer, serve
+from .queue_worker import QueueWorker
+
+__all__ = [
+    'JobManager',
+    'Job',
+    'QueueFullError',
+    'UnknownWorkflowError',
+    'InvalidInputError',
+    'PipelineHTTPServer',
+    'serve',
+    'QueueWorker',
+]
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+HTTP服务模块
+以HTTP接口提供流水线运行：提交、查询或流式获取状态、下载输出文件
+
+接口：
+- POST /runs                       提交运行，请求体 {"workflow": 名称, "input": 输入字典, "parallel": bool, "stream": bool}
+                                   返回 202 与任务概要；排队已满返回 429，工作流不存在返回 404
+- GET  /runs/{id}                  任务状态与各轮文本结果、输出文件列表
+- GET  /runs/{id}/events           以 NDJSON 流式推送事件（status/round/chunk），任务结束后关闭连接
+- GET  /runs/{id}/artifacts/{path} 下载输出文件
+- GET  /workflows                  各工作流的排队与并发状态
+- GET  /health                     健康检查
+- GET  /metrics                    Prometheus 指标（启用指标时）
+"""
+
+import json
+import mimetypes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit, unquote
+from service.job_manager import (
+    JobManager, QueueFullError, UnknownWorkflowError, InvalidInputError
+)
+from utils.log_config import get_logger
+from utils.metrics import PrometheusExporter
+
+# 请求体上限（含base64媒体）
+DEFAULT_MAX_BODY_BYTES = 64 * 1024 * 1024
+# 排队已满时建议客户端重试的间隔（秒）
+RETRY_AFTER_SECONDS = 1
+# 读取文件时的块大小
+_FILE_CHUNK = 1024 * 1024
+
+class PipelineHTTPServer(ThreadingHTTPServer):
+    """流水线HTTP服务，每个连接一个线程，运行由 JobManager 的执行线程完成"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], job_manager: JobManager,
+                 exporter: Optional[PrometheusExporter] = None, max_body_bytes: int = DEFAULT_MAX_BODY_BYTES):
+        """
+        Args:
+            address: 监听地址 (host, port)
+            job_manager: 任务管理器
+            exporter: 可选的Prometheus导出器，提供时开放 /metrics
+            max_body_bytes: 请求体上限（字节）
+        """
+        super().__init__(address, PipelineRequestHandler)
+        self.job_manager = job_manager
+        self.exporter = exporter
+        self.max_body_bytes = max_body_bytes
+        self.logger = get_logger('service.http_server')
+
+class PipelineRequestHandler(BaseHTTPRequestHandler):
+    """请求处理器"""
+
+    server: PipelineHTTPServer
+    server_version = "PipelineService/1.0"
+
+    def log_message(self, format: str, *args):
+        """访问日志写入项目日志系统"""
+        self.server.logger.debug(f"{self.address_string()} - {format % args}")
+
+    def do_GET(self):
+        parts = self._path_parts()
+        if parts == ["health"]:
+            self._send_json(200, {"status": "ok", **self.server.job_manager.stats()})
+        elif parts == ["workflows"]:
+            self._send_json(200, self.server.job_manager.stats()["workflows"])
+        elif parts == ["metrics"]:
+            self._send_metrics()
+        elif len(parts) == 2 and parts[0] == "runs":
+            job = self._get_job(parts[1])
+            if job is not None:
+                self._send_json(200, job.to_dict())
+        elif len(parts) == 3 and parts[0] == "runs" and parts[2] == "events":
+            job = self._get_job(parts[1])
+            if job is not None:
+                self._stream_events(job)
+        elif len(parts) >= 4 and parts[0] == "runs" and parts[2] == "artifacts":
+            job = self._get_job(parts[1])
+            if job is not None:
+                self._send_artifact(job, "/".join(parts[3:]))
+        else:
+            self._send_error(404, "接口不存在")
+
+    def do_POST(self):
+        if self._path_parts() != ["runs"]:
+            self._send_error(404, "接口不存在")
+            return
+        body = self._read_json()
+        if body is None:
+            return
+        try:
+            job = self.server.job_manager.submit(
+                body.get("workflow", "default"),
+                body.get("input"),
+                parallel=bool(body.get("parallel", False)),
+                stream=bool(body.get("stream", False)),
+            )
+        except UnknownWorkflowError as e:
+            self._send_error(404, f"工作流不存在: {e}")
+            return
+        except InvalidInputError as e:
+            self._send_error(400, str(e))
+            return
+        except QueueFullError as e:
+            self._send_error(429, str(e), {"Retry-After": str(RETRY_AFTER_SECONDS)})
+            return
+        self._send_json(202, {"id": job.id, "status": job.status, "workflow": job.workflow},
+                        {"Location": f"/runs/{job.id}"})
+
+    def _path_parts(self) -> list:
+        """路径分段（去掉查询串与首尾斜杠）"""
+        path = urlsplit(self.path).path
+        return [unquote(p) for p in path.strip("/").split("/") if p]
+
+    def _read_json(self) -> Optional[Dict[str, Any]]:
+        """读取JSON请求体，失败时已发送错误响应并返回None"""
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send_error(400, "Content-Length 不合法")
+            return None
+        if length > self.server.max_body_bytes:
+            self._send_error(413, f"请求体超过上限 {self.server.max_body_bytes} 字节")
+            return None
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self._send_error(400, f"JSON解析失败: {e}")
+            return None
+        if not isinstance(body, dict):
+            self._send_error(400, "请求体必须是JSON对象")
+            return None
+        return body
+
+    def _get_job(self, job_id: str):
+        """查找任务，不存在时发送404"""
+        job = self.server.job_manager.get(job_id)
+        if job is None:
+            self._send_error(404, "任务不存在")
+        return job
+
+    def _stream_events(self, job):
+        """以 NDJSON 逐行推送事件，直到任务结束（HTTP/1.0，关闭连接即结束）"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        sent = 0
+        try:
+            while True:
+                events, finished = job.wait_events(sent)
+                for event in events:
+                    self.wfile.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+                sent += len(events)
+                self.wfile.flush()
+                if finished:
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端断开，不影响任务执行
+            return
+
+    def _send_artifact(self, job, relative_path: str):
+        """发送任务输出文件，只允许访问任务自己的输出目录"""
+        if not job.output_dir:
+            self._send_error(404, "任务还没有输出")
+            return
+        root = Path(job.output_dir).resolve()
+        target = (root / relative_path).resolve()
+        if root not in target.parents or not target.is_file():
+            self._send_error(404, "文件不存在")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", mimetypes.guess_type(target.name)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(target.stat().st_size))
+        self.end_headers()
+        try:
+            with open(target, "rb") as f:
+                while True:
+                    chunk = f.read(_FILE_CHUNK)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def _send_metrics(self):
+        """Prometheus 指标"""
+        if self.server.exporter is None:
+            self._send_error(404, "未启用指标")
+            return
+        body = self.server.exporter.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", PrometheusExporter.CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        """发送JSON响应"""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        """发送JSON格式的错误响应"""
+        self._send_json(status, {"error": message}, headers)
+
+def serve(job_manager: JobManager, host: str = "127.0.0.1", port: int = 8080,
+          exporter: Optional[PrometheusExporter] = None, max_body_bytes: int = DEFAULT_MAX_BODY_BYTES):
+    """
+    启动服务并阻塞，Ctrl+C 后停止接收任务并等待执行中的任务结束
+
+    Args:
+        job_manager: 任务管理器
+        host: 监听地址
+        port: 监听端口
+        exporter: 可选的Prometheus导出器
+        max_body_bytes: 请求体上限（字节）
+    """
+    logger = get_logger('service.http_server')
+    server = PipelineHTTPServer((host, port), job_manager, exporter, max_body_bytes)
+    logger.info(f"🌐 流水线服务已启动: http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("收到中断信号，正在停止服务...")
+    finally:
+        server.server_close()
+        job_manager.close()
+        logger.info("服务已停止")
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+任务管理模块
+服务模式下的运行队列：有界排队、按工作流限制并发、复用预热的控制器
+"""
+
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Deque, Tuple
+from core.llm_cache import LLMCache
+from core.pipeline_controller import PipelineController
+from core.request_coalescer import RequestCoalescer
+from core.round_cache import RoundCache
+from processors.output_processor import FileOutputProcessor
+from utils.log_config import get_logger
+from utils.metrics import MetricsSink
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+class QueueFullError(Exception):
+    """排队任务已达上限"""
+
+class UnknownWorkflowError(Exception):
+    """工作流不存在"""
+
+class InvalidInputError(Exception):
+    """输入不合法"""
+
+class Job:
+    """单次运行：状态、结果与按顺序追加的事件"""
+
+    def __init__(self, workflow: str, initial_input: Dict[str, Any], parallel: bool = False, stream: bool = False):
+        self.id = uuid.uuid4().hex
+        self.workflow = workflow
+        self.input = initial_input
+        self.parallel = parallel
+        self.stream = stream
+        self.status = QUEUED
+        self.error = ""
+        self.results: List[Dict[str, Any]] = []
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.output_dir: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+        self.emit({"type": "status", "status": QUEUED})
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def emit(self, event: Dict[str, Any]):
+        """追加事件并唤醒等待方"""
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def set_status(self, status: str, error: str = ""):
+        """更新状态并追加状态事件（同一把锁内完成，读取方看到结束状态时一定也能读到该事件）"""
+        event = {"type": "status", "status": status}
+        if error:
+            event["error"] = error
+        with self._cond:
+            self.status = status
+            self.error = error
+            now = time.time()
+            if status == RUNNING:
+                self.started_at = now
+            elif status in FINISHED_STATES:
+                self.finished_at = now
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def wait_events(self, start: int, timeout: float = 15.0) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        获取从 start 开始的事件，没有新事件且任务未结束时最多等待 timeout 秒
+
+        Args:
+            start: 已读取的事件数
+            timeout: 最长等待秒数
+
+        Returns:
+            Tuple[List[Dict[str, Any]], bool]: (新事件，可能为空, 任务是否已结束且事件已全部返回)
+        """
+        with self._cond:
+            if len(self.events) <= start and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[start:], self.finished
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务概要，结果中只保留文本与媒体标记"""
+        return {
+            "id": self.id,
+            "workflow": self.workflow,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "results": [summarize_result(r) for r in self.results],
+            "artifacts": self.list_artifacts(),
+        }
+
+    def list_artifacts(self) -> List[str]:
+        """已保存的输出文件（相对任务输出目录的路径）"""
+        if not self.output_dir or not os.path.isdir(self.output_dir):
+            return []
+        root = Path(self.output_dir)
+        return sorted(str(p.relative_to(root)) for p in root.rglob("*") if p.is_file())
+
+def summarize_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """单轮结果的概要（不含媒体数据）"""
+    output = result.get("output", {})
+    summary = {
+        "round": result.get("round"),
+        "config": result.get("config"),
+        "status": result.get("status"),
+        "text": output.get("text", ""),
+        "has_image": bool(output.get("image")),
+        "has_video": bool(output.get("video")),
+    }
+    if "images" in output:
+        summary["image_count"] = len(output["images"])
+    return summary
+
+class _Workflow:
+    """工作流：配置文件、并发上限与预热的控制器池"""
+
+    def __init__(self, name: str, config_file: str, max_concurrency: int):
+        self.name = name
+        self.config_file = config_file
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.pending: Deque[Job] = deque()
+        self.running = 0
+        self.controllers: "queue.Queue[PipelineController]" = queue.Queue()
+        self.completed = 0
+        self.failed = 0
+
+class JobManager:
+    """
+    服务模式的任务管理器，线程安全
+
+    - 所有工作流共享 workers 个执行线程，排队任务总数超过 max_queue 时拒绝提交
+    - 每个工作流同时执行的任务数不超过其并发上限，执行线程轮流从各工作流取任务
+    - 控制器按工作流缓存复用（提示词模板已编译、LLM实例已创建），模型客户端由注册表共享
+    """
+
+    def __init__(self, workflows: Dict[str, str], output_dir: str = "outputs/service", workers: int = 4,
+                 max_queue: int = 64, max_per_workflow: Optional[int] = None,
+                 workflow_limits: Optional[Dict[str, int]] = None, cache: Optional[LLMCache] = None,
+                 coalescer: Optional[RequestCoalescer] = None, metrics_sink: Optional[MetricsSink] = None,
+                 memory_budget: Optional[int] = None, allow_file_inputs: bool = False, max_jobs: int = 1000,
+                 round_cache: Optional[RoundCache] = None):
+        """
+        Args:
+            workflows: 工作流名称 -> 配置文件路径
+            output_dir: 任务输出根目录，每个任务一个子目录
+            workers: 执行线程数（全部工作流共享）
+            max_queue: 排队任务上限，超过时 submit 抛出 QueueFullError
+            max_per_workflow: 每个工作流默认的并发上限，默认等于 workers
+            workflow_limits: 指定工作流的并发上限，优先于 max_per_workflow
+            cache: 可选的LLM响应缓存
+            coalescer: 可选的请求合并器
+            metrics_sink: 可选的指标接收器
+            memory_budget: 可选的单次运行媒体内存预算（字节）
+            allow_file_inputs: 是否允许输入中的媒体使用服务器本地文件路径
+            max_jobs: 保留的任务记录上限，超过时淘汰最早结束的任务
+            round_cache: 可选的轮次结果缓存
+        """
+        if not workflows:
+            raise ValueError("至少需要一个工作流")
+        self.logger = get_logger('service.job_manager')
+        self.output_dir = output_dir
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.cache = cache
+        self.coalescer = coalescer
+        self.metrics_sink = metrics_sink
+        self.memory_budget = memory_budget
+        self.round_cache = round_cache
+        self.allow_file_inputs = allow_file_inputs
+        self.max_jobs = max(1, int(max_jobs))
+        self.output_processor = FileOutputProcessor()
+
+        limits = workflow_limits or {}
+        default_limit = max_per_workflow or self.workers
+        self.workflows: Dict[str, _Workflow] = {
+            name: _Workflow(name, path, limits.get(name, default_limit)) for name, path in workflows.items()
+        }
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queued = 0
+        self._rotation = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # 预热：每个工作流先创建一个控制器，配置错误在启动时暴露
+        for workflow in self.workflows.values():
+            workflow.controllers.put(self._create_controller(workflow))
+            self.logger.info(f"🔥 工作流已加载: {workflow.name} -> {workflow.config_file} (并发上限 {workflow.max_concurrency})")
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, workflow: str, initial_input: Dict[str, Any], parallel: bool = False, stream: bool = False) -> Job:
+        """
+        提交一次运行
+
+        Args:
+            workflow: 工作流名称
+            initial_input: 与 execute_pipeline 相同格式的输入字典
+            parallel: 是否按依赖图并行执行轮次
+            stream: 是否以流式接口调用模型，文本片段作为 chunk 事件推送
+
+        Returns:
+            Job: 已排队的任务
+
+        Raises:
+            UnknownWorkflowError: 工作流不存在
+            InvalidInputError: 输入不合法
+            QueueFullError: 排队任务已达上限
+        """
+        if workflow not in self.workflows:
+            raise UnknownWorkflowError(workflow)
+        self._validate_input(initial_input)
+        job = Job(workflow, initial_input, parallel, stream)
+        with self._cond:
+            if self._closed:
+                raise QueueFullError("服务正在关闭")
+            if self._queued >= self.max_queue:
+                raise QueueFullError(f"排队任务已达上限 {self.max_queue}")
+            self.workflows[workflow].pending.append(job)
+            self._queued += 1
+            self._jobs[job.id] = job
+            self._evict_jobs()
+            self._cond.notify()
+        self.logger.info(f"📥 任务已排队: {job.id} ({workflow})")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """按ID查找任务"""
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """队列与各工作流的状态"""
+        with self._cond:
+            return {
+                "queued": self._queued,
+                "max_queue": self.max_queue,
+                "workers": self.workers,
+                "workflows": {
+                    name: {
+                        "queued": len(w.pending),
+                        "running": w.running,
+                        "max_concurrency": w.max_concurrency,
+                        "completed": w.completed,
+                        "failed": w.failed,
+                    }
+                    for name, w in self.workflows.items()
+                },
+            }
+
+    def close(self, wait: bool = True):
+        """停止接收任务，取消排队中的任务；wait 为True时等待执行中的任务结束"""
+        with self._cond:
+            self._closed = True
+            cancelled = []
+            for workflow in self.workflows.values():
+                cancelled.extend(workflow.pending)
+                workflow.pending.clear()
+            self._queued = 0
+            self._cond.notify_all()
+        for job in cancelled:
+            job.set_status(CANCELLED, "服务关闭")
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _validate_input(self, initial_input: Any):
+        """检查输入格式；默认不允许通过服务读取服务器本地文件"""
+        if not isinstance(initial_input, dict):
+            raise InvalidInputError("input 必须是JSON对象")
+        if self.allow_file_inputs:
+            return
+        for key in ("image", "video"):
+            value = initial_input.get(key)
+            values = value if isinstance(value, list) else [value]
+            for item in values:
+                if isinstance(item, str) and item and not item.startswith("data:") and len(item) < 4096 \
+                        and os.path.exists(item):
+                    raise InvalidInputError(f"{key} 不允许使用服务器本地文件路径")
+
+    def _evict_jobs(self):
+        """任务记录超过上限时淘汰最早结束的任务（调用方需持有锁）"""
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in [jid for jid, job in self._jobs.items() if job.finished]:
+            if len(self._jobs) <= self.max_jobs:
+                break
+            del self._jobs[job_id]
+
+    def _next_job(self) -> Optional[Job]:
+        """取下一个可执行的任务：轮流检查各工作流，跳过已达并发上限的工作流"""
+        names = list(self.workflows)
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                for offset in range(len(names)):
+                    workflow = self.workflows[names[(self._rotation + offset) % len(names)]]
+                    if workflow.pending and workflow.running < workflow.max_concurrency:
+                        self._rotation = (self._rotation + offset + 1) % len(names)
+                        workflow.running += 1
+                        self._queued -= 1
+                        return workflow.pending.popleft()
+                self._cond.wait()
+
+    def _worker(self):
+        """执行线程"""
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            workflow = self.workflows[job.workflow]
+            try:
+                self._run_job(job, workflow)
+            except Exception as e:
+                # 单个任务的意外错误不能让执行线程退出，否则线程池会逐渐缩小
+                self.logger.error(f"任务执行线程异常 {job.id}: {e}")
+                if not job.finished:
+                    job.set_status(FAILED, str(e))
+            finally:
+                with self._cond:
+                    workflow.running -= 1
+                    if job.status == SUCCEEDED:
+                        workflow.completed += 1
+                    else:
+                        workflow.failed += 1
+                    self._cond.notify_all()
+
+    def _run_job(self, job: Job, workflow: _Workflow):
+        """在执行线程中运行一个任务并保存输出"""
+        job.set_status(RUNNING)
+        controller = None
+        try:
+            # 池中没有空闲控制器时按配置文件新建，配置文件被删除或改坏时在这里失败
+            controller = self._acquire_controller(workflow)
+            on_chunk = None
+            if job.stream:
+                def on_chunk(round_index: int, section_name: str, text: str):
+                    job.emit({"type": "chunk", "round": round_index, "config": section_name, "text": text})
+
+            def on_round(result: Dict[str, Any]):
+                job.emit({"type": "round", **summarize_result(result)})
+
+            results = controller.execute_pipeline(job.input, parallel=job.parallel, on_chunk=on_chunk,
+                                                  on_round=on_round, run_id=job.id)
+            error_occurred, error_message = controller.error_occurred, controller.error_message
+        except Exception as e:
+            self.logger.error(f"任务执行异常 {job.id}: {e}")
+            job.set_status(FAILED, str(e))
+            return
+        finally:
+            if controller is not None:
+                workflow.controllers.put(controller)
+
+        job.results = results
+        if results:
+            job.output_dir = os.path.join(self.output_dir, job.id)
+            try:
+                self.output_processor.process(results, output_dir=self.output_dir, filename=job.id, save_mode="filename")
+            except Exception as e:
+                self.logger.error(f"任务输出保存失败 {job.id}: {e}")
+        if error_occurred:
+            job.set_status(FAILED, error_message)
+        else:
+            job.set_status(SUCCEEDED)
+        self.logger.info(f"📤 任务结束: {job.id} ({job.status})")
+
+    def _acquire_controller(self, workflow: _Workflow) -> PipelineController:
+        """取出空闲控制器；并发数不超过工作流上限，因此池为空时直接新建"""
+        try:
+            return workflow.controllers.get_nowait()
+        except queue.Empty:
+            return self._create_controller(workflow)
+
+    def _create_controller(self, workflow: _Workflow) -> PipelineController:
+        """创建控制器，共享缓存、请求合并器与指标接收器"""
+        return PipelineController(workflow.config_file, cache=self.cache, coalescer=self.coalescer,
+                                  metrics_sink=self.metrics_sink, memory_budget=self.memory_budget,
+                                  round_cache=self.round_cache)
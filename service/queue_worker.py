@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+队列工作进程模块
+从持久化工作队列领取记录、执行流水线并回报结果；执行期间定期续约，
+进程崩溃或失联时租约过期，记录由其他工作进程重新领取
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, Future
+from typing import Dict, Any, Optional
+from core.batch_runner import BatchRunner
+from core.work_queue import WorkQueue, default_worker_id
+from service.job_manager import summarize_result
+from utils.log_config import get_logger
+
+class QueueWorker:
+    """
+    队列工作进程：以有限并发领取并执行记录
+
+    执行、控制器复用与输出保存交给 BatchRunner，这里只负责领取、续约与回报。
+    同一个队列可由任意数量的工作进程（同一台或多台主机）共同消费
+    """
+
+    def __init__(self, work_queue: WorkQueue, runner: BatchRunner, worker_id: Optional[str] = None,
+                 job: Optional[str] = None, poll_interval: float = 1.0, exit_when_empty: bool = False):
+        """
+        Args:
+            work_queue: 工作队列
+            runner: 批量运行器，并发数即同时执行的记录数
+            worker_id: 工作进程ID，默认主机名与进程号
+            job: 只处理指定任务的记录，None表示全部
+            poll_interval: 队列为空时的轮询间隔（秒）
+            exit_when_empty: 队列中没有排队或执行中的记录时退出
+        """
+        self.queue = work_queue
+        self.runner = runner
+        self.worker_id = worker_id or default_worker_id()
+        self.job = job
+        self.concurrency = runner.concurrency
+        self.poll_interval = poll_interval
+        self.exit_when_empty = exit_when_empty
+        self.heartbeat_interval = max(0.1, work_queue.lease_seconds / 3)
+        self.logger = get_logger('service.queue_worker')
+
+        self._stop = threading.Event()
+        # 执行中的记录全部回报后置位，续约线程随之退出
+        self._closed = threading.Event()
+        self._inflight: Dict[Future, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"done": 0, "failed": 0, "lost": 0}
+
+    def stop(self):
+        """停止领取新记录，执行中的记录完成并回报后 run() 返回"""
+        self._stop.set()
+
+    def run(self) -> Dict[str, int]:
+        """
+        领取并执行记录，直到调用 stop() 或（exit_when_empty 时）队列清空
+
+        Returns:
+            Dict[str, int]: done、failed、lost（租约被其他工作进程接管、结果未被采纳）
+        """
+        self.logger.info(f"👷 工作进程 {self.worker_id} 启动 (并发: {self.concurrency}, 租约: {self.queue.lease_seconds}s)")
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name=f"heartbeat-{self.worker_id}", daemon=True)
+        heartbeat.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                try:
+                    self._poll_loop(executor)
+                except KeyboardInterrupt:
+                    self.logger.info("收到中断信号，等待执行中的记录完成...")
+                    self._stop.set()
+                self._drain()
+        finally:
+            self._stop.set()
+            self._closed.set()
+            heartbeat.join()
+            if self.runner.output_writer is not None:
+                self.runner.output_writer.flush()
+        self.logger.info(f"👋 工作进程 {self.worker_id} 退出: 完成{self.stats['done']}条，"
+                         f"失败{self.stats['failed']}条，租约丢失{self.stats['lost']}条")
+        return self.stats
+
+    def _poll_loop(self, executor: ThreadPoolExecutor):
+        """领取记录直到停止"""
+        while not self._stop.is_set():
+            free = self.concurrency - len(self._inflight)
+            if free > 0:
+                for task in self.queue.lease(self.worker_id, free, self.job):
+                    self.logger.info(f"📦 领取记录 {task['filename']} (第{task['attempts']}次尝试)")
+                    future = executor.submit(self.runner.execute_record, task["record"])
+                    with self._lock:
+                        self._inflight[future] = task
+
+            if not self._inflight:
+                # 其他工作进程持有的租约可能过期后重新投递，因此执行中的记录也算未清空
+                if self.exit_when_empty and self.queue.is_drained(self.job):
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+            done, _ = wait(list(self._inflight), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+            self._report(done)
+
+    def _drain(self):
+        """等待执行中的记录完成并回报"""
+        while self._inflight:
+            done, _ = wait(list(self._inflight), return_when=FIRST_COMPLETED)
+            self._report(done)
+
+    def _report(self, done):
+        """回报已完成的记录"""
+        for future in done:
+            with self._lock:
+                task = self._inflight.pop(future)
+            filename = task["filename"]
+            try:
+                record_result = future.result()
+            except Exception as e:
+                self.logger.error(f"记录 {filename} 执行异常: {e}")
+                accepted = self.queue.fail(task["id"], self.worker_id, f"执行异常: {e}")
+                self._count(accepted, "failed", filename)
+                continue
+
+            result = {
+                "worker": self.worker_id,
+                "output_dir": self.runner.output_dir,
+                "rounds": [summarize_result(r) for r in record_result["results"]],
+            }
+            if record_result["error_occurred"]:
+                self.logger.error(f"记录 {filename} 执行失败: {record_result['error_message']}")
+                accepted = self.queue.fail(task["id"], self.worker_id, record_result["error_message"], result)
+                self._count(accepted, "failed", filename)
+            else:
+                accepted = self.queue.complete(task["id"], self.worker_id, result)
+                self._count(accepted, "done", filename)
+
+    def _count(self, accepted: bool, outcome: str, filename: str):
+        """统计回报结果"""
+        if accepted:
+            self.stats[outcome] += 1
+        else:
+            self.stats["lost"] += 1
+            self.logger.warning(f"⚠️ 记录 {filename} 的租约已被其他工作进程接管，本次结果未被采纳")
+
+    def _heartbeat_loop(self):
+        """定期续约执行中的记录"""
+        while not self._closed.wait(self.heartbeat_interval):
+            with self._lock:
+                tasks = {task["id"]: task for task in self._inflight.values()}
+            if not tasks:
+                continue
+            try:
+                owned = set(self.queue.heartbeat(self.worker_id, list(tasks)))
+            except Exception as e:
+                # 续约失败不中断执行，租约过期前的下一次续约会重试
+                self.logger.warning(f"续约失败: {e}")
+                continue
+            for task_id in tasks.keys() - owned:
+                self.logger.warning(f"⚠️ 记录 {tasks[task_id]['filename']} 的租约已丢失")
@@ -0,0 +1,6 @@
+"""pytest 配置：把仓库根目录加入导入路径，测试只使用假模型（provider = fake），不依赖网络与提供商SDK"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
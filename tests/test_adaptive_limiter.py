@@ -0,0 +1,46 @@
+"""自适应并发限制器测试"""
+
+import itertools
+
+from core.adaptive_limiter import AdaptiveConcurrencyLimiter, SUCCESS, THROTTLED, IGNORED
+
+def _run_wave(limiter, latencies):
+    """以当前上限同时发出一批请求，按给定延迟（秒）依次完成"""
+    permits = [limiter.acquire() for _ in range(limiter.limit)]
+    for (start, inflight), latency in zip(permits, latencies):
+        # 把开始时间前移，模拟该请求耗时 latency 秒
+        limiter.release((start - latency, inflight), SUCCESS)
+
+def test_limit_holds_under_mixed_response_lengths():
+    """服务端从不过载、响应长短混合（0.5~8秒）时，上限不应下降"""
+    limiter = AdaptiveConcurrencyLimiter("mixed", initial_limit=4, max_limit=16)
+    latencies = itertools.cycle([0.5, 1, 2, 4, 8])
+    observed = []
+    for _ in range(200):
+        _run_wave(limiter, [next(latencies) for _ in range(limiter.limit)])
+        observed.append(limiter.limit)
+    assert min(observed) >= 4
+    assert limiter.limit == 16
+    assert limiter.throttled == 0
+
+def test_throttle_decreases_once_per_window():
+    limiter = AdaptiveConcurrencyLimiter("throttle", initial_limit=8)
+    permits = [limiter.acquire() for _ in range(8)]
+    # 同一波请求的限流响应只减少一次
+    for permit in permits:
+        limiter.release(permit, THROTTLED)
+    assert limiter.limit == 4
+    assert limiter.throttled == 8
+    assert limiter.inflight == 0
+
+def test_ignored_errors_do_not_change_limit():
+    limiter = AdaptiveConcurrencyLimiter("ignored", initial_limit=4)
+    for _ in range(10):
+        limiter.release(limiter.acquire(), IGNORED)
+    assert limiter.limit == 4
+
+def test_decrease_respects_min_limit():
+    limiter = AdaptiveConcurrencyLimiter("floor", initial_limit=2, min_limit=2)
+    for _ in range(5):
+        limiter.release(limiter.acquire(), THROTTLED)
+    assert limiter.limit == 2
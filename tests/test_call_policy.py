@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import pytest
+
+from core.call_policy import CallPolicy, get_rate_limiter
+from core.fake_chat_model import FakeChatModel
+
+
+def test_rate_limiter_is_shared_and_keeps_strictest_limits():
+    key = ("fake", "test://strictest")
+    first = get_rate_limiter(key, rpm=600, tpm=None)
+    second = get_rate_limiter(key, rpm=60, tpm=1000)
+    third = get_rate_limiter(key, rpm=120, tpm=None)
+
+    assert first is second is third
+    assert (first.rpm, first.tpm) == (60, 1000)
+    assert first.request_bucket.capacity == 60
+    assert first.request_bucket.tokens <= 60
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_timeout_is_enforced_per_attempt(use_async):
+    model = FakeChatModel(latency=0.5)
+    calls = []
+    policy = CallPolicy(max_retries=1, backoff_base=0.0, timeout=0.05)
+
+    def invoke():
+        calls.append(1)
+        return model.invoke([{"role": "user", "content": "hi"}])
+
+    async def ainvoke():
+        calls.append(1)
+        return await model.ainvoke([{"role": "user", "content": "hi"}])
+
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        if use_async:
+            asyncio.run(policy.acall(ainvoke))
+        else:
+            policy.call(invoke)
+    assert len(calls) == 2
+    assert time.perf_counter() - start < 0.4
+
+
+def test_sync_call_within_timeout_returns_result():
+    model = FakeChatModel(latency=0.01, output_chars=5)
+    policy = CallPolicy(timeout=1.0)
+    response = policy.call(lambda: model.invoke([{"role": "user", "content": "hi"}]))
+    assert len(response.text()) == 5
@@ -0,0 +1,54 @@
+import sys
+import types
+
+import pytest
+
+from core.client_registry import ModelClientRegistry
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    recorded = []
+    chat_models = types.ModuleType("langchain.chat_models")
+    chat_models.init_chat_model = lambda name, **kwargs: recorded.append((name, kwargs)) or object()
+    langchain = types.ModuleType("langchain")
+    langchain.chat_models = chat_models
+    monkeypatch.setitem(sys.modules, "langchain", langchain)
+    monkeypatch.setitem(sys.modules, "langchain.chat_models", chat_models)
+    return recorded
+
+
+def _install_genai(monkeypatch, fields):
+    module = types.ModuleType("langchain_google_genai")
+    module.ChatGoogleGenerativeAI = type("ChatGoogleGenerativeAI", (), {"model_fields": dict.fromkeys(fields)})
+    monkeypatch.setitem(sys.modules, "langchain_google_genai", module)
+
+
+@pytest.mark.parametrize("fields, expected", [
+    (["google_api_key", "base_url", "client_options"], {"base_url": "https://proxy.example"}),
+    (["google_api_key", "client_options"], {"client_options": {"api_endpoint": "https://proxy.example"}}),
+])
+def test_gemini_base_url_is_forwarded(monkeypatch, calls, fields, expected):
+    _install_genai(monkeypatch, fields)
+    ModelClientRegistry().get_client("google_genai", "gemini-x", base_url="https://proxy.example", api_key="k")
+    ((name, kwargs),) = calls
+    assert name == "google_genai:gemini-x"
+    assert kwargs == {"google_api_key": "k", **expected}
+
+
+def test_gemini_without_base_url_uses_default_endpoint(monkeypatch, calls):
+    _install_genai(monkeypatch, ["google_api_key"])
+    ModelClientRegistry().get_client("google_genai", "gemini-x", api_key="k")
+    assert calls[0][1] == {"google_api_key": "k"}
+
+
+def test_gemini_base_url_unsupported_is_an_error(monkeypatch, calls):
+    _install_genai(monkeypatch, ["google_api_key"])
+    with pytest.raises(ValueError):
+        ModelClientRegistry().get_client("google_genai", "gemini-x", base_url="https://proxy.example", api_key="k")
+    assert calls == []
+
+
+def test_other_providers_get_base_url(calls):
+    ModelClientRegistry().get_client("openai", "gpt-x", base_url="https://proxy.example", api_key="k")
+    assert calls[0][1] == {"api_key": "k", "base_url": "https://proxy.example"}
@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from service.job_manager import FAILED, SUCCEEDED, JobManager, QueueFullError, UnknownWorkflowError
+
+
+def _write_config(tmp_path, latency=0.0):
+    config = tmp_path / "config.ini"
+    config.write_text(
+        "[gen]\nprovider = fake\nmodel = m\napi_key = x\nbase_url = test://service\n"
+        f"fake_latency = {latency}\nprompt = draw {{topic}}\n",
+        encoding="utf-8",
+    )
+    return str(config)
+
+
+def _wait(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    start = 0
+    while time.monotonic() < deadline:
+        events, finished = job.wait_events(start, timeout=0.5)
+        start += len(events)
+        if finished:
+            return
+    raise AssertionError(f"job {job.id} did not finish")
+
+
+@pytest.fixture
+def manager_factory(tmp_path):
+    managers = []
+
+    def create(**kwargs):
+        manager = JobManager({"wf": kwargs.pop("config")}, output_dir=str(tmp_path / "out"), **kwargs)
+        managers.append(manager)
+        return manager
+
+    yield create
+    for manager in managers:
+        manager.close()
+
+
+def test_job_runs_and_saves_artifacts(tmp_path, manager_factory):
+    manager = manager_factory(config=_write_config(tmp_path), workers=2)
+    job = manager.submit("wf", {"promptVariables": {"topic": "cat"}})
+    _wait(job)
+    assert job.status == SUCCEEDED
+    summary = job.to_dict()
+    assert len(summary["results"]) == 1
+    assert summary["artifacts"]
+    with pytest.raises(UnknownWorkflowError):
+        manager.submit("missing", {})
+
+
+def test_failed_run_reports_its_error(tmp_path, manager_factory):
+    manager = manager_factory(config=_write_config(tmp_path), workers=1)
+    bad = manager.submit("wf", {"promptVariables": 5})
+    good = manager.submit("wf", {"promptVariables": {"topic": "cat"}})
+    _wait(bad)
+    _wait(good)
+    assert bad.status == FAILED and bad.error
+    assert good.status == SUCCEEDED and good.error == ""
+
+
+def test_full_queue_is_rejected(tmp_path, manager_factory):
+    manager = manager_factory(config=_write_config(tmp_path, latency=0.3), workers=1, max_queue=2)
+    running = manager.submit("wf", {"promptVariables": {"topic": "0"}})
+    while manager.stats()["queued"]:
+        time.sleep(0.01)
+    queued = [manager.submit("wf", {"promptVariables": {"topic": str(i)}}) for i in (1, 2)]
+    with pytest.raises(QueueFullError):
+        manager.submit("wf", {"promptVariables": {"topic": "3"}})
+    _wait(running)
+    for job in queued:
+        _wait(job)
+    assert all(job.status == SUCCEEDED for job in [running] + queued)
+
+
+def test_controller_build_failure_fails_the_job_and_keeps_workers(tmp_path, manager_factory):
+    config = _write_config(tmp_path, latency=0.2)
+    manager = manager_factory(config=config, workers=2)
+    # 占用预热的控制器，后续任务只能按配置文件新建控制器
+    busy = manager.submit("wf", {"promptVariables": {"topic": "busy"}})
+    while manager.stats()["queued"]:
+        time.sleep(0.01)
+    (tmp_path / "config.ini").unlink()
+
+    broken = manager.submit("wf", {"promptVariables": {"topic": "x"}})
+    _wait(broken)
+    assert broken.status == FAILED and broken.error
+    _wait(busy)
+    assert busy.status == SUCCEEDED
+
+    # 配置恢复后两个执行线程都还在：两个任务可以同时执行
+    _write_config(tmp_path, latency=0.2)
+    jobs = [manager.submit("wf", {"promptVariables": {"topic": str(i)}}) for i in range(2)]
+    for job in jobs:
+        _wait(job)
+    assert all(job.status == SUCCEEDED for job in jobs)
+    assert all(thread.is_alive() for thread in manager._threads)
+    assert manager.stats()["workflows"]["wf"]["failed"] == 1
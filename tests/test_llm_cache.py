@@ -0,0 +1,40 @@
+from core.llm_cache import LLMCache
+from utils.media_store import MediaHandle
+
+
+def test_memory_tier_is_bounded_by_bytes():
+    cache = LLMCache(max_entries=100, max_bytes=3000)
+    for i in range(5):
+        cache.set(f"k{i}", {"text": "", "image": MediaHandle.from_bytes(bytes([i]) * 1000, "image/png")})
+    stats = cache.stats()
+    assert stats["entries"] == 3
+    assert stats["bytes"] <= 3000
+    assert cache.get("k0") is None
+    assert cache.get("k4")["image"].size == 1000
+
+
+def test_oversized_entry_only_goes_to_disk(tmp_path):
+    cache = LLMCache(db_path=str(tmp_path / "cache.db"), max_bytes=10)
+    handle = MediaHandle.from_bytes(b"\x89PNG" + b"x" * 100, "image/png")
+    cache.set("k", {"text": "hello", "image": [handle, handle]})
+    assert cache.stats()["entries"] == 0
+
+    value = cache.get("k")
+    assert value["text"] == "hello"
+    assert [h.sha256 for h in value["image"]] == [handle.sha256, handle.sha256]
+    assert bytes(value["image"][0].data) == bytes(handle.data)
+    assert cache.stats()["disk_hits"] == 1
+    cache.close()
+
+
+def test_persisted_entries_survive_reopen(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = LLMCache(db_path=path)
+    cache.set("k", {"text": "a", "image": "", "video": ""})
+    cache.close()
+
+    reopened = LLMCache(db_path=path)
+    assert reopened.get("k") == {"text": "a", "image": "", "video": ""}
+    assert reopened.get("missing") is None
+    assert reopened.stats()["misses"] == 1
+    reopened.close()
@@ -0,0 +1,73 @@
+"""媒体存储的base64分类、规范化与解码测试"""
+
+import base64
+import hashlib
+import os
+
+import pytest
+
+from utils import media_store
+from utils.media_store import (
+    MediaStore, classify_media_input, normalize_and_hash_base64, decode_and_hash_base64,
+    MEDIA_BASE64, MEDIA_DATA_URL, MEDIA_PATH, MEDIA_UNKNOWN,
+)
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 40
+
+def _wrap(text: str, width: int = 76) -> str:
+    """按固定宽度换行，模拟带换行的base64"""
+    return "\n".join(text[i:i + width] for i in range(0, len(text), width))
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """缩小分块大小，让块边界落在载荷中间"""
+    monkeypatch.setattr(media_store, "_NORMALIZE_CHUNK", 64)
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_to_handle_decodes_once_and_reuses_digest(request, chunked):
+    if chunked:
+        request.getfixturevalue("small_chunks")
+    store = MediaStore()
+    encoded = base64.b64encode(PNG).decode("ascii")
+    for value in (encoded, _wrap(encoded), f"data:image/png;base64,{_wrap(encoded)}"):
+        handle = store.to_handle(value, "image")
+        assert handle is not None
+        assert handle.data == PNG
+        assert handle.sha256 == hashlib.sha256(PNG).hexdigest()
+        assert handle.mime == "image/png"
+
+def test_short_base64_with_whitespace_is_not_treated_as_path():
+    encoded = _wrap(base64.b64encode(b"hello world!").decode("ascii"), 8)
+    assert classify_media_input(encoded) == MEDIA_BASE64
+    assert MediaStore().to_handle(encoded).data == b"hello world!"
+
+@pytest.mark.parametrize("value", ["YWI===", "YW=I", "YWI", "YQ==YQ==", "data:image/png,abc"])
+def test_invalid_input_is_rejected_consistently(value):
+    assert normalize_and_hash_base64(value) is None
+    assert decode_and_hash_base64(value) is None
+    assert MediaStore().to_handle(value) is None
+
+def test_padding_in_the_middle_is_rejected_across_chunks(small_chunks):
+    first = base64.b64encode(b"x" * 47).decode("ascii")  # 64 字符，以 = 结尾
+    value = first + base64.b64encode(b"y" * 48).decode("ascii")
+    assert normalize_and_hash_base64(value) is None
+    assert decode_and_hash_base64(_wrap(value)) is None
+
+def test_normalize_returns_input_unchanged_without_whitespace():
+    encoded = base64.b64encode(PNG).decode("ascii")
+    cleaned, digest = normalize_and_hash_base64(encoded)
+    assert cleaned is encoded
+    assert digest == hashlib.sha256(PNG).hexdigest()
+    assert normalize_and_hash_base64(_wrap(encoded))[0] == encoded
+
+def test_classify(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(PNG)
+    assert classify_media_input(str(path)) == MEDIA_PATH
+    assert classify_media_input("data:image/png;base64,AAAA") == MEDIA_DATA_URL
+    assert classify_media_input("A" * 8192) == MEDIA_BASE64
+    assert classify_media_input("A" * 4096 + "!" * 4096) == MEDIA_UNKNOWN
+    mapped = MediaStore().to_handle(str(path)).data
+    assert mapped[:] == PNG
+    mapped.close()
+    assert MediaStore().to_handle(os.path.join(str(tmp_path), "missing.png")) is None
@@ -0,0 +1,60 @@
+import pytest
+
+from core.pipeline_controller import PipelineController
+from processors.output_writer import OutputWriter
+from utils.metrics import InMemoryAggregator, MetricsSink
+
+
+def test_metrics_sink_requires_emit():
+    with pytest.raises(TypeError):
+        MetricsSink()
+
+    class Incomplete(MetricsSink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+class _Collect(MetricsSink):
+    def __init__(self):
+        self.spans = []
+
+    def emit(self, span):
+        self.spans.append(span)
+
+
+def _controller(tmp_path, sink):
+    config = tmp_path / "config.ini"
+    config.write_text(
+        "[gen]\nprovider = fake\nmodel = m\napi_key = x\nbase_url = test://metrics\nprompt = hi {topic}\n",
+        encoding="utf-8",
+    )
+    return PipelineController(str(config), metrics_sink=sink)
+
+
+def test_output_write_times_the_round_callback(tmp_path):
+    sink = _Collect()
+    controller = _controller(tmp_path, sink)
+    writer = OutputWriter(str(tmp_path / "out"))
+    try:
+        controller.execute_pipeline({"promptVariables": {"topic": "x"}}, on_round=writer.round_callback("rec"))
+        writer.flush()
+    finally:
+        writer.close()
+    (span,) = sink.spans
+    assert "memory_store" in span.phases
+    assert "output_write" in span.phases
+    assert (tmp_path / "out" / "summary.jsonl").exists()
+
+
+def test_no_output_write_phase_without_callback(tmp_path):
+    sink = _Collect()
+    _controller(tmp_path, sink).execute_pipeline({"promptVariables": {"topic": "x"}})
+    (span,) = sink.spans
+    assert "memory_store" in span.phases
+    assert "output_write" not in span.phases
+
+
+def test_aggregator_is_a_sink():
+    assert isinstance(InMemoryAggregator(), MetricsSink)
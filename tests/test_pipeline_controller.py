@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from core.pipeline_controller import PipelineController
+
+
+@pytest.fixture
+def controller(tmp_path):
+    config = tmp_path / "config.ini"
+    config.write_text(
+        "[gen]\nprovider = fake\nmodel = m\napi_key = x\nbase_url = test://controller\n"
+        "fake_latency = 0.01\nprompt = hi {topic}\n",
+        encoding="utf-8",
+    )
+    return PipelineController(str(config))
+
+
+# promptVariables 不是字典时，运行以严重错误结束
+GOOD = {"promptVariables": {"topic": "x"}}
+BAD_INT = {"promptVariables": 5}
+BAD_LIST = {"promptVariables": ["x"]}
+
+
+def test_async_run_resets_error_state(controller):
+    asyncio.run(controller.execute_pipeline_async(BAD_INT))
+    assert controller.error_occurred
+    assert "int" in controller.error_message
+
+    results = asyncio.run(controller.execute_pipeline_async(GOOD))
+    assert len(results) == 1
+    assert not controller.error_occurred
+    assert controller.error_message == ""
+
+
+def test_stream_done_event_carries_its_own_error(controller):
+    async def done_event(initial_input):
+        async for event in controller.astream_pipeline(initial_input):
+            if event["type"] == "done":
+                return event
+
+    async def main():
+        return await asyncio.gather(done_event(BAD_INT), done_event(GOOD), done_event(BAD_LIST))
+
+    bad_int, good, bad_list = asyncio.run(main())
+    assert "int" in bad_int["error"] and "list" not in bad_int["error"]
+    assert "list" in bad_list["error"] and "int" not in bad_list["error"]
+    assert good["error"] == "" and len(good["results"]) == 1
+
+
+def test_sync_run_still_reports_error_on_controller(controller):
+    controller.execute_pipeline(BAD_INT)
+    assert controller.error_occurred
+    controller.execute_pipeline(GOOD)
+    assert not controller.error_occurred
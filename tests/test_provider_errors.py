@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from core.checkpoint_store import CheckpointStore
+from core.llm_cache import LLMCache
+from core.pipeline_controller import PipelineController
+from core.round_cache import RoundCache
+
+
+class _Throttled(Exception):
+    status_code = 429
+
+
+class AlwaysThrottled:
+    """每次调用都返回429的模型"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def _fail(self):
+        self.calls += 1
+        raise _Throttled("429 Too Many Requests")
+
+    def invoke(self, messages, *args, **kwargs):
+        self._fail()
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        self._fail()
+
+    def stream(self, messages, *args, **kwargs):
+        self._fail()
+        yield
+
+    async def astream(self, messages, *args, **kwargs):
+        self._fail()
+        yield
+
+
+@pytest.fixture
+def setup(tmp_path):
+    config = tmp_path / "config.ini"
+    section = ("provider = fake\nmodel = m\napi_key = x\nbase_url = test://errors\n"
+               "max_retries = 1\nretry_backoff = 0.001\n")
+    config.write_text(f"[first]\n{section}prompt = draw {{topic}}\n\n[second]\n{section}prompt = again {{text1}}\n",
+                      encoding="utf-8")
+    checkpoints = CheckpointStore(str(tmp_path / "checkpoints"))
+    rounds = RoundCache(str(tmp_path / "rounds"))
+    cache = LLMCache()
+    controller = PipelineController(str(config), cache=cache, checkpoint_store=checkpoints, round_cache=rounds)
+    llm = controller._get_llm_instance(controller.pipeline_configs[0])
+    model = AlwaysThrottled()
+    original, llm.model = llm.model, model
+    return controller, llm, model, original, tmp_path
+
+
+def _stored_files(root):
+    return [p for p in root.rglob("*") if p.is_file()]
+
+
+@pytest.mark.parametrize("mode", ["sync", "async", "stream", "astream"])
+def test_persistent_provider_error_stops_the_run(setup, mode):
+    controller, llm, model, original, tmp_path = setup
+    initial = {"promptVariables": {"topic": "cat"}, "run_id": "r"}
+    chunks = []
+    on_chunk = (lambda i, name, text: chunks.append(text)) if "stream" in mode else None
+
+    if mode.startswith("a"):
+        results = asyncio.run(controller.execute_pipeline_async(initial, on_chunk=on_chunk))
+    else:
+        results = controller.execute_pipeline(initial, on_chunk=on_chunk)
+
+    assert results == []
+    assert model.calls == 2  # 首次调用 + 1次重试
+    assert controller.error_occurred
+    assert "429" in controller.error_message
+    assert controller.cache.stats()["entries"] == 0
+    assert _stored_files(tmp_path / "checkpoints" / "runs") == []
+    assert _stored_files(tmp_path / "rounds") == []
+
+    # 失败没有写入任何缓存：模型恢复后同一输入重新调用并成功
+    llm.model = original
+    results = controller.execute_pipeline(initial)
+    assert [r["status"] for r in results] == ["success", "success"]
+    assert results[0]["output"]["text"]
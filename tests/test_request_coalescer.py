@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core.request_coalescer import RequestCoalescer
+
+
+def _wait_for_followers(coalescer, count):
+    deadline = time.monotonic() + 2
+    while coalescer.stats()["followers"] < count:
+        assert time.monotonic() < deadline, "follower never joined"
+        time.sleep(0.001)
+
+
+def test_followers_share_the_leader_result():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    def leader():
+        calls.append("leader")
+        _wait_for_followers(coalescer, 1)
+        return {"text": "ok"}
+
+    shared = {}
+    thread = threading.Thread(target=lambda: shared.update(r=coalescer.run("k", leader)))
+    thread.start()
+    while coalescer.stats()["inflight"] == 0:
+        time.sleep(0.001)
+    result, was_shared = coalescer.run("k", lambda: calls.append("follower") or {"text": "own"})
+    thread.join()
+
+    assert calls == ["leader"]
+    assert (result, was_shared) == ({"text": "ok"}, True)
+    assert shared["r"] == ({"text": "ok"}, False)
+    assert coalescer.stats()["inflight"] == 0
+
+
+def test_leader_failure_makes_followers_retry():
+    coalescer = RequestCoalescer()
+    errors = []
+
+    def failing_leader():
+        _wait_for_followers(coalescer, 2)
+        raise RuntimeError("boom")
+
+    def lead():
+        try:
+            coalescer.run("k", failing_leader)
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=lead)
+    thread.start()
+    while coalescer.stats()["inflight"] == 0:
+        time.sleep(0.001)
+
+    follower_calls = []
+    lock = threading.Lock()
+
+    def retry():
+        with lock:
+            follower_calls.append(1)
+        time.sleep(0.05)
+        return {"text": "retried"}
+
+    outcomes = []
+    followers = [threading.Thread(target=lambda: outcomes.append(coalescer.run("k", retry))) for _ in range(2)]
+    for t in followers:
+        t.start()
+    for t in followers + [thread]:
+        t.join()
+
+    # 只有发起方看到异常；等待方重新合并，一个成为新的发起方，另一个复用其结果
+    assert [str(e) for e in errors] == ["boom"]
+    assert len(follower_calls) == 1
+    assert sorted(shared for _, shared in outcomes) == [False, True]
+    assert all(result == {"text": "retried"} for result, _ in outcomes)
+    assert coalescer.stats()["inflight"] == 0
+
+
+def test_cancelled_async_leader_makes_follower_call_again():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    async def slow():
+        calls.append("leader")
+        await asyncio.sleep(10)
+        return {"text": "never"}
+
+    async def own():
+        calls.append("follower")
+        return {"text": "own"}
+
+    async def main():
+        leader = asyncio.ensure_future(coalescer.arun("k", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(coalescer.arun("k", own))
+        await asyncio.sleep(0)
+        assert coalescer.stats()["followers"] == 1
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    result, shared = asyncio.run(main())
+    assert (result, shared) == ({"text": "own"}, False)
+    assert calls == ["leader", "follower"]
+    assert coalescer.stats()["inflight"] == 0
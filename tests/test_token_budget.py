@@ -0,0 +1,42 @@
+import pytest
+
+from core.compiled_config import _validate
+from processors.prompt_template import MEMORY_REF
+from processors.token_budget import KEEP_LAST, TRUNCATE_HEAD, TRUNCATE_TAIL, TokenBudget
+
+
+def _budget(policy, **config):
+    return TokenBudget.from_config({"max_prompt_tokens": 10, "budget_policy": policy,
+                                    "tokenizer": "estimate", **config})
+
+
+@pytest.mark.parametrize("keep_chars", ["0", 0, "-5"])
+def test_keep_chars_must_be_positive(keep_chars):
+    with pytest.raises(ValueError):
+        _budget(KEEP_LAST, budget_keep_chars=keep_chars)
+    with pytest.raises(ValueError):
+        _validate([{"section_name": "s", "model": "m", "budget_keep_chars": keep_chars}])
+
+
+def test_keep_last_keeps_only_the_tail():
+    budget = _budget(KEEP_LAST, budget_keep_chars="8")
+    parts = [("literal", "x"), (MEMORY_REF, "a" * 100 + "TAIL1234")]
+    fitted, report = budget.fit(parts)
+    assert fitted[1] == (MEMORY_REF, "TAIL1234")
+    assert report.applied and report.trimmed_tokens > 0
+
+
+@pytest.mark.parametrize("policy, expected", [
+    (TRUNCATE_HEAD, "b" * 40),
+    (TRUNCATE_TAIL, "a" * 40),
+])
+def test_truncate_policies(policy, expected):
+    budget = _budget(policy)
+    fitted, report = budget.fit([(MEMORY_REF, "a" * 100 + "b" * 100)])
+    assert fitted[0] == (MEMORY_REF, expected)
+    assert report.tokens <= 10
+
+
+def test_unset_budget_returns_none():
+    assert TokenBudget.from_config({"max_prompt_tokens": ""}) is None
+    assert TokenBudget.from_config({}) is None
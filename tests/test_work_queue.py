@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from core.batch_runner import BatchRunner
+from core.work_queue import WorkQueue
+from service.queue_worker import QueueWorker
+
+LEASE = 0.1
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=LEASE, max_attempts=3)
+    yield q
+    q.close()
+
+
+def _record(name):
+    return {"filename": name, "promptVariables": {"topic": name}}
+
+
+def test_expired_lease_is_redelivered_and_old_worker_is_fenced(queue):
+    queue.enqueue([_record("a")])
+    (first,) = queue.lease("w1")
+    assert first["attempts"] == 1
+    assert queue.lease("w2") == []
+
+    time.sleep(LEASE * 1.5)
+    (second,) = queue.lease("w2")
+    assert second["id"] == first["id"]
+    assert second["attempts"] == 2
+
+    # 租约已被接管：原工作进程的续约与回报都被忽略
+    assert queue.heartbeat("w1", [first["id"]]) == []
+    assert not queue.complete(first["id"], "w1", {"by": "w1"})
+    assert not queue.fail(first["id"], "w1", "late")
+
+    assert queue.complete(second["id"], "w2", {"by": "w2"})
+    (result,) = queue.iter_results()
+    assert result["status"] == "done"
+    assert result["worker"] == "w2"
+    assert result["result"] == {"by": "w2"}
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    queue.enqueue([_record("a")])
+    (task,) = queue.lease("w1")
+    for _ in range(3):
+        time.sleep(LEASE / 3)
+        assert queue.heartbeat("w1", [task["id"]]) == [task["id"]]
+    assert queue.lease("w2") == []
+
+
+def test_lease_expiry_exhausts_attempts(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=LEASE, max_attempts=2)
+    queue.enqueue([_record("a")])
+    assert len(queue.lease("w1")) == 1
+    time.sleep(LEASE * 1.5)
+    assert len(queue.lease("w2")) == 1
+    time.sleep(LEASE * 1.5)
+    assert queue.lease("w3") == []
+    stats = queue.stats()
+    assert stats["failed"] == 1 and stats["leased"] == 0
+    queue.close()
+
+
+def test_worker_picks_up_record_from_crashed_worker(tmp_path, queue):
+    config = tmp_path / "config.ini"
+    config.write_text(
+        "[gen]\nprovider = fake\nmodel = m\napi_key = x\nbase_url = test://queue\nprompt = draw {topic}\n",
+        encoding="utf-8",
+    )
+    queue.enqueue([_record("a"), _record("b")])
+    # 崩溃的工作进程：领取后既不续约也不回报
+    (orphan,) = queue.lease("crashed")
+
+    runner = BatchRunner(str(config), concurrency=2, output_dir=str(tmp_path / "out"))
+    worker = QueueWorker(queue, runner, worker_id="w2", poll_interval=LEASE / 2, exit_when_empty=True)
+    stats = worker.run()
+
+    assert stats == {"done": 2, "failed": 0, "lost": 0}
+    results = {r["filename"]: r for r in queue.iter_results()}
+    assert results[orphan["filename"]]["attempts"] == 2
+    assert all(r["worker"] == "w2" and r["status"] == "done" for r in results.values())
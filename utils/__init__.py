@@ -6,8 +6,14 @@ from .file_utils import (
     encode_file_to_base64, decode_base64_to_file, is_base64_data, 
     save_json, save_text, save_image
 )
+from .media_store import (
+    MediaHandle, MediaStore, get_default_media_store, decode_inline_images,
+    classify_media_input, normalize_and_hash_base64, decode_and_hash_base64
+)
+from .media_worker_pool import MediaWorkerPool
 from .data_utils import create_error_data
 from .log_config import setup_logging, get_logger
+from .metrics import RoundSpan, MetricsSink, MultiSink, InMemoryAggregator, PrometheusExporter
 
 __all__ = [
     # 文件工具
@@ -18,10 +24,27 @@ __all__ = [
     'save_text',
     'save_image',
     
+    # 媒体存储
+    'MediaHandle',
+    'MediaStore',
+    'get_default_media_store',
+    'decode_inline_images',
+    'classify_media_input',
+    'normalize_and_hash_base64',
+    'decode_and_hash_base64',
+    'MediaWorkerPool',
+    
     # 数据工具  
     'create_error_data',
     
     # 日志工具
     'setup_logging',
     'get_logger',
+    
+    # 指标
+    'RoundSpan',
+    'MetricsSink',
+    'MultiSink',
+    'InMemoryAggregator',
+    'PrometheusExporter',
 ] 
\ No newline at end of file
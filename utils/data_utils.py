@@ -9,7 +9,7 @@ from typing import Dict, Any
 
 def create_error_data(error_message: str) -> Dict[str, Any]:
     """
-    创建错误数据结构
+    创建错误数据结构，error 键是明确的失败标记
     
     Args:
         error_message: 错误信息
@@ -20,5 +20,6 @@ def create_error_data(error_message: str) -> Dict[str, Any]:
     return {
         "text": f"执行失败: {error_message}",
         "image": "",
-        "video": ""
+        "video": "",
+        "error": error_message
     } 
\ No newline at end of file
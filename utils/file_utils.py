@@ -7,13 +7,17 @@
 import os
 import base64
 import json
+import mmap
 from pathlib import Path
-from typing import Optional, Tuple, List, Dict, Any
+from typing import Optional, Dict, Any, Union
 from .log_config import get_logger
+from .media_store import (
+    MediaHandle, encode_base64, classify_media_input, normalize_and_hash_base64,
+    MEDIA_DATA_URL, MEDIA_BASE64, MEDIA_PATH, MEDIA_UNKNOWN,
+)
 
 logger = get_logger('utils.file')
 
-
 def encode_file_to_base64(file_path: str) -> Optional[str]:
     """
     将文件编码为base64字符串，或处理已有的base64数据
@@ -27,21 +31,20 @@ def encode_file_to_base64(file_path: str) -> Optional[str]:
     if not file_path:
         return None
         
+    kind = classify_media_input(file_path)
     # 如果已经是data URL，提取base64部分返回
-    if file_path.startswith("data:"):
+    if kind == MEDIA_DATA_URL:
         if ";base64," in file_path:
             return file_path.split(",", 1)[1]  # 返回纯base64部分
         else:
             return file_path  # 非base64的data URL，原样返回
     
-    # 检查是否已经是base64字符串
-    try:
-        base64.b64decode(file_path, validate=True)
-        # 如果解码成功，说明已经是base64，直接返回
+    # 已经是base64字符串，直接返回
+    if kind == MEDIA_BASE64:
         return file_path
-    except:
-        # 不是base64，继续按文件路径处理
-        pass
+    if kind == MEDIA_UNKNOWN:
+        logger.warning(f"无法识别的媒体输入（{len(file_path)} 字符），既不是文件路径也不是base64")
+        return None
         
     # 按文件路径处理
     if not os.path.exists(file_path):
@@ -49,8 +52,12 @@ def encode_file_to_base64(file_path: str) -> Optional[str]:
         return None
     
     try:
+        # 内存映射后分块编码，不把整个文件读入内存
         with open(file_path, "rb") as f:
-            file_data = base64.b64encode(f.read()).decode("utf-8")
+            if os.fstat(f.fileno()).st_size == 0:
+                return ""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                file_data = encode_base64(mapped)
         logger.info(f"文件编码成功: {file_path}")
         return file_data
     except Exception as e:
@@ -146,17 +153,19 @@ def save_text(text: str, output_path: str) -> bool:
         return False
 
 
-def save_image(base64_data: str, output_path: str) -> bool:
+def save_image(base64_data: Union[str, MediaHandle], output_path: str) -> bool:
     """
-    保存base64图片数据到文件
+    保存图片/视频数据到文件
     
     Args:
-        base64_data: base64编码的图片数据
+        base64_data: 媒体句柄，或base64编码的数据
         output_path: 输出文件路径
         
     Returns:
         bool: 成功返回True，失败返回False
     """
+    if isinstance(base64_data, MediaHandle):
+        return base64_data.write_to(output_path)
     return decode_base64_to_file(base64_data, output_path)
 
 
@@ -173,16 +182,8 @@ def is_base64_data(data: str) -> bool:
     if not data or not isinstance(data, str):
         return False
     
-    # 如果是data URL，认为已经是编码好的
-    if data.startswith("data:"):
-        return True
-    
-    # 检查是否为纯base64数据
-    try:
-        base64.b64decode(data, validate=True)
-        return True
-    except:
-        return False
+    # data URL 或 base64（短字符串完整校验，长字符串抽样校验）
+    return classify_media_input(data) in (MEDIA_DATA_URL, MEDIA_BASE64)
 
 
 def sanitize_base64(data: str) -> Optional[str]:
@@ -191,6 +192,7 @@ def sanitize_base64(data: str) -> Optional[str]:
     - 如果是data URL，提取base64部分
     - 清理空白字符
     - 校验是否为合法base64；非法则返回None
+    单遍完成，需要同时得到内容摘要时使用 normalize_and_hash_base64
     
     Args:
         data: 输入的base64字符串或data URL
@@ -198,22 +200,5 @@ def sanitize_base64(data: str) -> Optional[str]:
     Returns:
         str: 清理后的纯base64字符串，失败返回None
     """
-    if not data or not isinstance(data, str):
-        return None
-    
-    # 如果是data URL，提取base64部分
-    if data.startswith("data:") and ";base64," in data:
-        data = data.split(",", 1)[1]
-    
-    # 清理空白字符
-    cleaned = "".join(data.split())
-    
-    # 校验base64格式
-    try:
-        base64.b64decode(cleaned, validate=True)
-        return cleaned
-    except:
-        return None
-
-
- 
\ No newline at end of file
+    result = normalize_and_hash_base64(data)
+    return result[0] if result else None
@@ -0,0 +1,605 @@
+#!/usr/bin/env python3
+"""
+媒体存储模块
+图片/视频只解码一次并以字节形式保存（或内存映射磁盘文件），流水线内部传递轻量句柄，
+仅在向模型提供商序列化请求时才编码为base64
+"""
+
+import atexit
+import base64
+import binascii
+import hashlib
+import mimetypes
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import threading
+import weakref
+from pathlib import Path
+from typing import Any, List, Optional, Tuple, Union
+from .log_config import get_logger
+
+logger = get_logger('utils.media_store')
+
+# 常见格式的文件头，用于在没有data URL时推断MIME类型
+_MAGIC_NUMBERS = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+# 内联图片 data URL 的头部与base64载荷（载荷中允许夹带换行等空白字符）
+_INLINE_IMAGE_MARKER = "data:image/"
+_BASE64_MARKER = ";base64,"
+_MAX_SUBTYPE_LEN = 64
+_BASE64_RUN = re.compile(r'[A-Za-z0-9+/=\s]*')
+_BASE64_RUN_BYTES = re.compile(rb'[A-Za-z0-9+/=\s]*')
+
+# 媒体输入的类型
+MEDIA_DATA_URL = "data_url"
+MEDIA_BASE64 = "base64"
+MEDIA_PATH = "path"
+MEDIA_UNKNOWN = "unknown"
+
+# 不超过该长度的字符串才可能是文件路径（PATH_MAX），也只对这些字符串做完整校验
+_PATH_MAX = 4096
+# 长字符串的抽样校验：开头、结尾与均匀分布的中间窗口
+_SAMPLE_WINDOWS = 16
+_SAMPLE_CHARS = 64
+# 规范化与摘要时每次处理的字符数（4的倍数）
+_NORMALIZE_CHUNK = 4 * 1024 * 1024
+_BASE64_BODY = re.compile(r"[A-Za-z0-9+/\s]*")
+_BASE64_TAIL = re.compile(r"[A-Za-z0-9+/\s]*(?:=\s*){0,2}")
+_DELETE_WHITESPACE = str.maketrans("", "", " \t\n\r\v\f")
+
+# 分块编码base64时每块的输入字节数，必须是3的倍数，保证各块的编码结果可以直接拼接
+_ENCODE_CHUNK = 3 * 1024 * 1024
+
+# 溢出到磁盘的句柄内容所在的临时目录（进程级，按需创建，退出时删除）
+_spill_dir: Optional[str] = None
+_spill_lock = threading.Lock()
+
+# 未能识别格式时的默认MIME类型
+DEFAULT_MIME = {
+    "image": "image/jpeg",
+    "video": "video/mp4",
+}
+
+class MediaHandle:
+    """
+    媒体句柄 - 持有一份图片/视频的字节内容及其元信息
+
+    内容可以是内存中的字节，也可以是磁盘文件（按需内存映射），
+    sha256 在创建时计算一次，可用作缓存键与去重依据
+    """
+
+    __slots__ = ("mime", "sha256", "size", "path", "_data", "__weakref__")
+
+    def __init__(self, data: Optional[bytes] = None, mime: str = "application/octet-stream",
+                 path: Optional[str] = None, sha256: Optional[str] = None):
+        """
+        Args:
+            data: 字节内容，与path二选一
+            mime: MIME类型，如 image/png
+            path: 磁盘文件路径，内容在首次访问时内存映射
+            sha256: 已知的内容摘要，为None时自动计算
+        """
+        if data is None and path is None:
+            raise ValueError("MediaHandle 需要 data 或 path")
+        self.mime = mime
+        self.path = path
+        self._data = data
+        if data is not None:
+            self.size = len(data)
+        else:
+            self.size = os.path.getsize(path)
+        self.sha256 = sha256 or self._compute_sha256()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, mime: str) -> "MediaHandle":
+        """从字节创建句柄"""
+        return cls(data=bytes(data), mime=mime)
+
+    @classmethod
+    def from_file(cls, path: str, mime: Optional[str] = None) -> "MediaHandle":
+        """从磁盘文件创建句柄，内容不会读入内存"""
+        if mime is None:
+            mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        return cls(path=str(path), mime=mime)
+
+    @property
+    def kind(self) -> str:
+        """媒体大类：image、video 或 MIME 主类型"""
+        return self.mime.split("/", 1)[0]
+
+    @property
+    def data(self) -> Union[bytes, mmap.mmap]:
+        """字节内容；文件句柄返回只读内存映射"""
+        if self._data is not None:
+            return self._data
+        if self.size == 0:
+            return b""
+        with open(self.path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _compute_sha256(self) -> str:
+        """计算内容摘要"""
+        content = self.data
+        try:
+            return hashlib.sha256(content).hexdigest()
+        finally:
+            if isinstance(content, mmap.mmap):
+                content.close()
+
+    def to_base64(self) -> str:
+        """编码为纯base64字符串（仅在序列化请求时调用）"""
+        return self._encode(b"")
+
+    def to_data_url(self) -> str:
+        """编码为 data URL，头部与载荷一次写入，不再拼接字符串"""
+        return self._encode(f"data:{self.mime};base64,".encode("ascii"))
+
+    def _encode(self, prefix: bytes) -> str:
+        """分块编码内容（文件句柄直接从内存映射读取）"""
+        content = self.data
+        try:
+            return encode_base64(content, prefix)
+        finally:
+            if isinstance(content, mmap.mmap):
+                content.close()
+
+    @property
+    def resident(self) -> bool:
+        """内容是否驻留在内存中（文件句柄为False）"""
+        return self._data is not None
+
+    def spill(self, directory: Optional[str] = None) -> bool:
+        """
+        将内存中的内容写入临时文件并释放内存，之后按需内存映射读取
+
+        句柄原地转换，所有持有该句柄的地方（memory、结果、缓存）都随之释放内存；
+        临时文件在句柄被回收时删除
+
+        Args:
+            directory: 临时文件目录，默认使用进程级溢出目录
+
+        Returns:
+            bool: 是否发生了溢出（已是文件句柄或内容为空时返回False）
+        """
+        if self._data is None or self.size == 0:
+            return False
+        directory = directory or get_spill_dir()
+        with _spill_lock:
+            if self._data is None:
+                return False
+            fd, path = tempfile.mkstemp(prefix=f"{self.sha256[:16]}_", dir=directory)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(self._data)
+            except BaseException:
+                _remove_file(path)
+                raise
+            # 先设置路径再释放数据，并发读取要么拿到字节，要么映射完整的文件
+            self.path = path
+            weakref.finalize(self, _remove_file, path)
+            self._data = None
+            return True
+
+    def write_to(self, output_path: str) -> bool:
+        """
+        将内容写入文件
+
+        Args:
+            output_path: 输出文件路径
+
+        Returns:
+            bool: 成功返回True，失败返回False
+        """
+        try:
+            Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+            content = self.data
+            try:
+                with open(output_path, "wb") as f:
+                    f.write(content)
+            finally:
+                if isinstance(content, mmap.mmap):
+                    content.close()
+            logger.info(f"文件保存成功: {output_path}")
+            return True
+        except Exception as e:
+            logger.error(f"文件保存失败: {e}")
+            return False
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, MediaHandle) and other.sha256 == self.sha256
+
+    def __hash__(self) -> int:
+        return hash(self.sha256)
+
+    def __repr__(self) -> str:
+        return f"[{self.mime} {self.size / 1024:.1f}KB sha256:{self.sha256[:12]}]"
+
+class MediaStore:
+    """
+    媒体存储，线程安全
+
+    按内容摘要去重：相同内容只保留一个句柄。使用弱引用保存，
+    句柄不再被流水线引用时自动释放，长时间运行的进程不会无限增长
+    """
+
+    def __init__(self):
+        self._handles: "weakref.WeakValueDictionary[str, MediaHandle]" = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def _register(self, handle: MediaHandle) -> MediaHandle:
+        """登记句柄，已存在相同内容时返回已有句柄"""
+        with self._lock:
+            existing = self._handles.get(handle.sha256)
+            if existing is not None:
+                return existing
+            self._handles[handle.sha256] = handle
+            return handle
+
+    def get(self, sha256: str) -> Optional[MediaHandle]:
+        """按摘要查找句柄"""
+        with self._lock:
+            return self._handles.get(sha256)
+
+    def put_bytes(self, data: bytes, mime: str) -> MediaHandle:
+        """保存字节内容"""
+        return self._register(MediaHandle.from_bytes(data, mime))
+
+    def put_file(self, path: str, kind: str = "image") -> Optional[MediaHandle]:
+        """
+        登记磁盘文件（内存映射，不读入内存）
+
+        Args:
+            path: 文件路径
+            kind: 媒体大类，用于推断默认MIME类型
+
+        Returns:
+            Optional[MediaHandle]: 文件不存在时返回None
+        """
+        if not os.path.isfile(path):
+            logger.warning(f"文件不存在: {path}")
+            return None
+        mime = mimetypes.guess_type(path)[0] or DEFAULT_MIME.get(kind, "application/octet-stream")
+        return self._register(MediaHandle.from_file(path, mime))
+
+    def put_base64(self, data: str, kind: str = "image", mime: Optional[str] = None) -> Optional[MediaHandle]:
+        """
+        解码base64字符串或data URL并保存，整个过程只解码一次
+
+        Args:
+            data: base64字符串或data URL
+            kind: 媒体大类，用于推断默认MIME类型
+            mime: 已知的MIME类型，优先于data URL头与文件头推断
+
+        Returns:
+            Optional[MediaHandle]: 非法base64返回None
+        """
+        payload = _split_data_url(data)
+        if payload is None:
+            return None
+        data, header_mime = payload
+        mime = mime or header_mime
+
+        decoded = decode_and_hash_base64(data)
+        if decoded is None or not decoded[0]:
+            return None
+        raw, sha256 = decoded
+        # 摘要已在解码时算出，不再重复计算
+        return self._register(MediaHandle(raw, mime or sniff_mime(raw, kind), sha256=sha256))
+
+    def to_handle(self, value: Any, kind: str = "image") -> Optional[MediaHandle]:
+        """
+        将任意媒体输入转换为句柄：句柄、字节、data URL、base64字符串或文件路径
+
+        Args:
+            value: 媒体输入
+            kind: 媒体大类（image 或 video）
+
+        Returns:
+            Optional[MediaHandle]: 无法识别时返回None
+        """
+        if not value:
+            return None
+        if isinstance(value, MediaHandle):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            raw = bytes(value)
+            return self.put_bytes(raw, sniff_mime(raw, kind))
+        if not isinstance(value, str):
+            return None
+        # 只看前缀、长度与抽样字符分类，完整校验在解码时与摘要一起完成
+        media_type = classify_media_input(value)
+        if media_type == MEDIA_PATH:
+            return self.put_file(value, kind)
+        if media_type in (MEDIA_DATA_URL, MEDIA_BASE64):
+            return self.put_base64(value, kind)
+        return None
+
+def _split_data_url(data: str) -> Optional[Tuple[str, Optional[str]]]:
+    """拆出 data URL 的base64载荷与MIME类型；不是 data URL 时原样返回，非base64的 data URL 返回None"""
+    if not data.startswith("data:"):
+        return data, None
+    header, sep, payload = data.partition(",")
+    if not sep or ";base64" not in header:
+        return None
+    return payload, header[5:].split(";", 1)[0] or None
+
+def _has_whitespace(chunk: str) -> bool:
+    """是否含空白字符；split(None, 1) 在没有空白字符时不复制字符串，比正则搜索快得多"""
+    parts = chunk.split(None, 1)
+    return len(parts) != 1 or len(parts[0]) != len(chunk)
+
+def _is_base64_full(data: str) -> bool:
+    """完整校验短字符串是否为合法base64（允许夹带空白字符）"""
+    try:
+        base64.b64decode(data.translate(_DELETE_WHITESPACE), validate=True)
+        return True
+    except (binascii.Error, ValueError):
+        return False
+
+def _looks_like_base64(data: str) -> bool:
+    """抽样校验长字符串：只检查开头、结尾与若干中间窗口的字符集，不解码、不复制整个字符串"""
+    size = len(data)
+    step = max(_SAMPLE_CHARS, size // _SAMPLE_WINDOWS)
+    for start in range(0, size - _SAMPLE_CHARS, step):
+        if not _BASE64_BODY.fullmatch(data, start, start + _SAMPLE_CHARS):
+            return False
+    return bool(_BASE64_TAIL.fullmatch(data, max(0, size - _SAMPLE_CHARS), size))
+
+def classify_media_input(data: str) -> str:
+    """
+    判断媒体输入的类型，只看前缀、长度与抽样字符，开销与字符串长度基本无关
+
+    - 以 data: 开头：data URL
+    - 短字符串且文件存在：文件路径；短字符串不存在时完整校验是否为base64，否则视为（不存在的）路径
+    - 长字符串（不可能是路径）：抽样字符集校验通过视为base64，完整校验推迟到真正解码时
+
+    Args:
+        data: 媒体输入字符串
+
+    Returns:
+        str: MEDIA_DATA_URL、MEDIA_BASE64、MEDIA_PATH 或 MEDIA_UNKNOWN
+    """
+    if not data or not isinstance(data, str):
+        return MEDIA_UNKNOWN
+    if data.startswith("data:"):
+        return MEDIA_DATA_URL
+    if len(data) < _PATH_MAX:
+        if os.path.exists(data):
+            return MEDIA_PATH
+        return MEDIA_BASE64 if _is_base64_full(data) else MEDIA_PATH
+    return MEDIA_BASE64 if _looks_like_base64(data) else MEDIA_UNKNOWN
+
+def _decode_chunks(data: str):
+    """
+    逐块去掉空白字符并解码，产出 (清理后的文本块, 是否清理过, 解码后的字节)
+
+    块之间按4字符对齐，填充符只能出现在末尾；非法时抛出 ValueError
+    """
+    carry = ""
+    padded = False
+    for start in range(0, len(data), _NORMALIZE_CHUNK):
+        text = data[start:start + _NORMALIZE_CHUNK]
+        cleaned = _has_whitespace(text)
+        if cleaned:
+            text = text.translate(_DELETE_WHITESPACE)
+        chunk = carry + text if carry else text
+        aligned = len(chunk) - len(chunk) % 4
+        carry = chunk[aligned:]
+        if not aligned:
+            yield text, cleaned, b""
+            continue
+        if padded:
+            raise ValueError("填充符只能出现在末尾")
+        padded = chunk[aligned - 1] == "="
+        yield text, cleaned, base64.b64decode(chunk[:aligned] if carry else chunk, validate=True)
+    if carry:
+        # 合法base64去掉空白后长度必为4的倍数
+        raise ValueError("base64长度不是4的倍数")
+
+def normalize_and_hash_base64(data: str) -> Optional[Tuple[str, str]]:
+    """
+    单遍规范化并计算摘要：去掉data URL头与空白字符、校验base64、计算解码后内容的sha256
+
+    按块处理，内存中只有一个块的解码结果；不含空白字符时直接返回原字符串，不复制
+
+    Args:
+        data: base64字符串或data URL
+
+    Returns:
+        Optional[Tuple[str, str]]: (纯base64字符串, 内容sha256)，非法时返回None
+    """
+    if not data or not isinstance(data, str):
+        return None
+    payload = _split_data_url(data)
+    if payload is None:
+        return None
+    data = payload[0]
+
+    digest = hashlib.sha256()
+    # 含空白字符时才收集清理后的片段；在此之前的块都是干净的，直接取原字符串的前缀
+    pieces: Optional[List[str]] = None
+    try:
+        for index, (text, cleaned, raw) in enumerate(_decode_chunks(data)):
+            if pieces is None and cleaned:
+                pieces = [data[:index * _NORMALIZE_CHUNK]]
+            if pieces is not None:
+                pieces.append(text)
+            digest.update(raw)
+    except ValueError:
+        return None
+    return (data if pieces is None else "".join(pieces)), digest.hexdigest()
+
+def decode_and_hash_base64(data: str) -> Optional[Tuple[bytes, str]]:
+    """
+    单遍解码并计算摘要，规则与 normalize_and_hash_base64 相同
+
+    不含空白字符（常见情况）时整体解码一次，不复制输入字符串；否则逐块清理并解码
+
+    Args:
+        data: base64字符串或data URL
+
+    Returns:
+        Optional[Tuple[bytes, str]]: (解码后的内容, 内容sha256)，非法时返回None
+    """
+    if not data or not isinstance(data, str):
+        return None
+    payload = _split_data_url(data)
+    if payload is None:
+        return None
+    data = payload[0]
+    try:
+        if not _has_whitespace(data):
+            raw = base64.b64decode(data, validate=True)
+        else:
+            raw = b"".join(chunk for _, _, chunk in _decode_chunks(data))
+    except ValueError:
+        return None
+    return raw, hashlib.sha256(raw).hexdigest()
+
+def encode_base64(source: Union[bytes, bytearray, memoryview, mmap.mmap], prefix: bytes = b"") -> str:
+    """
+    分块编码为base64字符串：按最终长度预分配缓冲区，逐块编码写入，最后只生成一次字符串
+
+    相比 b64encode(...).decode() 再拼接 data URL 头，少两次完整复制；输入为内存映射时，
+    源文件内容不需要整体读入内存
+
+    Args:
+        source: 字节内容或内存映射
+        prefix: 写在最前面的ASCII头部，例如 b"data:video/mp4;base64,"
+
+    Returns:
+        str: prefix + base64载荷
+    """
+    size = len(source)
+    out = bytearray(len(prefix) + 4 * ((size + 2) // 3))
+    out[:len(prefix)] = prefix
+    pos = len(prefix)
+    # 显式释放视图，否则调用方关闭内存映射时会因仍有导出的缓冲区而失败
+    with memoryview(source) as view:
+        for start in range(0, size, _ENCODE_CHUNK):
+            encoded = binascii.b2a_base64(view[start:start + _ENCODE_CHUNK], newline=False)
+            out[pos:pos + len(encoded)] = encoded
+            pos += len(encoded)
+    return out.decode("ascii")
+
+def scan_inline_images(content: Union[str, bytes], max_images: Optional[int] = 1,
+                       start: int = 0) -> List[Tuple[str, int, int]]:
+    """
+    单遍扫描文本中的内联base64图片（data:image/xxx;base64,...）
+
+    只在 data URL 头附近做有界查找，载荷的结束位置由一次锚定匹配确定，
+    找到 max_images 张后立即停止，不会扫描或复制其余内容
+
+    Args:
+        content: 响应文本（str，或工作进程中的UTF-8字节）
+        max_images: 最多返回的图片数，None表示全部
+        start: 开始扫描的位置（调用方已定位到第一个图片标记时可跳过前面的文本）
+
+    Returns:
+        List[Tuple[str, int, int]]: 每张图片的 (图片子类型, 载荷起点, 载荷终点)
+    """
+    if isinstance(content, str):
+        marker, separator, run = _INLINE_IMAGE_MARKER, _BASE64_MARKER, _BASE64_RUN
+    else:
+        marker, separator, run = _INLINE_IMAGE_MARKER.encode(), _BASE64_MARKER.encode(), _BASE64_RUN_BYTES
+
+    found = []
+    pos = start
+    while max_images is None or len(found) < max_images:
+        start = content.find(marker, pos)
+        if start < 0:
+            break
+        subtype_start = start + len(marker)
+        separator_pos = content.find(separator, subtype_start, subtype_start + _MAX_SUBTYPE_LEN + len(separator))
+        if separator_pos <= subtype_start:
+            # 不是base64 data URL，跳过这个头继续查找
+            pos = subtype_start
+            continue
+        payload_start = separator_pos + len(separator)
+        payload_end = run.match(content, payload_start).end()
+        if payload_end > payload_start:
+            subtype = content[subtype_start:separator_pos]
+            found.append((subtype if isinstance(subtype, str) else subtype.decode("ascii", "replace"),
+                          payload_start, payload_end))
+        pos = payload_end
+    return found
+
+def decode_inline_images(content: Union[str, bytes], max_images: Optional[int] = 1,
+                         start: int = 0) -> List[Tuple[str, bytes]]:
+    """
+    提取并解码文本中的内联base64图片，载荷直接解码为字节（忽略其中的空白字符）
+
+    Args:
+        content: 响应文本
+        max_images: 最多解码的图片数，None表示全部
+        start: 开始扫描的位置
+
+    Returns:
+        List[Tuple[str, bytes]]: (图片子类型, 图片字节) 列表，非法载荷会被跳过
+    """
+    images = []
+    view = memoryview(content) if isinstance(content, (bytes, bytearray)) else content
+    for subtype, payload_start, payload_end in scan_inline_images(content, max_images, start):
+        try:
+            raw = binascii.a2b_base64(view[payload_start:payload_end])
+        except (binascii.Error, ValueError):
+            logger.warning(f"内联图片base64解码失败，已忽略 ({payload_end - payload_start} 字节)")
+            continue
+        if raw:
+            images.append((subtype, raw))
+    return images
+
+def sniff_mime(data: bytes, kind: str = "image") -> str:
+    """
+    根据文件头推断MIME类型
+
+    Args:
+        data: 字节内容
+        kind: 媒体大类，无法识别时用于选择默认值
+
+    Returns:
+        str: MIME类型
+    """
+    head = bytes(data[:16])
+    for magic, mime in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return "video/mp4"
+    return DEFAULT_MIME.get(kind, "application/octet-stream")
+
+def _remove_file(path: str):
+    """删除溢出文件，文件已不存在时忽略"""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def get_spill_dir() -> str:
+    """获取进程级溢出目录，首次调用时创建"""
+    global _spill_dir
+    with _spill_lock:
+        if _spill_dir is None:
+            _spill_dir = tempfile.mkdtemp(prefix="pipeline_spill_")
+            atexit.register(shutil.rmtree, _spill_dir, True)
+        return _spill_dir
+
+# 进程级默认媒体存储
+_default_store = MediaStore()
+
+def get_default_media_store() -> MediaStore:
+    """获取进程级默认媒体存储"""
+    return _default_store
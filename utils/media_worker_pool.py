@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+媒体工作进程池模块
+将base64编码/解码与响应中内联图片的提取放到独立进程执行，绕开GIL；
+进程之间通过共享内存传递字节，不经过pickle复制大块数据
+"""
+
+import binascii
+import mmap
+import os
+import sys
+import threading
+from concurrent.futures import Executor
+from typing import List, Optional, Tuple
+from .log_config import get_logger
+from .media_store import MediaHandle, decode_inline_images
+
+logger = get_logger('utils.media_worker_pool')
+
+# 低于该大小的载荷在当前线程处理，进程间调度的开销高于编码本身
+DEFAULT_MIN_BYTES = 256 * 1024
+# 每次编码的输入块大小，必须是3的倍数，保证分块编码结果可以直接拼接
+_ENCODE_CHUNK = 3 * 256 * 1024
+
+# multiprocessing 与 ProcessPoolExecutor 在第一次使用时才导入，不启用工作进程池时不增加启动耗时
+
+def _attach(name: str) -> "shared_memory.SharedMemory":
+    """
+    在工作进程中打开父进程创建的共享内存，由父进程负责释放
+
+    spawn 创建的工作进程与父进程共用资源跟踪器，重复登记不会导致重复释放
+    """
+    from multiprocessing import shared_memory
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+def _encode_worker(prefix: bytes, src_name: Optional[str], src_path: Optional[str], size: int, dst_name: str) -> int:
+    """
+    工作进程：将源数据编码为 data URL 写入目标共享内存
+
+    Args:
+        prefix: data URL 头，例如 b"data:image/png;base64,"
+        src_name: 源数据所在共享内存名称（内存中的句柄）
+        src_path: 源文件路径（文件句柄，直接内存映射，不经过共享内存）
+        size: 源数据字节数
+        dst_name: 目标共享内存名称
+
+    Returns:
+        int: 写入目标的总字节数
+    """
+    dst = _attach(dst_name)
+    src = mapped = None
+    try:
+        if src_path is not None:
+            with open(src_path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            source = memoryview(mapped)
+        else:
+            src = _attach(src_name)
+            source = src.buf[:size]
+        # 显式释放视图，否则关闭共享内存/内存映射时会因仍有导出的缓冲区而失败
+        with source, dst.buf[:] as out:
+            out[:len(prefix)] = prefix
+            pos = len(prefix)
+            for start in range(0, size, _ENCODE_CHUNK):
+                encoded = binascii.b2a_base64(source[start:start + _ENCODE_CHUNK], newline=False)
+                out[pos:pos + len(encoded)] = encoded
+                pos += len(encoded)
+        return pos
+    finally:
+        dst.close()
+        if src is not None:
+            src.close()
+        if mapped is not None:
+            mapped.close()
+
+def _decode_worker(src_name: str, size: int, dst_name: str, max_images: Optional[int]) -> List[Tuple[str, int, int]]:
+    """
+    工作进程：在源文本中查找内联base64图片并解码到目标共享内存
+
+    Args:
+        src_name: 响应文本（UTF-8）所在共享内存名称
+        size: 响应文本字节数
+        dst_name: 目标共享内存名称，解码后的图片依次写入
+        max_images: 最多解码的图片数，None表示全部
+
+    Returns:
+        List[Tuple[str, int, int]]: 每张图片的 (图片类型, 目标偏移, 字节数)
+    """
+    src = _attach(src_name)
+    dst = _attach(dst_name)
+    images = []
+    try:
+        # 扫描需要可查找的bytes，先复制源文本（在工作进程内，不占用主进程的GIL）
+        with src.buf[:size] as view:
+            content = bytes(view)
+        with dst.buf[:] as out:
+            pos = 0
+            for image_type, raw in decode_inline_images(content, max_images):
+                out[pos:pos + len(raw)] = raw
+                images.append((image_type, pos, len(raw)))
+                pos += len(raw)
+        return images
+    finally:
+        src.close()
+        dst.close()
+
+class MediaWorkerPool:
+    """
+    媒体工作进程池，线程安全
+
+    - encode_data_url：将媒体句柄编码为 data URL（构建请求时使用）
+    - decode_images：提取并解码响应中的内联图片（解析响应时使用）
+
+    小于 min_bytes 的载荷直接在调用线程处理；工作进程按需启动，
+    使用 spawn 方式创建，避免在多线程进程中 fork
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, min_bytes: int = DEFAULT_MIN_BYTES):
+        """
+        Args:
+            max_workers: 工作进程数，默认为CPU核数
+            min_bytes: 交给工作进程处理的最小载荷字节数
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_bytes = min_bytes
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        """懒加载进程池"""
+        with self._lock:
+            if self._executor is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"🧵 启动媒体工作进程池: {self.max_workers} 个进程")
+            return self._executor
+
+    def accepts(self, size: int) -> bool:
+        """载荷是否值得交给工作进程"""
+        return size >= self.min_bytes
+
+    def encode_data_url(self, handle: MediaHandle) -> str:
+        """
+        将媒体句柄编码为 data URL
+
+        Args:
+            handle: 媒体句柄
+
+        Returns:
+            str: data URL
+        """
+        if not self.accepts(handle.size):
+            return handle.to_data_url()
+
+        from multiprocessing import shared_memory
+        prefix = f"data:{handle.mime};base64,".encode("ascii")
+        encoded_size = len(prefix) + 4 * ((handle.size + 2) // 3)
+        dst = shared_memory.SharedMemory(create=True, size=encoded_size)
+        src = None
+        try:
+            if handle.path is not None:
+                # 文件句柄：工作进程自行内存映射，输入不经过共享内存
+                future = self._get_executor().submit(_encode_worker, prefix, None, handle.path, handle.size, dst.name)
+            else:
+                src = shared_memory.SharedMemory(create=True, size=handle.size)
+                src.buf[:handle.size] = handle.data
+                future = self._get_executor().submit(_encode_worker, prefix, src.name, None, handle.size, dst.name)
+            written = future.result()
+            return str(dst.buf[:written], "ascii")
+        finally:
+            for shm in (src, dst):
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+
+    def decode_images(self, content: str, max_images: Optional[int] = 1) -> List[Tuple[str, bytes]]:
+        """
+        提取并解码响应文本中的内联base64图片
+
+        Args:
+            content: 响应文本
+            max_images: 最多解码的图片数，None表示全部
+
+        Returns:
+            List[Tuple[str, bytes]]: (图片类型, 图片字节) 列表，例如 ("png", b"...")
+        """
+        from multiprocessing import shared_memory
+        raw_text = content.encode("utf-8")
+        size = len(raw_text)
+        src = shared_memory.SharedMemory(create=True, size=max(1, size))
+        # 解码结果不会超过输入长度的3/4
+        dst = shared_memory.SharedMemory(create=True, size=max(1, size * 3 // 4 + 3))
+        try:
+            src.buf[:size] = raw_text
+            del raw_text
+            future = self._get_executor().submit(_decode_worker, src.name, size, dst.name, max_images)
+            return [(image_type, bytes(dst.buf[offset:offset + length]))
+                    for image_type, offset, length in future.result()]
+        finally:
+            for shm in (src, dst):
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self, wait: bool = True):
+        """关闭进程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+    def __enter__(self) -> "MediaWorkerPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
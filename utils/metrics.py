@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+指标模块
+记录每轮的分阶段耗时、token用量与载荷大小，通过可插拔的接收器输出，
+内置进程内聚合器（按配置节与模型统计 p50/p95/p99）与 Prometheus 文本格式导出
+"""
+
+import abc
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+from .log_config import get_logger
+
+logger = get_logger('utils.metrics')
+
+# 单轮的阶段
+# - input_encode：输入媒体登记为句柄、构建消息时的base64编码
+# - prompt_render：提示词模板渲染
+# - model_ttft：从发起调用到首个片段（非流式调用等于 model_total）
+# - model_total：模型调用总耗时（含重试与限流等待）
+# - response_parse：响应解析与媒体解码
+# - memory_store：写入memory与检查点
+# - output_write：轮次完成回调写出本轮输出（如 OutputWriter 入队，含队列满时的背压等待）；
+#   未使用回调、运行结束后统一保存时没有该阶段
+PHASES = ("input_encode", "prompt_render", "model_ttft", "model_total", "response_parse", "memory_store", "output_write")
+
+# 轮次输出来源
+SOURCE_MODEL = "model"
+SOURCE_CACHE = "cache"
+SOURCE_CHECKPOINT = "checkpoint"
+SOURCE_COALESCED = "coalesced"
+SOURCE_ROUND_CACHE = "round_cache"
+
+class RoundSpan:
+    """单轮执行的结构化记录"""
+
+    def __init__(self, section: str, model: str, round_index: int, run_id: str = ""):
+        self.section = section
+        self.model = model
+        self.round_index = round_index
+        self.run_id = run_id
+        self.status = "success"
+        self.source = SOURCE_MODEL
+        self.phases: Dict[str, float] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.trimmed_tokens = 0  # 配置了token预算时，提示词中被压缩掉的token数
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.concurrency_limit: Optional[int] = None  # 启用自适应并发时，调用结束时端点的并发上限
+        self.start_time = time.time()
+        self.duration = 0.0
+        self._start = time.perf_counter()
+
+    def add_phase(self, phase: str, seconds: float):
+        """累加阶段耗时（同一阶段可能多次进入，例如重试）"""
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def finish(self, status: str = "success"):
+        """结束记录"""
+        self.status = status
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典，便于写日志或转发到其他系统"""
+        return {
+            "section": self.section,
+            "model": self.model,
+            "round": self.round_index,
+            "run_id": self.run_id,
+            "status": self.status,
+            "source": self.source,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "phases": dict(self.phases),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "trimmed_tokens": self.trimmed_tokens,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "concurrency_limit": self.concurrency_limit,
+        }
+
+@contextmanager
+def timed(span: Optional[RoundSpan], phase: str):
+    """
+    计时上下文，span 为None时不做任何事
+
+    Args:
+        span: 轮次记录
+        phase: 阶段名称
+    """
+    if span is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        span.add_phase(phase, time.perf_counter() - start)
+
+class MetricsSink(abc.ABC):
+    """指标接收器接口，子类实现 emit；emit 可能在多个线程中被调用"""
+
+    @abc.abstractmethod
+    def emit(self, span: RoundSpan):
+        """接收一轮的记录"""
+
+class MultiSink(MetricsSink):
+    """将同一条记录分发给多个接收器，单个接收器出错不影响其他接收器"""
+
+    def __init__(self, *sinks: MetricsSink):
+        self.sinks = list(sinks)
+
+    def emit(self, span: RoundSpan):
+        for sink in self.sinks:
+            try:
+                sink.emit(span)
+            except Exception as e:
+                logger.warning(f"指标接收器 {type(sink).__name__} 处理失败: {e}")
+
+def _quantile(ordered: List[float], q: float) -> float:
+    """有序样本的分位数（最近秩）"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class _SeriesStats:
+    """单个 (配置节, 模型) 的统计"""
+
+    def __init__(self, max_samples: int):
+        self.samples: Dict[str, deque] = {}
+        self.sums: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.rounds: Dict[Tuple[str, str], int] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.trimmed_tokens = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.concurrency_limit: Optional[int] = None  # 最近一次观测到的自适应并发上限（gauge）
+        self.max_samples = max_samples
+
+    def observe(self, metric: str, value: float):
+        if metric not in self.samples:
+            self.samples[metric] = deque(maxlen=self.max_samples)
+            self.sums[metric] = 0.0
+            self.counts[metric] = 0
+        self.samples[metric].append(value)
+        self.sums[metric] += value
+        self.counts[metric] += 1
+
+class InMemoryAggregator(MetricsSink):
+    """
+    进程内聚合器
+
+    按 (配置节, 模型) 分组，每个指标保留最近 max_samples 个样本计算分位数，
+    计数与总和为累计值
+    """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, max_samples: int = 2048):
+        self.max_samples = max_samples
+        self._series: Dict[Tuple[str, str], _SeriesStats] = {}
+        self._lock = threading.Lock()
+
+    def emit(self, span: RoundSpan):
+        with self._lock:
+            series = self._series.get((span.section, span.model))
+            if series is None:
+                series = _SeriesStats(self.max_samples)
+                self._series[(span.section, span.model)] = series
+            key = (span.status, span.source)
+            series.rounds[key] = series.rounds.get(key, 0) + 1
+            series.observe("duration", span.duration)
+            for phase, seconds in span.phases.items():
+                series.observe(phase, seconds)
+            series.prompt_tokens += span.prompt_tokens
+            series.completion_tokens += span.completion_tokens
+            series.trimmed_tokens += span.trimmed_tokens
+            series.request_bytes += span.request_bytes
+            series.response_bytes += span.response_bytes
+            if span.concurrency_limit is not None:
+                series.concurrency_limit = span.concurrency_limit
+
+    def quantiles(self, section: str, model: str, metric: str = "duration") -> Dict[str, float]:
+        """
+        获取某个指标的分位数
+
+        Args:
+            section: 配置节名称
+            model: 模型名称
+            metric: duration 或 PHASES 中的阶段
+
+        Returns:
+            Dict[str, float]: {"p50": ..., "p95": ..., "p99": ...}，单位秒
+        """
+        with self._lock:
+            series = self._series.get((section, model))
+            return self._quantiles_of(series.samples.get(metric, ()) if series else ())
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """当前全部统计，每个 (配置节, 模型) 一项"""
+        snapshot = []
+        with self._lock:
+            for (section, model), series in self._series.items():
+                snapshot.append({
+                    "section": section,
+                    "model": model,
+                    "rounds": [{"status": status, "source": source, "count": count}
+                               for (status, source), count in series.rounds.items()],
+                    "metrics": {
+                        metric: {
+                            "count": series.counts[metric],
+                            "sum": series.sums[metric],
+                            **self._quantiles_of(samples),
+                        }
+                        for metric, samples in series.samples.items()
+                    },
+                    "prompt_tokens": series.prompt_tokens,
+                    "completion_tokens": series.completion_tokens,
+                    "trimmed_tokens": series.trimmed_tokens,
+                    "request_bytes": series.request_bytes,
+                    "response_bytes": series.response_bytes,
+                    "concurrency_limit": series.concurrency_limit,
+                })
+        return snapshot
+
+    @classmethod
+    def _quantiles_of(cls, samples) -> Dict[str, float]:
+        """样本的 p50/p95/p99"""
+        ordered = sorted(samples)
+        return {f"p{int(q * 100)}": _quantile(ordered, q) for q in cls.QUANTILES}
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._series.clear()
+
+def _escape_label(value: Any) -> str:
+    """Prometheus 标签值转义"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items()) + "}"
+
+class PrometheusExporter:
+    """将聚合器的统计渲染为 Prometheus 文本格式（text/plain; version=0.0.4）"""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, aggregator: InMemoryAggregator, namespace: str = "pipeline"):
+        self.aggregator = aggregator
+        self.namespace = namespace
+
+    def render(self) -> str:
+        """渲染全部指标"""
+        ns = self.namespace
+        snapshot = self.aggregator.snapshot()
+        lines = [
+            f"# HELP {ns}_rounds_total 已完成的轮次数",
+            f"# TYPE {ns}_rounds_total counter",
+        ]
+        for item in snapshot:
+            for entry in item["rounds"]:
+                lines.append(f"{ns}_rounds_total"
+                             f"{_labels(section=item['section'], model=item['model'], status=entry['status'], source=entry['source'])}"
+                             f" {entry['count']}")
+
+        lines += [
+            f"# HELP {ns}_round_seconds 轮次总耗时与各阶段耗时",
+            f"# TYPE {ns}_round_seconds summary",
+        ]
+        for item in snapshot:
+            for metric, stats in item["metrics"].items():
+                base = {"section": item["section"], "model": item["model"], "phase": metric}
+                for q in InMemoryAggregator.QUANTILES:
+                    lines.append(f"{ns}_round_seconds{_labels(**base, quantile=q)} {stats[f'p{int(q * 100)}']:.6f}")
+                lines.append(f"{ns}_round_seconds_sum{_labels(**base)} {stats['sum']:.6f}")
+                lines.append(f"{ns}_round_seconds_count{_labels(**base)} {stats['count']}")
+
+        lines += [
+            f"# HELP {ns}_tokens_total token用量（trimmed 为token预算压缩掉的提示词token数）",
+            f"# TYPE {ns}_tokens_total counter",
+        ]
+        for item in snapshot:
+            for kind in ("prompt", "completion", "trimmed"):
+                lines.append(f"{ns}_tokens_total{_labels(section=item['section'], model=item['model'], kind=kind)}"
+                             f" {item[f'{kind}_tokens']}")
+
+        lines += [
+            f"# HELP {ns}_payload_bytes_total 请求与响应载荷字节数",
+            f"# TYPE {ns}_payload_bytes_total counter",
+        ]
+        for item in snapshot:
+            for direction in ("request", "response"):
+                lines.append(f"{ns}_payload_bytes_total"
+                             f"{_labels(section=item['section'], model=item['model'], direction=direction)}"
+                             f" {item[f'{direction}_bytes']}")
+
+        limits = [item for item in snapshot if item["concurrency_limit"] is not None]
+        if limits:
+            lines += [
+                f"# HELP {ns}_concurrency_limit 自适应并发限制器当前的并发上限（按端点共享）",
+                f"# TYPE {ns}_concurrency_limit gauge",
+            ]
+            for item in limits:
+                lines.append(f"{ns}_concurrency_limit{_labels(section=item['section'], model=item['model'])}"
+                             f" {item['concurrency_limit']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """写出到文件（可供 node_exporter 的 textfile collector 读取），原子替换"""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)